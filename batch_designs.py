@@ -0,0 +1,110 @@
+"""
+Run the courtyard pipeline (pipeline.py) for many briefs at once.
+
+Briefs are read from a text file (one brief per line), a JSON list or a JSONL file; JSON items
+are either a brief or an object with "brief" and optionally "id", "area", "functions" and
+"attributes". Up to --concurrency briefs run at the same time and every model call passes the
+provider rate limiter (llm_calls.rate_limiter), so a batch runs about as fast as the provider
+allows instead of one brief after another. Each result is appended to --out as one JSON line as
+soon as its brief finishes, so finished designs are kept even if the batch is stopped.
+
+    python batch_designs.py briefs.txt --concurrency 8 --rpm 500 --tpm 200000
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import llm_calls
+from pipeline import run_design, DesignRefused
+from utils.rate_limit import RateLimiter
+from server.config import batch_concurrency, rate_limit_requests_per_minute, rate_limit_tokens_per_minute, rate_limit_burst_seconds
+
+
+def load_briefs(path):
+    with open(path, encoding="utf8") as f:
+        text = f.read()
+    if path.endswith(".json"):
+        items = json.loads(text)
+    elif path.endswith(".jsonl"):
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        items = [line.strip() for line in text.splitlines() if line.strip()]
+    briefs = []
+    for i, item in enumerate(items, 1):
+        if isinstance(item, str):
+            item = {"brief": item}
+        item.setdefault("id", str(i))
+        briefs.append(item)
+    return briefs
+
+
+def run_brief(item):
+    start = time.perf_counter()
+    result = {"id": item["id"], "brief": item["brief"]}
+    try:
+        design = run_design(
+            item["brief"],
+            area=item.get("area", 400),
+            functions=item.get("functions"),
+            attributes=item.get("attributes"),
+            report=lambda message: None,
+        )
+        result["status"] = "done"
+        result["design"] = {key: value for key, value in design.items() if key not in ("brief", "area")}
+    except DesignRefused as e:
+        result["status"] = "refused"
+        result["error"] = str(e)
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+    result["seconds"] = round(time.perf_counter() - start, 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("briefs", help="text, JSON or JSONL file with the briefs")
+    parser.add_argument("--out", default="batch_results.jsonl", help="JSONL file the results are appended to")
+    parser.add_argument("--concurrency", type=int, default=batch_concurrency, help="briefs running at the same time")
+    parser.add_argument("--rpm", type=int, default=rate_limit_requests_per_minute, help="provider requests per minute (0 = no limit)")
+    parser.add_argument("--tpm", type=int, default=rate_limit_tokens_per_minute, help="provider tokens per minute (0 = no limit)")
+    args = parser.parse_args()
+
+    briefs = load_briefs(args.briefs)
+    if not briefs:
+        sys.exit(f"No briefs in {args.briefs}")
+    if args.rpm or args.tpm:
+        llm_calls.rate_limiter = RateLimiter(args.rpm, args.tpm, rate_limit_burst_seconds)
+    else:
+        llm_calls.rate_limiter = None
+    llm_calls.reset_usage_stats()
+
+    print(f"Running {len(briefs)} briefs, {args.concurrency} at a time, rpm {args.rpm or 'unlimited'}, tpm {args.tpm or 'unlimited'}")
+    start = time.perf_counter()
+    counts = {}
+    latencies = []
+    with open(args.out, "a", encoding="utf8") as out, ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(run_brief, item) for item in briefs]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            latencies.append(result["seconds"])
+            print(f"[{done}/{len(briefs)}] {result['id']} {result['status']} in {result['seconds']:.1f}s {result.get('error', '')}")
+
+    wall = time.perf_counter() - start
+    usage = list(llm_calls.usage_stats.values())
+    tokens = sum(u["prompt_tokens"] + u["completion_tokens"] for u in usage)
+    calls = sum(u["calls"] - u["cached_calls"] for u in usage)
+    print(f"\n{counts} in {wall:.1f}s ({len(briefs) / wall * 60:.1f} briefs/min); the briefs took {sum(latencies):.1f}s one after another")
+    print(f"{calls} model calls ({calls / wall * 60:.0f}/min), {tokens} tokens ({tokens / wall * 60:.0f}/min)")
+    if llm_calls.rate_limiter is not None:
+        print(f"Rate limiter: {llm_calls.rate_limiter.stats()}")
+    print(f"Results appended to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
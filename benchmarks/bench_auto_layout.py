@@ -0,0 +1,73 @@
+"""
+Auto layout of the graph editor (graph_gh.py, utils/force_layout.py), offscreen.
+
+For each size in --sizes, builds a GraphEditor with that many nodes (and --links-per-node links
+each) at random positions and lays it out the way the "Auto Layout" button does: ForceLayout
+iterations with the editor's time budget, every --frame-every iterations drawn with
+show_layout_frame. Reports the p50/p95 time of an iteration, of a drawn frame, the iterations
+run and the overlapping node pairs before and after. The synthetic nodes have radii of 30 to 60 px,
+so from about 50 nodes they no longer fit in the grid without overlapping.
+
+    python -m benchmarks.bench_auto_layout --sizes 15,500,2000
+"""
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import argparse
+import sys
+import time
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+
+import ui_pyqt  # graph_gh and ui_pyqt import each other; loading ui_pyqt first resolves the cycle
+from graph_gh import GraphEditor
+from benchmarks.bench_graph_drag import synthetic_graph
+
+
+def percentiles(timings):
+    return np.percentile(np.array(timings) * 1000, [50, 95]) if timings else (0.0, 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="15,50,500,2000")
+    parser.add_argument("--links-per-node", type=int, default=1)
+    parser.add_argument("--max-iterations", type=int, default=1000)
+    parser.add_argument("--frame-every", type=int, default=3, help="iterations between drawn frames")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    print(
+        f"{'nodes':>7}{'step p50 ms':>13}{'step p95 ms':>13}{'frame p50 ms':>14}{'frame p95 ms':>14}"
+        f"{'iterations':>12}{'overlaps before':>17}{'overlaps after':>16}"
+    )
+    for size in (int(size) for size in args.sizes.split(",")):
+        editor = GraphEditor(synthetic_graph(size, args.links_per_node, args.seed))
+        engine = editor.layout_engine()
+        overlaps_before = engine.overlaps()
+        editor.layout_busy_changed(True)
+        steps, frames = [], []
+        while not engine.settled and engine.iterations < args.max_iterations:
+            start = time.perf_counter()
+            engine.step(editor.LAYOUT_BUDGET)
+            steps.append(time.perf_counter() - start)
+            if engine.iterations % args.frame_every == 0:
+                start = time.perf_counter()
+                editor.show_layout_frame(engine.positions)
+                frames.append(time.perf_counter() - start)
+        editor.show_layout_frame(engine.positions)
+        editor.layout_busy_changed(False)
+        step_p50, step_p95 = percentiles(steps)
+        frame_p50, frame_p95 = percentiles(frames)
+        print(
+            f"{size:>7}{step_p50:>13.2f}{step_p95:>13.2f}{frame_p50:>14.2f}{frame_p95:>14.2f}"
+            f"{engine.iterations:>12}{overlaps_before:>17}{engine.overlaps():>16}"
+        )
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Compare the per-field and bundled geometry extraction modes.
+
+Runs extract_geometry_data in "sequential", "concurrent" and "bundle" mode against the
+model configured in server/config.py and reports wall-clock time and token usage per mode.
+The response cache is bypassed so every run reaches the model.
+
+    python -m benchmarks.bench_design_bundle --runs 3
+"""
+import argparse
+import json
+import statistics
+import time
+
+import llm_calls
+
+CONCEPT = (
+    "We envision an outdoor space with a total courtyard area of 400 sqm. The design includes "
+    "120 sqm of social play zones near the cafe, 80 sqm of calm rest spaces shaded by oaks, "
+    "a 40 sqm pond, 60 sqm of flower beds and 100 sqm of open lawn. The site supports 8 trees "
+    "across 2 different species."
+)
+EXTERNAL_FUNCTIONS = {"cafe": "N", "library": "E", "kindergarden": None}
+ATTRIBUTES = {
+    "tree species": "oak,maple",
+    "tree count": "8",
+    "materials": "brick,wood",
+    "courtyard area": "400 sqm",
+}
+
+
+def run_mode(mode, runs):
+    timings = []
+    llm_calls.reset_usage_stats()
+    failures = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        results, errors = llm_calls.extract_geometry_data(CONCEPT, EXTERNAL_FUNCTIONS, ATTRIBUTES, mode=mode)
+        timings.append(time.perf_counter() - start)
+        failures += len(errors)
+
+    usage = list(llm_calls.usage_stats.values())
+    return {
+        "mode": mode,
+        "runs": runs,
+        "mean_s": statistics.mean(timings),
+        "min_s": min(timings),
+        "calls_per_run": sum(u["calls"] for u in usage) / runs,
+        "prompt_tokens_per_run": sum(u["prompt_tokens"] for u in usage) / runs,
+        "completion_tokens_per_run": sum(u["completion_tokens"] for u in usage) / runs,
+        "failed_fields": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modes", default="sequential,concurrent,bundle")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    # Every run has to reach the model, otherwise the numbers only measure the cache
+    llm_calls.response_cache = None
+
+    rows = [run_mode(mode, args.runs) for mode in args.modes.split(",")]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'mode':<12}{'mean s':>10}{'min s':>10}{'calls':>8}{'prompt tok':>12}{'compl tok':>12}{'failed':>8}")
+    for row in rows:
+        print(
+            f"{row['mode']:<12}{row['mean_s']:>10.2f}{row['min_s']:>10.2f}{row['calls_per_run']:>8.0f}"
+            f"{row['prompt_tokens_per_run']:>12.0f}{row['completion_tokens_per_run']:>12.0f}{row['failed_fields']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
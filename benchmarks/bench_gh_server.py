@@ -0,0 +1,180 @@
+"""
+Load test for the gh_server routes.
+
+Starts gh_server in headless mode in a subprocess (or targets --url), stores a synthetic
+courtyard graph of --nodes nodes plus tree, geometry and plot data, then sends --requests GET
+requests per route from --concurrency client threads, each with its own keep-alive session.
+Reports requests per second and p50/p99 latency per route. The payloads are generated from
+--seed, so runs are reproducible.
+
+    python -m benchmarks.bench_gh_server --nodes 2000 --concurrency 16 --requests 2000
+    python -m benchmarks.bench_gh_server --etag       # clients revalidate with If-None-Match
+    python -m benchmarks.bench_gh_server --no-gzip    # ask for uncompressed bodies
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROUTES = ["graph_data", "geometry_data", "send_tree_data", "plot_area", "spaces"]
+ZONES = ["tree", "pond", "play", "rest", "flower"]
+
+
+def synthetic_state(nodes, seed):
+    rng = random.Random(seed)
+    ids = [f"{rng.choice(ZONES)}_{i}" for i in range(nodes)]
+    graph = {
+        "directed": False,
+        "multigraph": False,
+        "graph": {},
+        "nodes": [
+            {
+                "id": node_id,
+                "pos": {"x": round(rng.uniform(-34, -4), 2), "y": round(rng.uniform(30, 60), 2), "z": 0},
+                "weight": round(rng.uniform(1, 10), 1),
+                "anchor": rng.random() < 0.2,
+            }
+            for node_id in ids
+        ],
+        "links": [{"source": rng.choice(ids), "target": rng.choice(ids)} for _ in range(nodes * 2)],
+    }
+    geometry = {
+        "spaces": {zone: rng.randint(1, 10) for zone in ZONES},
+        "weights": {zone: rng.randint(1, 10) for zone in ZONES},
+        "pos": {node_id: [round(rng.uniform(-34, -4), 2), round(rng.uniform(30, 60), 2)] for node_id in ids[:50]},
+    }
+    trees = {"tree_placement": {"quercus": "1 to 4", "tilia": "5 to 8"}, "PWR": {"quercus": "0.4", "tilia": "0.6"}}
+    return graph, geometry, trees
+
+
+def wait_until_up(url, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url + "/sessions", timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError(f"gh_server did not start at {url}")
+
+
+def load_route(url, route, total, concurrency, etag, gzip):
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(range(total))
+    errors = [0]
+
+    def worker():
+        session = requests.Session()
+        if not gzip:
+            session.headers["Accept-Encoding"] = "identity"
+        tag = None
+        local = []
+        failed = 0
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            headers = {"If-None-Match": tag} if etag and tag else {}
+            start = time.perf_counter()
+            response = session.get(f"{url}/{route}", headers=headers)
+            local.append(time.perf_counter() - start)
+            if response.status_code not in (200, 304):
+                failed += 1
+            if etag:
+                tag = response.headers.get("ETag", tag)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "route": route,
+        "requests": len(latencies),
+        "rps": len(latencies) / wall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "errors": errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--threads", type=int, default=16, help="server worker threads")
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--routes", default=",".join(ROUTES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--etag", action="store_true", help="send If-None-Match with the last ETag")
+    parser.add_argument("--no-gzip", action="store_true", help="request uncompressed bodies")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        url = f"http://127.0.0.1:{args.port}"
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        # State is saved as usual, but to a scratch file instead of the one the desktop app restores
+        state_dir = tempfile.mkdtemp(prefix="bench_gh_server_")
+        server = subprocess.Popen(
+            [sys.executable, "gh_server.py", "--headless", "--port", str(args.port), "--threads", str(args.threads)],
+            cwd=root,
+            env=dict(os.environ, GH_STATE_PATH=os.path.join(state_dir, "state.sqlite")),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    try:
+        wait_until_up(url)
+        graph, geometry, trees = synthetic_state(args.nodes, args.seed)
+        requests.post(url + "/graph_data", json={"graph_data": graph})
+        requests.post(url + "/geometry_data", json={"geometry_data": geometry})
+        requests.post(url + "/send_tree_data", json=trees)
+        requests.post(url + "/plot_area", json={"input": "400"})
+        requests.post(url + "/spaces", json={"spaces": ZONES})
+
+        rows = [
+            load_route(url, route, args.requests, args.concurrency, args.etag, not args.no_gzip)
+            for route in args.routes.split(",")
+        ]
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"\n{args.nodes} nodes, {args.concurrency} clients, etag {args.etag}, gzip {not args.no_gzip}")
+    print(f"{'route':<16}{'requests':>10}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for row in rows:
+        print(
+            f"{row['route']:<16}{row['requests']:>10}{row['rps']:>10.0f}{row['p50_ms']:>10.2f}"
+            f"{row['p99_ms']:>10.2f}{row['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Frame time of dragging a node in the graph editor (graph_gh.py), offscreen.
+
+For each size in --sizes, builds a GraphEditor with that many nodes (and --links-per-node links
+each) at random positions, then replays --frames drag steps on random movable nodes, the way a
+mouse move does: move the node, resolve its collisions and update the edge lines. Reports, per
+size, the mean and p99 time of the collision check with the editor's spatial index and with the
+previous scan over every scene item, and of the whole drag frame: now, where only the edges of
+moved nodes are updated, and before, with the scan and every edge updated on each mouse move.
+
+    python -m benchmarks.bench_graph_drag --sizes 50,500,5000
+"""
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from PyQt5.QtWidgets import QApplication
+
+import ui_pyqt  # graph_gh and ui_pyqt import each other; loading ui_pyqt first resolves the cycle
+from graph_gh import GraphEditor, NodeItem
+
+
+def synthetic_graph(nodes, links_per_node, seed):
+    rng = random.Random(seed)
+    graph = {"nodes": [], "links": []}
+    for i in range(nodes):
+        graph["nodes"].append({
+            "id": f"zone{i}",
+            "pos": {"x": rng.uniform(-34, -4), "y": rng.uniform(30, 60)},
+            "weight": rng.uniform(6, 12),
+            "anchor": rng.random() < 0.05,
+        })
+    for i in range(nodes):
+        for _ in range(links_per_node):
+            graph["links"].append({"source": f"zone{i}", "target": f"zone{rng.randrange(nodes)}"})
+    return graph
+
+
+def scan_collisions(node):
+    # The check before the spatial index: every item in the scene, every frame
+    for item in node.scene().items():
+        if isinstance(item, NodeItem) and item != node:
+            dx = node.scenePos().x() - item.scenePos().x()
+            dy = node.scenePos().y() - item.scenePos().y()
+            dist = (dx ** 2 + dy ** 2) ** 0.5
+            min_dist = node.radius + item.radius
+            if dist < min_dist and dist != 0:
+                overlap = min_dist - dist + 1
+                nx, ny = dx / dist, dy / dist
+                node.moveBy(nx * overlap / 2, ny * overlap / 2)
+                if not item.anchor:
+                    item.moveBy(-nx * overlap / 2, -ny * overlap / 2)
+
+
+def drag(editor, frames, seed, resolve, update_all_edges=False):
+    rng = random.Random(seed)
+    movable = [item for item in editor.nodes.values() if not item.anchor]
+    collisions = []
+    totals = []
+    for _ in range(frames):
+        node = rng.choice(movable)
+        start = time.perf_counter()
+        node.moveBy(rng.uniform(-5, 5), rng.uniform(-5, 5))
+        check = time.perf_counter()
+        resolve(node)
+        collisions.append(time.perf_counter() - check)
+        if update_all_edges:
+            for edge in editor.edges.values():
+                edge.update_position()
+        totals.append(time.perf_counter() - start)
+    return collisions, totals
+
+
+def stats(timings):
+    timings = sorted(timings)
+    return statistics.mean(timings) * 1000, timings[max(0, int(len(timings) * 0.99) - 1)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50,200,1000,5000")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--links-per-node", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    print(
+        f"{'nodes':>7}{'index mean ms':>15}{'index p99 ms':>14}{'scan mean ms':>14}{'scan p99 ms':>13}"
+        f"{'frame mean ms':>15}{'frame p99 ms':>14}{'before mean ms':>16}{'before p99 ms':>15}"
+    )
+    for size in (int(size) for size in args.sizes.split(",")):
+        graph = synthetic_graph(size, args.links_per_node, args.seed)
+        editor = GraphEditor(graph)
+        indexed, frames = drag(editor, args.frames, args.seed, NodeItem.resolve_collisions)
+        editor = GraphEditor(graph)
+        scanned, before = drag(editor, args.frames, args.seed, scan_collisions, update_all_edges=True)
+        print(
+            f"{size:>7}{stats(indexed)[0]:>15.3f}{stats(indexed)[1]:>14.3f}"
+            f"{stats(scanned)[0]:>14.3f}{stats(scanned)[1]:>13.3f}"
+            f"{stats(frames)[0]:>15.3f}{stats(frames)[1]:>14.3f}"
+            f"{stats(before)[0]:>16.3f}{stats(before)[1]:>15.3f}"
+        )
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+End-to-end latency of the copilot pipeline against the fake OpenAI server.
+
+Starts server/fake_openai.py and gh_server.py in this process, creates the chat window
+offscreen and times the stages the attributes and graph phases run:
+  geometry_data   extract_geometry_data plus aggregating the fields
+  get_tree_data   tree placement and water requirement calls, POST to the server
+  graph           assemble_courtyard_graph, POST to the server
+  rag_call        question embedding, index search and answer
+For each stage the table shows wall-clock time and how much of it the model calls took
+(summed, so concurrent calls can add up to more than the wall time; rag_answer calls the
+client directly and is not broken out). With --latency 0 the
+wall-clock time is the copilot's own overhead: prompt building, JSON parsing, HTTP round trips
+and Qt updates. Response and embedding caches are disabled so every run reaches the server.
+
+    python -m benchmarks.bench_pipeline --runs 5 --latency 0.2
+"""
+import os
+
+# These have to be set before server.config and Qt are imported; the benchmark keeps gh_server
+# state in memory, so it neither loads nor overwrites the state saved by a real session
+os.environ.setdefault("API_MODE", "fake")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("GH_STATE_PATH", "")
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+from PyQt5.QtWidgets import QApplication
+
+import llm_calls
+import gh_server
+import utils.rag_utils as rag_utils
+from server import fake_openai
+from server.config import fake_openai_port, knowledge_path, geometry_extraction_mode
+from ui_pyqt import FlaskClientChatUI
+from benchmarks.bench_design_bundle import CONCEPT, EXTERNAL_FUNCTIONS, ATTRIBUTES
+
+QUESTION = "How many trees does a 400 sqm courtyard need for good shade?"
+
+
+def serve(flask_app, port):
+    server = make_server("127.0.0.1", port, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_stage(qt_app, fn):
+    llm_calls.reset_usage_stats()
+    start = time.perf_counter()
+    fn()
+    # Let Qt process the chat updates the stage posted, they are part of the cost
+    qt_app.processEvents()
+    wall = time.perf_counter() - start
+    usage = list(llm_calls.usage_stats.values())
+    return wall, sum(u["calls"] for u in usage), sum(u["seconds"] for u in usage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model latency per request in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="fake model latency per completion token")
+    parser.add_argument("--mode", default=geometry_extraction_mode, help="geometry extraction mode")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    if llm_calls.mode != "fake":
+        sys.exit("Run with API_MODE=fake (the default for this benchmark), not " + llm_calls.mode)
+
+    fake_openai.configure(latency=args.latency, token_latency=args.token_latency)
+    servers = [serve(fake_openai.app, fake_openai_port), serve(gh_server.app, 5000)]
+
+    # Every run has to reach the fake model, otherwise the numbers only measure the caches
+    llm_calls.response_cache = None
+    rag_utils.embedding_cache_enabled = False
+
+    qt_app = QApplication(sys.argv)
+    window = FlaskClientChatUI()
+    window.concept = CONCEPT
+    window.extracted_functions = EXTERNAL_FUNCTIONS
+    window.attributes = ATTRIBUTES
+    window_module = sys.modules[FlaskClientChatUI.__module__]
+    window_module.geometry_extraction_mode = args.mode
+
+    stages = [
+        ("geometry_data", window.geometry_data),
+        ("get_tree_data", window.get_tree_data),
+        ("graph", window.graph),
+        ("rag_call", lambda: rag_utils.rag_call(QUESTION, knowledge_path, 10)),
+    ]
+
+    # Warm-up: builds the vector index, opens connections and imports lazily loaded modules
+    for _, fn in stages:
+        run_stage(qt_app, fn)
+
+    samples = {name: [] for name, _ in stages}
+    for _ in range(args.runs):
+        for name, fn in stages:
+            samples[name].append(run_stage(qt_app, fn))
+
+    for server in servers:
+        server.shutdown()
+
+    rows = []
+    for name, runs in samples.items():
+        walls = [wall for wall, _, _ in runs]
+        rows.append({
+            "stage": name,
+            "runs": len(runs),
+            "mean_ms": statistics.mean(walls) * 1000,
+            "p50_ms": statistics.median(walls) * 1000,
+            "max_ms": max(walls) * 1000,
+            "model_calls": statistics.mean(calls for _, calls, _ in runs),
+            "model_ms": statistics.mean(seconds for _, _, seconds in runs) * 1000,
+        })
+    total = {
+        "stage": "total",
+        "runs": args.runs,
+        "mean_ms": sum(row["mean_ms"] for row in rows),
+        "p50_ms": sum(row["p50_ms"] for row in rows),
+        "max_ms": sum(row["max_ms"] for row in rows),
+        "model_calls": sum(row["model_calls"] for row in rows),
+        "model_ms": sum(row["model_ms"] for row in rows),
+    }
+    rows.append(total)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"\nlatency {args.latency}s, token latency {args.token_latency}s, geometry mode {args.mode}")
+    print(f"{'stage':<15}{'mean ms':>10}{'p50 ms':>10}{'max ms':>10}{'calls':>8}{'model ms':>10}")
+    for row in rows:
+        print(
+            f"{row['stage']:<15}{row['mean_ms']:>10.1f}{row['p50_ms']:>10.1f}{row['max_ms']:>10.1f}"
+            f"{row['model_calls']:>8.0f}{row['model_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Compare RAG retrieval on the JSON knowledge file with the precompiled vector index.
+
+For each knowledge base size a synthetic set of random vectors is generated and timed through
+  - the JSON path: json.load of the whole file, then get_vectors scoring record by record
+  - the index path: opening the memory-mapped index, then VectorIndex.search
+Startup is the time to get ready for the first query, query is the mean over --queries questions.
+Batch is the per-question time when all --queries questions go through one VectorIndex.search_batch.
+The JSON path is skipped above --json-max records, where the file alone runs into gigabytes.
+
+    python -m benchmarks.bench_rag_index --sizes 1000,10000,100000,1000000
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import numpy as np
+
+from utils.vector_index import VectorIndex, write_index
+
+
+def get_vectors(question_vector, index_lib, n_results):
+    # How rag_call scored the JSON records before the index
+    scores = []
+    for vector in index_lib:
+        score = np.dot(question_vector, vector['vector'])
+        scores.append({'content': vector['content'], 'score': score})
+
+    scores.sort(key=lambda x: x['score'], reverse=True)
+    return scores[0:n_results]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_size(size, dim, queries, n_results, json_max, workdir):
+    rng = np.random.default_rng(size)
+    vectors = rng.standard_normal((size, dim), dtype=np.float32)
+    contents = [f"chunk {i}" for i in range(size)]
+    questions = rng.standard_normal((queries, dim), dtype=np.float32)
+    row = {"size": size}
+
+    if size <= json_max:
+        json_path = os.path.join(workdir, f"knowledge_{size}.json")
+        with open(json_path, "w", encoding="utf8") as f:
+            json.dump([{"content": c, "vector": v.tolist()} for c, v in zip(contents, vectors)], f)
+
+        def load_json():
+            with open(json_path, "r", encoding="utf8") as infile:
+                return json.load(infile)
+
+        index_lib, row["json_startup_s"] = timed(load_json)
+        row["json_query_s"] = statistics.mean(
+            timed(get_vectors, q.tolist(), index_lib, n_results)[1] for q in questions
+        )
+        del index_lib
+        os.remove(json_path)
+
+    index_dir = os.path.join(workdir, f"knowledge_{size}.index")
+    write_index(vectors, contents, index_dir)
+    del vectors
+    index, row["index_startup_s"] = timed(VectorIndex, index_dir)
+    row["index_query_s"] = statistics.mean(timed(index.search, q, n_results)[1] for q in questions)
+    row["batch_query_s"] = timed(index.search_batch, questions, n_results)[1] / queries
+    index.close()
+    shutil.rmtree(index_dir)
+    return row
+
+
+def fmt(value):
+    return f"{value * 1000:>12.2f}" if value is not None else f"{'-':>12}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--n-results", type=int, default=10)
+    parser.add_argument("--json-max", type=int, default=100000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_rag_index_")
+    try:
+        rows = [
+            bench_size(int(size), args.dim, args.queries, args.n_results, args.json_max, workdir)
+            for size in args.sizes.split(",")
+        ]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'records':>10}{'json start ms':>14}{'json query ms':>14}{'index start ms':>15}{'index query ms':>15}{'batch query ms':>15}")
+    for row in rows:
+        print(
+            f"{row['size']:>10}{fmt(row.get('json_startup_s'))}  {fmt(row.get('json_query_s'))}  "
+            f"{fmt(row['index_startup_s'])}   {fmt(row['index_query_s'])}   {fmt(row['batch_query_s'])}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Cost of saving gh_server state and time to restore it after a restart.
+
+Fills --sessions sessions with a synthetic graph of --nodes nodes plus tree and geometry data,
+then moves one node --changes times per session, and reports the mean and p99 time of a
+state.set call with and without the journal (server/persistence.py). Then closes the journal
+and times loading everything into a fresh SessionStore, as gh_server does on startup.
+
+    python -m benchmarks.bench_state_restore --nodes 2000 --sessions 4
+"""
+import argparse
+import copy
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_gh_server import synthetic_state
+from server.persistence import StateJournal
+from server.state import SessionStore
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(value):
+    return orjson.dumps(value) if orjson is not None else json.dumps(value)
+
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def timed_sets(sessions, session_count, graph, geometry, trees, changes):
+    timings = []
+    for i in range(session_count):
+        state = sessions.get(f"bench-{i}")
+        state.set("design_data", geometry)
+        state.set("tree_data", trees)
+        graph = copy.deepcopy(graph)
+        for change in range(changes):
+            graph["nodes"][change % len(graph["nodes"])]["pos"]["x"] += 1.0
+            start = time.perf_counter()
+            state.set("graph_data", graph)
+            timings.append(time.perf_counter() - start)
+            graph = copy.deepcopy(graph)
+    return timings
+
+
+def summary(timings):
+    timings = sorted(timings)
+    return statistics.mean(timings) * 1000, timings[int(len(timings) * 0.99) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--changes", type=int, default=50, help="graph changes per session")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    graph, geometry, trees = synthetic_state(args.nodes, args.seed)
+    directory = tempfile.mkdtemp(prefix="bench_state_restore_")
+    path = os.path.join(directory, "state.sqlite")
+    try:
+        memory = timed_sets(SessionStore(dumps=dumps), args.sessions, graph, geometry, trees, args.changes)
+        journal = StateJournal(path, dumps, loads)
+        saved = timed_sets(SessionStore(dumps=dumps, journal=journal), args.sessions, graph, geometry, trees, args.changes)
+        start = time.perf_counter()
+        journal.close()
+        drain = time.perf_counter() - start
+
+        start = time.perf_counter()
+        restored = SessionStore(dumps=dumps, journal=StateJournal(path, dumps, loads))
+        restore = time.perf_counter() - start
+        sessions = restored.stats()
+
+        print(f"{args.nodes} nodes, {args.sessions} sessions, {args.changes} graph changes each")
+        print(f"{'set graph_data':<26}{'mean ms':>10}{'p99 ms':>10}")
+        print(f"{'in memory':<26}{summary(memory)[0]:>10.3f}{summary(memory)[1]:>10.3f}")
+        print(f"{'with journal':<26}{summary(saved)[0]:>10.3f}{summary(saved)[1]:>10.3f}")
+        print(f"journal: {journal.writes} rows in {journal.flushes} flushes, {drain * 1000:.0f} ms to write the rest on close")
+        print(f"database: {os.path.getsize(path) / 1e6:.1f} MB")
+        print(f"restore: {len(sessions)} sessions in {restore * 1000:.0f} ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
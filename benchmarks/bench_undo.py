@@ -0,0 +1,96 @@
+"""
+Undo/redo in the graph editor (graph_gh.py, utils/command_stack.py), offscreen.
+
+For each size in --sizes, builds a GraphEditor with that many nodes and records --drags drags of
+--moves mouse moves each (the way NodeItem.mouseMoveEvent does: move, push overlapping nodes
+aside, merge into the drag's command), plus an edge added and removed per drag. Reports the
+commands and bytes on the stack, then the p50/p95 time to undo and to redo one step, and to
+rebuild a GraphEditor from a saved version, the only way back before the stack.
+
+    python -m benchmarks.bench_undo --sizes 50,500,2000
+"""
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+
+import ui_pyqt  # graph_gh and ui_pyqt import each other; loading ui_pyqt first resolves the cycle
+from graph_gh import GraphEditor, EdgeCommand
+from benchmarks.bench_graph_drag import synthetic_graph
+
+
+def record_drags(editor, drags, moves, seed):
+    rng = random.Random(seed)
+    ids = [nid for nid, item in editor.nodes.items() if not item.anchor]
+    for _ in range(drags):
+        item = editor.nodes[rng.choice(ids)]
+        item.gesture = object()
+        dx, dy = rng.uniform(-4, 4), rng.uniform(-4, 4)
+        for _ in range(moves):
+            editor.begin_edit()
+            item.moveBy(dx, dy)
+            item.resolve_collisions()
+            editor.end_edit("Move", item.gesture)
+        id1, id2 = rng.sample(ids, 2)
+        if editor.add_edge(id1, id2) is not None:
+            editor.undo_stack.push(EdgeCommand(editor, id1, id2, added=True))
+        edge = rng.choice(list(editor.edges.values()))
+        editor.remove_edge(edge)
+        editor.undo_stack.push(EdgeCommand(editor, edge.node1.node_id, edge.node2.node_id, added=False))
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return np.percentile(np.array(timings) * 1000, [50, 95])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50,500,2000")
+    parser.add_argument("--drags", type=int, default=100)
+    parser.add_argument("--moves", type=int, default=30, help="mouse moves per drag")
+    parser.add_argument("--links-per-node", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    print(
+        f"{'nodes':>7}{'commands':>10}{'stack KB':>10}{'undo p50 ms':>13}{'undo p95 ms':>13}"
+        f"{'redo p50 ms':>13}{'redo p95 ms':>13}{'rebuild p50 ms':>16}{'rebuild p95 ms':>16}"
+    )
+    for size in (int(size) for size in args.sizes.split(",")):
+        graph = synthetic_graph(size, args.links_per_node, args.seed)
+        editor = GraphEditor(graph)
+        record_drags(editor, args.drags, args.moves, args.seed)
+        commands, memory = len(editor.undo_stack), editor.undo_stack.memory
+        undo_p50, undo_p95 = timed(editor.undo, commands)
+        redo_p50, redo_p95 = timed(editor.redo, commands)
+        saved = editor.get_graph_data()
+
+        def rebuild():
+            GraphEditor(saved).deleteLater()
+            app.processEvents()
+
+        rebuild_p50, rebuild_p95 = timed(rebuild, 5)
+        print(
+            f"{size:>7}{commands:>10}{memory / 1024:>10.1f}{undo_p50:>13.3f}{undo_p95:>13.3f}"
+            f"{redo_p50:>13.3f}{redo_p95:>13.3f}{rebuild_p50:>16.1f}{rebuild_p95:>16.1f}"
+        )
+        editor.deleteLater()
+        app.processEvents()
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Memory and switch latency of the graph editor's version history (graph_gh.py MainWindow,
+utils/graph_history.py), offscreen.
+
+For each size in --sizes, builds a GraphEditor with that many nodes and simulates an editing
+session of --versions saves with --edits edits each (moving and resizing nodes, adding and
+removing links). Reports the memory the versions take as full copies (before) and as a
+GraphHistory, then the p50/p95 time of --switches switches to random versions: rebuilding a
+GraphEditor for the version (before), and showing it in place with GraphHistory.checkout and
+GraphEditor.show_version, for random versions and for the neighbouring version.
+
+    python -m benchmarks.bench_version_history --sizes 50,500 --versions 200
+"""
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import argparse
+import copy
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+
+import ui_pyqt  # graph_gh and ui_pyqt import each other; loading ui_pyqt first resolves the cycle
+from graph_gh import GraphEditor
+from utils.graph_history import GraphHistory
+from benchmarks.bench_graph_drag import synthetic_graph
+
+
+def edit(editor, rng, edits):
+    ids = [nid for nid, item in editor.nodes.items() if not item.anchor]
+    for _ in range(edits):
+        item = editor.nodes[rng.choice(ids)]
+        choice = rng.random()
+        if choice < 0.6:
+            item.moveBy(rng.uniform(-30, 30), rng.uniform(-30, 30))
+        elif choice < 0.75:
+            item.radius = rng.choice([30, 40, 50, 60])
+            item.setRect(-item.radius, -item.radius, item.radius * 2, item.radius * 2)
+            editor.index_node(item)
+        elif choice < 0.9:
+            editor.add_edge(item.node_id, rng.choice(ids))
+        elif editor.edges:
+            editor.remove_edge(rng.choice(list(editor.edges.values())))
+
+
+def traced(fn):
+    """Run fn and return its result and the bytes it left allocated."""
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def session(graph, versions, edits, seed):
+    """The graph data of every saved version of a simulated editing session."""
+    editor = GraphEditor(graph)
+    rng = random.Random(seed)
+    saved = [editor.get_graph_data()]
+    for _ in range(versions - 1):
+        edit(editor, rng, edits)
+        saved.append(editor.get_graph_data())
+    editor.deleteLater()
+    return saved
+
+
+def build_history(saved):
+    history = GraphHistory(saved[0])
+    for data in saved[1:]:
+        history.append(data)
+    return history
+
+
+def percentiles(timings):
+    return np.percentile(np.array(timings) * 1000, [50, 95])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50,200,1000")
+    parser.add_argument("--versions", type=int, default=200)
+    parser.add_argument("--edits", type=int, default=5, help="edits between two saves")
+    parser.add_argument("--switches", type=int, default=50)
+    parser.add_argument("--links-per-node", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    print(
+        f"{'nodes':>7}{'versions':>10}{'copies MB':>11}{'history MB':>12}"
+        f"{'rebuild p50 ms':>16}{'rebuild p95 ms':>16}{'in place p50 ms':>17}{'in place p95 ms':>17}"
+        f"{'next p50 ms':>13}{'next p95 ms':>13}"
+    )
+    for size in (int(size) for size in args.sizes.split(",")):
+        graph = synthetic_graph(size, args.links_per_node, args.seed)
+        saved = session(graph, args.versions, args.edits, args.seed)
+        # Before: every version kept as a full copy of the graph data
+        copies, copies_size = traced(lambda: copy.deepcopy(saved))
+        del copies
+        history, history_size = traced(lambda: build_history(saved))
+
+        rng = random.Random(args.seed)
+        targets = [rng.randrange(len(saved)) for _ in range(args.switches)]
+        rebuilds = []
+        for index in targets:
+            start = time.perf_counter()
+            editor = GraphEditor(saved[index])
+            rebuilds.append(time.perf_counter() - start)
+            editor.deleteLater()
+            app.processEvents()
+
+        editor = GraphEditor(saved[0])
+        history.checkout(0)
+        in_place = []
+        for index in targets:
+            start = time.perf_counter()
+            node_ids, link_keys = history.checkout(index)
+            editor.show_version(history.nodes, history.links, node_ids, link_keys)
+            in_place.append(time.perf_counter() - start)
+        neighbours = []
+        for _ in range(args.switches):
+            index = history.position + 1 if history.position + 1 < len(saved) else history.position - 1
+            start = time.perf_counter()
+            node_ids, link_keys = history.checkout(index)
+            editor.show_version(history.nodes, history.links, node_ids, link_keys)
+            neighbours.append(time.perf_counter() - start)
+
+        rebuild_p50, rebuild_p95 = percentiles(rebuilds)
+        in_place_p50, in_place_p95 = percentiles(in_place)
+        next_p50, next_p95 = percentiles(neighbours)
+        print(
+            f"{size:>7}{len(saved):>10}{copies_size / 1e6:>11.1f}{history_size / 1e6:>12.2f}"
+            f"{rebuild_p50:>16.1f}{rebuild_p95:>16.1f}{in_place_p50:>17.2f}{in_place_p95:>17.2f}"
+            f"{next_p50:>13.2f}{next_p95:>13.2f}"
+        )
+        editor.deleteLater()
+        app.processEvents()
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compare the gh_server wire formats for graph_data.
+
+For synthetic graphs of each size (--sizes nodes, twice as many links) reports, per format,
+the body size as sent, its gzipped size and the mean time to encode and to decode it:
+  json              the current format, one object per node and link
+  json columnar     parallel arrays per node and link field (server/wire.py)
+  msgpack           MessagePack of the current layout
+  msgpack columnar  MessagePack of the columnar layout
+Decoding stops at the parsed data; a columnar client reads the arrays directly.
+
+    python -m benchmarks.bench_wire_format --sizes 100,1000,10000
+"""
+import argparse
+import gzip
+import json
+import statistics
+import time
+
+from benchmarks.bench_gh_server import synthetic_state
+from server.wire import msgpack, msgpack_dumps, msgpack_loads, to_columnar
+
+
+def mean_seconds(fn, arg, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+    return statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    formats = [
+        ("json", lambda graph: graph, lambda obj: json.dumps(obj).encode("utf8"), json.loads),
+        ("json columnar", to_columnar, lambda obj: json.dumps(obj).encode("utf8"), json.loads),
+    ]
+    if msgpack is not None:
+        formats += [
+            ("msgpack", lambda graph: graph, msgpack_dumps, msgpack_loads),
+            ("msgpack columnar", to_columnar, msgpack_dumps, msgpack_loads),
+        ]
+    else:
+        print("msgpack is not installed (pip install msgpack), only comparing JSON layouts")
+
+    print(f"{'nodes':>8}  {'format':<18}{'bytes':>10}{'gzip bytes':>12}{'encode ms':>11}{'decode ms':>11}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        graph, _, _ = synthetic_state(size, args.seed)
+        for name, layout, dumps, loads in formats:
+            data = layout(graph)
+            body = dumps(data)
+            encode = mean_seconds(dumps, data, args.repeat)
+            decode = mean_seconds(loads, body, args.repeat)
+            print(
+                f"{size:>8}  {name:<18}{len(body):>10}{len(gzip.compress(body, compresslevel=5)):>12}"
+                f"{encode * 1000:>11.2f}{decode * 1000:>11.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
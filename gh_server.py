@@ -1,117 +1,537 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, abort
 from server.config import *
 from llm_calls import *
 from utils.rag_utils import rag_call
+from server.state import SessionStore, VersionConflict
+from server.persistence import StateJournal
+from server.design_jobs import DesignJobs
+from pipeline import STAGES, DesignRefused
+from utils.json_patch import JsonPatchError
+from server.wire import msgpack, msgpack_dumps, msgpack_loads, MSGPACK_TYPES, is_graph, is_columnar, to_columnar, from_columnar, WireFormatError
+from server.json_provider import FastJSONProvider
+from server.metrics import Metrics, MetricsMiddleware, ROUTE_KEY, log_event
 import threading
 import sys
-from ui_pyqt import FlaskClientChatUI  
-from PyQt5.QtWidgets import QApplication
+import re
+import gzip
+import argparse
+import logging
 
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+
+# One state store per session: area, external_functions, generated_spaces, design_data, tree_data and graph_data.
+# A client picks its session with the X-Session-Id header or by prefixing any route with /s/<session id>,
+# e.g. /s/rhino-3/graph_data; clients that do neither share the default session.
+# Sessions are saved to state_persist_path off the request path, so a restart picks up where it left off.
+journal = None
+if state_persist_path:
+    journal = StateJournal(state_persist_path, app.json.dumps, app.json.loads, state_flush_interval)
+sessions = SessionStore(
+    idle_timeout=session_idle_timeout,
+    dumps=app.json.dumps,
+    journal=journal,
+    drop_evicted=session_drop_saved_on_evict,
+    history_keys=("graph_data",),
+    history_size=graph_history_size,
+)
+SESSION_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+class SessionPathMiddleware:
+    """Turns /s/<session id>/<route> into /<route> with an X-Session-Id header."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        parts = environ.get("PATH_INFO", "").split("/", 3)
+        if len(parts) == 4 and parts[1] == "s" and parts[2]:
+            environ["HTTP_X_SESSION_ID"] = parts[2]
+            environ["PATH_INFO"] = "/" + parts[3]
+        return self.wsgi_app(environ, start_response)
+
+
+app.wsgi_app = SessionPathMiddleware(app.wsgi_app)
+
+metrics = Metrics()
+metrics.add_gauge("sessions", "Sessions with state in memory.", lambda: len(sessions.stats()))
+app.wsgi_app = MetricsMiddleware(app.wsgi_app, metrics, log_sample=request_log_sample)
+
+
+@app.before_request
+def label_route():
+    # Label metrics with the route template, so session ids never become labels
+    request.environ[ROUTE_KEY] = request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def current_state():
+    session_id = request.headers.get("X-Session-Id")
+    if session_id is not None and not SESSION_ID.match(session_id):
+        abort(400, description="Session ids may only contain letters, digits, '_', '.' and '-' (at most 64).")
+    return sessions.get(session_id)
 
-area = None
-external_functions = None
-generated_spaces = None
-geometry_data = None
-design_data = None
-tree_data = None
-graph_data = None
 width = None
 length = None
 
+
+def conditional_json(key, view, build):
+    """
+    Respond with build(value of key), tagged with the key's ETag.
+    The body is JSON unless the client asks for MessagePack (Accept: application/msgpack or
+    ?format=msgpack); ?layout=columnar sends graph data as parallel arrays (see server/wire.py).
+    Clients that send the ETag back in If-None-Match get an empty 304 while the value is unchanged.
+    """
+    entry = current_state().entry(key)
+    # Every representation gets its own cached body and its own ETag
+    suffix = ""
+    if request.args.get("layout") == "columnar":
+        build = columnar(build)
+        view += ".columnar"
+        suffix += "-col"
+    dumps = None
+    mimetype = "application/json"
+    if wants_msgpack():
+        dumps = msgpack_dumps
+        view += ".msgpack"
+        suffix += "-mp"
+        mimetype = MSGPACK_TYPES[0]
+
+    # Bodies are serialized and compressed once per version, so this is cheap for repeated GETs
+    body = entry.body(view, build, dumps)
+    gzipped = len(body) >= gzip_min_bytes and accepts_gzip()
+    etag = entry.etag + suffix + ("-gz" if gzipped else "")
+    # A POST (/plot_area) must get its body: If-None-Match only short-circuits reads
+    if request.method in ("GET", "HEAD") and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    elif gzipped:
+        response = Response(entry.gzip_body(view, build, gzip_level, dumps), mimetype=mimetype)
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.vary.add("Accept")
+    response.vary.add("Accept-Encoding")
+    response.headers["X-State-Version"] = str(entry.version)
+    # Let caches keep the body but make them check with us before reusing it
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def columnar(build):
+    def build_columnar(value):
+        body = build(value)
+        return to_columnar(body) if is_graph(body) else body
+    return build_columnar
+
+
+def wants_msgpack():
+    # Falls back to JSON when msgpack is not installed
+    if msgpack is None:
+        return False
+    if request.args.get("format") == "msgpack":
+        return True
+    return request.accept_mimetypes.best_match(("application/json",) + MSGPACK_TYPES) in MSGPACK_TYPES
+
+
+def request_payload(force=False):
+    """The request body as Python data, sent as JSON or as MessagePack."""
+    if request.mimetype in MSGPACK_TYPES:
+        if msgpack is None:
+            abort(415, description="MessagePack bodies need the msgpack package on the server.")
+        return msgpack_loads(request.get_data())
+    return request.get_json(force=force)
+
+
+def accepts_gzip():
+    return "gzip" in request.accept_encodings
+
+
+@app.after_request
+def compress_response(response):
+    # Large JSON bodies from the other routes, e.g. the graph echoed back after a POST
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype != "application/json"
+        or not accepts_gzip()
+    ):
+        return response
+    body = response.get_data()
+    if len(body) >= gzip_min_bytes:
+        response.set_data(gzip.compress(body, compresslevel=gzip_level))
+        response.headers["Content-Encoding"] = "gzip"
+        response.vary.add("Accept-Encoding")
+    return response
+
+
+def log_stored(key, entry):
+    # A summary instead of the payload, which can be megabytes for large graphs
+    log_event(
+        "state_set",
+        sample=state_log_sample,
+        key=key,
+        version=entry.version,
+        etag=entry.etag,
+        request_bytes=request.content_length,
+        session=request.headers.get("X-Session-Id", sessions.default),
+    )
+
+
 @app.route('/plot_area', methods=['GET', 'POST'])
 def get_plot_area():
-    global area
+    state = current_state()
     if request.method == 'POST':
-        data = request.get_json()
-        area = data.get('input')
-        print("Received user input:", area)
-        return jsonify({"area": area, "width": width, "length": length})
-    else:  # GET
-        return jsonify({"area": area, "width": width, "length": length})
+        data = request_payload()
+        log_stored("area", state.set("area", data.get('input')))
+    return conditional_json("area", "plot_area", lambda area: {"area": area, "width": width, "length": length})
     
 @app.route('/external_functions', methods=['POST', 'GET'])
 def handle_external_functions():
-    global external_functions
+    state = current_state()
     if request.method == 'POST':
-        data = request.get_json()
-        external_functions = data.get('functions', [])
-        print("Received functions from UI:", external_functions)
+        data = request_payload()
+        log_stored("external_functions", state.set("external_functions", data.get('functions', [])))
         return jsonify({"status": "Functions updated successfully."})
     elif request.method == 'GET':
-        if external_functions is None:
-            return jsonify({"error": "No functions available. Please call POST first."})
-        else:
-            return jsonify({"external_functions": external_functions})
+        return conditional_json("external_functions", "external_functions", lambda external_functions:
+            {"error": "No functions available. Please call POST first."} if external_functions is None
+            else {"external_functions": external_functions})
 
 @app.route('/spaces', methods=['POST', 'GET'])
 def handle_generated_spaces():
-    global generated_spaces
+    state = current_state()
     if request.method == 'POST':
-        data = request.get_json()
-        generated_spaces = data.get('spaces', [])
-        print("Received spaces from UI:", generated_spaces)
+        data = request_payload()
+        log_stored("generated_spaces", state.set("generated_spaces", data.get('spaces', [])))
         return jsonify({"status": "Spaces updated successfully."})
     elif request.method == 'GET':
-        if generated_spaces is None:
-            return jsonify({"error": "No spaces available. Please call POST first."})
-        else:
-            return jsonify({"spaces_generated": generated_spaces})
+        return conditional_json("generated_spaces", "spaces", lambda generated_spaces:
+            {"error": "No spaces available. Please call POST first."} if generated_spaces is None
+            else {"spaces_generated": generated_spaces})
         
 @app.route('/geometry_data', methods=['POST'])
 def set_geometry_data():
-    global design_data
-    print("Received JSON:", request.json)
-    design_data = request.json.get('geometry_data', {})
-    # print("Updated design_data:", design_data)
+    state = current_state()
+    log_stored("design_data", state.set("design_data", request_payload().get('geometry_data', {})))
     return jsonify({"status": "ok"})
 
 @app.route('/geometry_data', methods=['GET'])
 def get_geometry_data():
-    return jsonify({"geometry_data": design_data})
+    return conditional_json("design_data", "geometry_data", lambda design_data: {"geometry_data": design_data})
  
 @app.route('/send_tree_data', methods=['GET','POST'])
 def set_tree_data():
-    global tree_data
+    state = current_state()
     if request.method == 'POST':
         # Only UI or Python app should POST here, not Grasshopper
-        if not request.is_json:
+        if not request.is_json and request.mimetype not in MSGPACK_TYPES:
             return jsonify({"error": "Content-Type must be application/json. Please POST JSON from your UI or Python app, not from Grasshopper."}), 415
-        print("Received JSON tree:", request.json)
         # Accept both formats: direct tree_data or wrapped in send_tree_data
-        tree_data = request.json.get('send_tree_data', request.json)
-        print("Stored tree_data:", tree_data)
-        return jsonify({"status": "ok", "tree_data": tree_data})
+        data = request_payload()
+        entry = state.set("tree_data", data.get('send_tree_data', data))
+        log_stored("tree_data", entry)
+        return jsonify({"status": "ok", "tree_data": entry.value})
     else:
         # Grasshopper should only GET here to retrieve the latest tree data
-        print("Returning tree_data:", tree_data)
-        return jsonify({
+        return conditional_json("tree_data", "send_tree_data", lambda tree_data: {
             "tree_placement": tree_data.get("tree_placement", {}) if tree_data else {},
             "PWR": tree_data.get("PWR", {}) if tree_data else {}
         })
     
-@app.route('/graph_data', methods=['GET', 'POST'])
+def base_version():
+    """
+    The version a patch was made against: the If-Match ETag or ?base=, None if neither is given
+    (or If-Match is *). Weak ETags count as well, W/"3-..." names version 3 like "3-...". Raises
+    ValueError if If-Match is not one ETag from this server or base is not a version number.
+    """
+    if "If-Match" in request.headers:
+        if request.if_match.star_tag:
+            return None
+        tags = request.if_match.as_set(include_weak=True)
+        if len(tags) != 1:
+            raise ValueError("If-Match must hold exactly one ETag")
+        return int(next(iter(tags)).split("-", 1)[0])
+    if "base" in request.args:
+        return int(request.args["base"])
+    return None
+
+
+@app.route('/graph_data', methods=['GET', 'POST', 'PATCH'])
 def handle_graph_data():
-    global graph_data
+    state = current_state()
     if request.method == 'POST':
-        print("POST request received for graph data. Raw JSON:", request.json)
-        graph_data = request.json.get('graph_data', request.json)
-        print("Stored graph_data:", graph_data)
-        return jsonify({"status": "ok", "graph_data": graph_data})
+        data = request_payload()
+        graph_data = data.get('graph_data', data)
+        if is_columnar(graph_data):
+            try:
+                graph_data = from_columnar(graph_data)
+            except WireFormatError as e:
+                return jsonify({"error": f"Invalid columnar graph_data: {e}"}), 400
+        entry = state.set("graph_data", graph_data)
+        log_stored("graph_data", entry)
+        return jsonify({"status": "ok", "version": entry.version, "etag": entry.etag, "graph_data": entry.value})
+    elif request.method == 'PATCH':
+        # RFC 6902 JSON Patch against the version in If-Match (or ?base=); without one it applies to whatever is current
+        try:
+            base = base_version()
+        except ValueError:
+            return jsonify({"error": "If-Match must be one ETag from this server and base a version number."}), 400
+        try:
+            entry = state.patch("graph_data", request_payload(force=True), base)
+        except VersionConflict as e:
+            return jsonify({"error": str(e), "version": e.entry.version, "etag": e.entry.etag}), 409
+        except JsonPatchError as e:
+            return jsonify({"error": f"Invalid patch: {e}"}), 422
+        log_stored("graph_data", entry)
+        return jsonify({"status": "ok", "version": entry.version, "etag": entry.etag})
+    elif "since" in request.args:
+        # Only what changed after the client's version, or the whole graph if that is too old
+        try:
+            since = int(request.args["since"])
+        except ValueError:
+            return jsonify({"error": "since must be a version number."}), 400
+        entry, patch = state.patch_since("graph_data", since)
+        if patch is None:
+            return jsonify({"version": entry.version, "etag": entry.etag, "graph_data": entry.value})
+        return jsonify({"version": entry.version, "etag": entry.etag, "since": since, "patch": patch})
     else:  # GET
-        print("GET request received for graph data. Current data:", graph_data)
-        if graph_data is None:
-            return jsonify({"error": "No graph data available. Please generate a graph first."})
         # Return the entire graph data structure as one JSON object
-        return jsonify(graph_data)  # Send the complete graph data structure
+        return conditional_json("graph_data", "graph_data", lambda graph_data:
+            {"error": "No graph data available. Please generate a graph first."} if graph_data is None
+            else graph_data)
+
+class PushSlots:
+    """Counts the open /events streams and waiting /poll requests, up to limit at a time."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.open = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.open >= self.limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+push_slots = PushSlots(max(1, server_threads - push_reserved_threads))
+metrics.add_gauge("push_connections", "Open /events streams and waiting /poll requests.", lambda: push_slots.open)
+
+
+def push_unavailable():
+    response = jsonify({"error": f"Too many /events and /poll clients (at most {push_slots.limit}), try again shortly."})
+    response.status_code = 503
+    response.headers["Retry-After"] = "5"
+    return response
+
+
+# Keys that /events and /poll report changes for
+EVENT_KEYS = ["graph_data", "design_data", "tree_data", "generated_spaces", "area", "external_functions"]
+
+
+def requested_keys():
+    keys = [key for key in request.args.get("keys", "").split(",") if key]
+    unknown = [key for key in keys if key not in EVENT_KEYS]
+    if unknown:
+        return None, (jsonify({"error": f"Unknown keys: {unknown}. Choose from {EVENT_KEYS}."}), 400)
+    return keys or EVENT_KEYS, None
+
+
+def wants_values():
+    return request.args.get("values", "0").lower() in ("1", "true", "yes")
+
+
+@app.route('/events', methods=['GET'])
+def stream_events():
+    """
+    Server-Sent Events: one "change" event per changed key, with its version and ETag, and the
+    value too when called with ?values=1. Limit the keys with ?keys=graph_data,tree_data.
+    On connect every key changed after Last-Event-ID (all keys for a new client) is sent first.
+    """
+    keys, error = requested_keys()
+    if error:
+        return error
+    state = current_state()
+    include_values = wants_values()
+    since = request.headers.get("Last-Event-ID", "0")
+    since = int(since) if since.isdigit() else 0
+    if not push_slots.acquire():
+        return push_unavailable()
+    subscription = state.subscribe(keys, max_events=event_queue_size)
+
+    def format_event(event):
+        if include_values:
+            # Send whatever is current; a newer version of the key supersedes this event anyway
+            event = state.entry(event["key"]).event(event["key"], include_value=True)
+        return f"id: {event['version']}\nevent: change\ndata: {app.json.dumps(event)}\n\n"
+
+    def events():
+        try:
+            # Subscribed before reading the snapshot, so no change can fall between the two
+            sent = 0
+            for event in state.changes_since(keys, since):
+                sent = max(sent, event["version"])
+                yield format_event(event)
+            while True:
+                pending = subscription.get(timeout=event_keepalive)
+                if not pending:
+                    yield ": keep-alive\n\n"
+                    continue
+                for event in pending:
+                    if event["version"] > sent:
+                        yield format_event(event)
+        finally:
+            state.unsubscribe(subscription)
+
+    response = Response(events(), mimetype="text/event-stream")
+    # Also runs when the client goes away before the stream started
+    response.call_on_close(push_slots.release)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route('/poll', methods=['GET'])
+def long_poll():
+    """
+    Long-poll: waits up to ?timeout= seconds until a key changes past ?since= (a version from an
+    earlier response) and returns {"version", "changes"}; "changes" is empty on timeout.
+    """
+    keys, error = requested_keys()
+    if error:
+        return error
+    try:
+        since = int(request.args.get("since", 0))
+        timeout = min(float(request.args.get("timeout", 25)), poll_max_timeout)
+    except ValueError:
+        return jsonify({"error": "since must be an integer and timeout a number of seconds."}), 400
+    state = current_state()
+    if not push_slots.acquire():
+        return push_unavailable()
+    try:
+        changes = state.wait_for_changes(keys, since, timeout, include_values=wants_values())
+    finally:
+        push_slots.release()
+    version = max([since] + [change["version"] for change in changes])
+    return jsonify({"version": version, "changes": changes})
+
+
+design_jobs = DesignJobs(STAGES, refused=(DesignRefused,), max_workers=design_job_workers, history=design_job_history)
+metrics.add_gauge("design_jobs_running", "Design jobs running right now.", design_jobs.running)
+
+# Where finished stages of a design job are stored in the job's session, for Grasshopper to GET
+DESIGN_STATE_KEYS = {
+    "functions": "external_functions",
+    "geometry": "design_data",
+    "tree_data": "tree_data",
+    "graph": "graph_data",
+}
+
+
+@app.route('/design', methods=['POST'])
+def start_design():
+    """
+    Start the courtyard pipeline in the background for {"brief", "area", "functions", "attributes"};
+    only brief is required. Returns 202 with the job id to follow at GET /design/<id>. Unless
+    "publish" is false, each stage's result is stored in the session as soon as it is ready.
+    """
+    data = request_payload(force=True)
+    brief = data.get("brief") if isinstance(data, dict) else None
+    if not isinstance(brief, str) or not brief.strip():
+        return jsonify({"error": "brief is required: describe the courtyard to design."}), 400
+    state = current_state()
+    area = data.get("area") or state.get("area") or 400
+    inputs = {"brief": brief, "area": area, "functions": data.get("functions"), "attributes": data.get("attributes")}
+
+    publish = None
+    if data.get("publish", True):
+        def publish(name, result):
+            if name in DESIGN_STATE_KEYS:
+                state.set(DESIGN_STATE_KEYS[name], result)
+
+    job = design_jobs.submit(inputs, publish)
+    log_event("design_started", job=job.id, session=request.headers.get("X-Session-Id", sessions.default))
+    response = jsonify({"id": job.id, "status": job.status, "url": f"/design/{job.id}"})
+    response.status_code = 202
+    response.headers["Location"] = f"/design/{job.id}"
+    return response
+
+
+@app.route('/design', methods=['GET'])
+def list_designs():
+    return jsonify({"jobs": [job.snapshot(include_results=False) for job in design_jobs.jobs()]})
+
+
+@app.route('/design/<job_id>', methods=['GET'])
+def get_design(job_id):
+    """Status of every stage and the results so far; ?results=0 leaves out the results."""
+    job = design_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"No design job {job_id}."}), 404
+    return jsonify(job.snapshot(include_results=request.args.get("results", "1").lower() not in ("0", "false", "no")))
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/sessions', methods=['GET'])
+def list_sessions():
+    return jsonify(sessions.stats())
+
+
+def serve(host=server_host, port=server_port, threads=server_threads):
+    """
+    Serve the gh_server routes with waitress when it is installed (pip install waitress),
+    otherwise with the threaded Werkzeug server. waitress has a pool of `threads` threads and
+    every open /events stream and waiting /poll holds one of them, so at most
+    threads - push_reserved_threads of those run at once and further ones get 503; the other
+    routes keep the remaining threads.
+    """
+    push_slots.limit = max(1, threads - push_reserved_threads)
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        from werkzeug.serving import make_server
+        # Requests are logged (sampled) by MetricsMiddleware, not once more per line by Werkzeug
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        print(f"Serving gh_server on http://{host}:{port} (Werkzeug, one thread per request; pip install waitress for a worker pool)")
+        make_server(host, port, app, threaded=True).serve_forever()
+        return
+    print(f"Serving gh_server on http://{host}:{port} (waitress, {threads} threads)")
+    waitress_serve(app, host=host, port=port, threads=threads, ident="gh_server")
 
 
 def run_flask():
-    app.run(debug=False, use_reloader=False)  # Run Flask server in a separate thread
+    serve()  # Run Flask server in a separate thread
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Grasshopper server and courtyard design copilot")
+    parser.add_argument("--headless", action="store_true", help="only run the server, without the desktop app")
+    parser.add_argument("--host", default=server_host)
+    parser.add_argument("--port", type=int, default=server_port)
+    parser.add_argument("--threads", type=int, default=server_threads)
+    args = parser.parse_args()
+    if args.headless:
+        serve(args.host, args.port, args.threads)
+        sys.exit(0)
+
+    # Qt is only needed for the desktop app, so the server can be imported without it
+    from ui_pyqt import FlaskClientChatUI
+    from PyQt5.QtWidgets import QApplication
+
     # app.run(debug=True)
     flask_thread = threading.Thread(target=run_flask, daemon=True)
     flask_thread.start()
@@ -2,15 +2,23 @@ import sys
 import json
 import os
 import random
+import threading
+import time
 from PyQt5.QtWidgets import (
     QApplication, QGraphicsView, QGraphicsScene, QGraphicsEllipseItem,
     QGraphicsLineItem, QGraphicsTextItem, QMainWindow, QVBoxLayout, QHBoxLayout,
     QWidget, QPushButton, QComboBox, QLabel, QMessageBox, QGraphicsItem
 )
-from PyQt5.QtGui import QPen, QBrush, QFont, QPainter, QColor
+from PyQt5.QtGui import QPen, QBrush, QFont, QPainter, QColor, QKeySequence
 from PyQt5.QtCore import Qt, QPointF
 from matplotlib import colormaps
 from ui_pyqt import *
+from utils.graph_sync import graph_sync
+from utils.spatial_hash import SpatialHash
+from utils.force_layout import ForceLayout
+from utils.graph_history import GraphHistory
+from utils.command_stack import Command, CommandStack
+from jobs import JobRunner
 
 
 class NodeItem(QGraphicsEllipseItem):
@@ -30,6 +38,10 @@ class NodeItem(QGraphicsEllipseItem):
         self.node_id = node_id
         self.anchor = anchor
         self.resizing = False
+        # A new token on every press, so the undo commands of one drag merge
+        self.gesture = None
+        # Set by GraphEditor.add_node_item, so editor() does not look through the scene's views on every move
+        self.graph_editor = None
 
         self.label = QGraphicsTextItem(label)
         self.label.setFont(QFont("Arial", 10))
@@ -40,6 +52,17 @@ class NodeItem(QGraphicsEllipseItem):
     def center_label(self):
         self.label.setPos(-self.label.boundingRect().width() / 2, -10)
 
+    def editor(self):
+        """The GraphEditor showing this node, or None."""
+        if self.scene() is None:
+            return None
+        if self.graph_editor is not None:
+            return self.graph_editor
+        views = self.scene().views()
+        if views and isinstance(views[0], GraphEditor):
+            return views[0]
+        return None
+
     def hoverMoveEvent(self, event):
         dist = event.pos().manhattanLength()
         if abs(dist - self.radius) < 6:
@@ -48,6 +71,7 @@ class NodeItem(QGraphicsEllipseItem):
             self.setCursor(Qt.ArrowCursor)
 
     def mousePressEvent(self, event):
+        self.gesture = object()
         dist = event.pos().manhattanLength()
         if abs(dist - self.radius) < 6:
             self.resizing = True
@@ -55,48 +79,72 @@ class NodeItem(QGraphicsEllipseItem):
             super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event):
-        if self.resizing and not self.anchor:
-            new_radius = max(10, event.pos().manhattanLength())
-            self.radius = new_radius
-            self.setRect(-self.radius, -self.radius, self.radius * 2, self.radius * 2)
-            self.center_label()
-            self.resolve_collisions()
-        else:
-            super().mouseMoveEvent(event)
-            self.resolve_collisions()
+        # Everything this mouse move changes, including the nodes pushed aside, is one undo step
+        editor = self.editor()
+        if editor is not None:
+            editor.begin_edit()
+        try:
+            if self.resizing and not self.anchor:
+                if editor is not None:
+                    editor.record_node(self)
+                new_radius = max(10, event.pos().manhattanLength())
+                self.radius = new_radius
+                self.setRect(-self.radius, -self.radius, self.radius * 2, self.radius * 2)
+                self.center_label()
+                if editor is not None:
+                    editor.index_node(self)
+                self.resolve_collisions()
+            else:
+                super().mouseMoveEvent(event)
+                self.resolve_collisions()
+        finally:
+            if editor is not None:
+                editor.end_edit("Resize" if self.resizing else "Move", self.gesture)
 
     def mouseReleaseEvent(self, event):
         self.resizing = False
         super().mouseReleaseEvent(event)
 
     def resolve_collisions(self):
-        for item in self.scene().items():
-            if isinstance(item, NodeItem) and item != self:
-                dx = self.scenePos().x() - item.scenePos().x()
-                dy = self.scenePos().y() - item.scenePos().y()
-                dist = (dx ** 2 + dy ** 2) ** 0.5
-                min_dist = self.radius + item.radius
-
-                if dist < min_dist and dist != 0:
-                    overlap = min_dist - dist + 1
-                    nx, ny = dx / dist, dy / dist
-                    self.moveBy(nx * overlap / 2, ny * overlap / 2)
-                    if not item.anchor:
-                        item.moveBy(-nx * overlap / 2, -ny * overlap / 2)
+        editor = self.editor()
+        if editor is not None:
+            # Only the nodes in neighbouring cells of the editor's spatial index can overlap
+            pos = self.scenePos()
+            others = editor.spatial_index.near(pos.x(), pos.y(), self.radius, exclude=self)
+        else:
+            others = [item for item in self.scene().items() if isinstance(item, NodeItem) and item != self]
+        for item in others:
+            dx = self.scenePos().x() - item.scenePos().x()
+            dy = self.scenePos().y() - item.scenePos().y()
+            dist = (dx ** 2 + dy ** 2) ** 0.5
+            min_dist = self.radius + item.radius
+
+            if dist < min_dist and dist != 0:
+                overlap = min_dist - dist + 1
+                nx, ny = dx / dist, dy / dist
+                self.moveBy(nx * overlap / 2, ny * overlap / 2)
+                if not item.anchor:
+                    item.moveBy(-nx * overlap / 2, -ny * overlap / 2)
 
     def itemChange(self, change, value):
         if change == QGraphicsItem.ItemPositionChange and self.scene():
             # Get the new position
             new_pos = value
             # Get the parent GraphEditor
-            editor = self.scene().views()[0]
-            if isinstance(editor, GraphEditor):
+            editor = self.editor()
+            if editor is not None and not editor.moving_nodes:
+                editor.record_node(self)
                 # Transform to grid coordinates and clamp
                 grid_x, grid_y = editor.transform_to_grid_coords(new_pos.x(), new_pos.y())
                 # Transform back to scene coordinates
                 scene_x, scene_y = editor.transform_to_scene_coords(grid_x, grid_y)
                 # Return the clamped scene position
                 return QPointF(scene_x, scene_y)
+        elif change == QGraphicsItem.ItemPositionHasChanged and self.scene():
+            # Keep the spatial index and this node's edges in step with every move, dragged or pushed
+            editor = self.editor()
+            if editor is not None and not editor.moving_nodes:
+                editor.node_moved(self)
         return super().itemChange(change, value)
 
 
@@ -126,6 +174,68 @@ class EdgeItem(QGraphicsLineItem):
         super().hoverLeaveEvent(event)
 
 
+class NodesCommand(Command):
+    """Moved or resized nodes: the (x, y, radius) of every changed node before and after."""
+
+    def __init__(self, editor, text, before, after, merge_key=None):
+        self.editor = editor
+        self.text = text
+        self.before = before
+        self.after = after
+        self.merge_key = merge_key
+
+    def undo(self):
+        self.editor.set_node_states(self.before)
+
+    def redo(self):
+        self.editor.set_node_states(self.after)
+
+    def merge(self, other):
+        # Keep the first state of every node and the last one
+        for nid, state in other.before.items():
+            self.before.setdefault(nid, state)
+        self.after.update(other.after)
+        return True
+
+    def size(self):
+        return 200 + 150 * (len(self.before) + len(self.after))
+
+
+class EdgeCommand(Command):
+    """An edge between two node ids that was added, or removed if added is False."""
+
+    def __init__(self, editor, id1, id2, added):
+        self.editor = editor
+        self.id1 = id1
+        self.id2 = id2
+        self.added = added
+        self.text = "Add edge" if added else "Remove edge"
+
+    def undo(self):
+        self.editor.set_edge(self.id1, self.id2, not self.added)
+
+    def redo(self):
+        self.editor.set_edge(self.id1, self.id2, self.added)
+
+
+def run_layout(job, engine, budget, max_iterations, frame_interval, frame_shown):
+    """
+    Runs on a JobRunner thread: iterates the layout until it settles, publishing the positions at
+    most every frame_interval seconds and only once the editor has drawn the previous frame.
+    """
+    last_frame = 0.0
+    while not engine.settled and engine.iterations < max_iterations:
+        job.check_cancelled()
+        engine.step(budget)
+        now = time.perf_counter()
+        if now - last_frame >= frame_interval and frame_shown.is_set():
+            frame_shown.clear()
+            job.publish(engine.positions.copy())
+            last_frame = now
+    print(f"Auto layout finished after {engine.iterations} iterations")
+    return engine.positions.copy()
+
+
 class GraphEditor(QGraphicsView):
     def __init__(self, graph_data):
         super().__init__()
@@ -134,9 +244,32 @@ class GraphEditor(QGraphicsView):
         self.setSceneRect(0, 0, 1000, 800)
 
         self.nodes = {}
-        self.edges = []
-        self.edge_pairs = set()
+        # Edges by the (unordered) ids of their nodes, and the edges of every node id
+        self.edges = {}
+        self.incident_edges = {}
         self.selected_node = None
+        # Node centres and radii, so collision checks only look at nearby nodes
+        self.spatial_index = SpatialHash(cell_size=100)
+        # True while show_layout_frame moves many nodes at once
+        self.moving_nodes = False
+        # Node ids and link keys edited since the last shown version, see show_version
+        self.dirty_nodes = set()
+        self.dirty_links = set()
+        # Undo/redo of moves, resizes and edges, within a memory budget in bytes. While an edit
+        # is recorded, recording holds the state of every node it changed from before the edit
+        self.UNDO_MEMORY_BUDGET = 4 * 1024 * 1024
+        self.undo_stack = CommandStack(self.UNDO_MEMORY_BUDGET)
+        self.recording = None
+        self.layout_before = None
+
+        # Auto layout: seconds per layout iteration, iteration limit and time between drawn frames
+        self.LAYOUT_BUDGET = 0.01
+        self.LAYOUT_MAX_ITERATIONS = 3000
+        self.LAYOUT_FRAME_INTERVAL = 1 / 30
+        self.layout_runner = JobRunner(self)
+        self.layout_runner.busy_changed.connect(self.layout_busy_changed)
+        self.layout_items = []
+        self.layout_frame_shown = threading.Event()
 
         self.summer = colormaps.get_cmap("summer")
         # Define size conversion constants
@@ -153,6 +286,8 @@ class GraphEditor(QGraphicsView):
         
         self.load_graph(graph_data)
         self.add_cardinal_directions()
+        self.dirty_nodes.clear()
+        self.dirty_links.clear()
 
     def add_cardinal_directions(self):
         # Add cardinal direction nodes at the edges of the grid
@@ -168,8 +303,7 @@ class GraphEditor(QGraphicsView):
             scene_x, scene_y = self.transform_to_scene_coords(x, y)
             item = NodeItem(direction, scene_x, scene_y, True, direction, QColor("black"), 30)
             item.label.setDefaultTextColor(Qt.black)
-            self.scene().addItem(item)
-            self.nodes[direction] = item
+            self.add_node_item(item)
 
     def transform_to_scene_coords(self, x, y):
         """Transform grid coordinates to scene coordinates"""
@@ -200,43 +334,274 @@ class GraphEditor(QGraphicsView):
 
     def load_graph(self, data):
         for i, node in enumerate(data["nodes"]):
-            nid = node["id"]
-            # Get coordinates from node data
-            x, y = node["pos"]["x"], node["pos"]["y"]
-            # Clamp coordinates to valid ranges
-            x = max(self.X_MIN, min(self.X_MAX, x))
-            y = max(self.Y_MIN, min(self.Y_MAX, y))
-            # Transform to scene coordinates
-            scene_x, scene_y = self.transform_to_scene_coords(x, y)
-            
-            anchor = node.get("anchor", False)
-            weight = node.get("weight", 4)  # Default weight of 4 gives radius of 20
-            # Scale weight to a reasonable node size (between 30 and 100)
-            node_size = min(max(weight * self.WEIGHT_TO_RADIUS, 30), 100)
-
-            if anchor:
-                color = QColor.fromHsv(300 + random.randint(-20, 20), 200, 255)
-            else:
-                rgba = self.summer(i / max(1, len(data["nodes"]) - 1))
-                color = QColor.fromRgbF(*rgba[:3])
-
-            item = NodeItem(nid, scene_x, scene_y, anchor, nid, color, node_size)
-            item.label.setDefaultTextColor(Qt.black)
-            self.scene().addItem(item)
-            self.nodes[nid] = item
+            self.add_node(node, i / max(1, len(data["nodes"]) - 1))
 
         for link in data["links"]:
             self.add_edge(link["source"], link["target"])
 
+    def node_scene_pos(self, node):
+        # Get coordinates from node data
+        x, y = node["pos"]["x"], node["pos"]["y"]
+        # Clamp coordinates to valid ranges
+        x = max(self.X_MIN, min(self.X_MAX, x))
+        y = max(self.Y_MIN, min(self.Y_MAX, y))
+        # Transform to scene coordinates
+        return self.transform_to_scene_coords(x, y)
+
+    def node_radius(self, node):
+        weight = node.get("weight", 4)  # Default weight of 4 gives radius of 20
+        # Scale weight to a reasonable node size (between 30 and 100)
+        return min(max(weight * self.WEIGHT_TO_RADIUS, 30), 100)
+
+    def add_node(self, node, shade):
+        """Add a NodeItem for node data; shade (0..1) picks its colour from the colormap."""
+        nid = node["id"]
+        scene_x, scene_y = self.node_scene_pos(node)
+        anchor = node.get("anchor", False)
+        node_size = self.node_radius(node)
+
+        if anchor:
+            color = QColor.fromHsv(300 + random.randint(-20, 20), 200, 255)
+        else:
+            rgba = self.summer(shade)
+            color = QColor.fromRgbF(*rgba[:3])
+
+        item = NodeItem(nid, scene_x, scene_y, anchor, nid, color, node_size)
+        item.label.setDefaultTextColor(Qt.black)
+        self.add_node_item(item)
+        return item
+
+    def remove_node(self, item):
+        for edge in list(self.incident_edges.pop(item.node_id, ())):
+            self.remove_edge(edge)
+        self.spatial_index.remove(item)
+        self.scene().removeItem(item)
+        del self.nodes[item.node_id]
+        self.dirty_nodes.add(item.node_id)
+
+    def set_node_radius(self, item, radius):
+        if radius != item.radius:
+            item.radius = radius
+            item.setRect(-radius, -radius, radius * 2, radius * 2)
+            item.center_label()
+            self.index_node(item)
+
+    def update_node(self, item, node):
+        """Bring an existing NodeItem in line with node data."""
+        anchor = node.get("anchor", False)
+        if anchor != item.anchor:
+            item.anchor = anchor
+            item.setFlag(QGraphicsEllipseItem.ItemIsMovable, not anchor)
+            self.restore_node_color(item.node_id)
+        self.set_node_radius(item, self.node_radius(node))
+        scene_x, scene_y = self.node_scene_pos(node)
+        # Saved positions are rounded, so leave nodes that are already there
+        if abs(item.x() - scene_x) > 0.5 or abs(item.y() - scene_y) > 0.5:
+            item.setPos(scene_x, scene_y)
+
+    def show_version(self, nodes, links, node_ids, link_keys):
+        """
+        Show a version in place: nodes by id and links by link key, as kept by GraphHistory.
+        Only the given node ids and link keys (the ones that differ from the version shown last)
+        and the ones edited since are updated; the other items are left as they are.
+        """
+        self.stop_auto_layout()
+        node_ids = (set(node_ids) | self.dirty_nodes) - {"N", "E", "S", "W"}
+        link_keys = set(link_keys) | self.dirty_links
+        for nid in node_ids:
+            node, item = nodes.get(nid), self.nodes.get(nid)
+            if node is None:
+                if item is not None:
+                    self.remove_node(item)
+            elif item is None:
+                self.add_node(node, 1.0)
+                self.restore_node_color(nid)
+            else:
+                self.update_node(item, node)
+        for key in link_keys:
+            link, edge = links.get(key), self.edges.get(key)
+            if link is None and edge is not None:
+                self.remove_edge(edge)
+            elif link is not None and edge is None and link["source"] in self.nodes and link["target"] in self.nodes:
+                self.add_edge(link["source"], link["target"])
+        self.dirty_nodes.clear()
+        self.dirty_links.clear()
+        # Undo steps from another version would mix the two
+        if node_ids or link_keys:
+            self.undo_stack.clear()
+
+    def node_state(self, item):
+        return item.x(), item.y(), item.radius
+
+    def record_node(self, item):
+        """Keep the state of item from before the edit that is being recorded."""
+        if self.recording is not None and item.node_id not in self.recording:
+            self.recording[item.node_id] = self.node_state(item)
+
+    def begin_edit(self):
+        if self.recording is None:
+            self.recording = {}
+
+    def end_edit(self, text, merge_key=None):
+        before, self.recording = self.recording, None
+        if before:
+            self.push_node_changes(text, before, merge_key)
+
+    def push_node_changes(self, text, before, merge_key=None):
+        after = {}
+        for nid in list(before):
+            item = self.nodes.get(nid)
+            state = self.node_state(item) if item is not None else None
+            if state is None or state == before[nid]:
+                del before[nid]
+            else:
+                after[nid] = state
+        if after:
+            self.undo_stack.push(NodesCommand(self, text, before, after, merge_key))
+
+    def set_node_states(self, states):
+        for nid, (x, y, radius) in states.items():
+            item = self.nodes.get(nid)
+            if item is not None:
+                self.set_node_radius(item, radius)
+                item.setPos(x, y)
+
+    def set_edge(self, id1, id2, present):
+        edge = self.edges.get(frozenset((id1, id2)))
+        if present and edge is None and id1 in self.nodes and id2 in self.nodes:
+            self.add_edge(id1, id2)
+        elif not present and edge is not None:
+            self.remove_edge(edge)
+
+    def undo(self):
+        self.stop_auto_layout()
+        command = self.undo_stack.undo()
+        if command is not None:
+            print(f"Undo {command.text}")
+
+    def redo(self):
+        self.stop_auto_layout()
+        command = self.undo_stack.redo()
+        if command is not None:
+            print(f"Redo {command.text}")
+
+    def add_node_item(self, item):
+        self.scene().addItem(item)
+        item.graph_editor = self
+        self.nodes[item.node_id] = item
+        self.index_node(item)
+
+    def index_node(self, item):
+        pos = item.scenePos()
+        self.spatial_index.move(item, pos.x(), pos.y(), item.radius)
+        self.dirty_nodes.add(item.node_id)
+
+    def node_moved(self, item):
+        self.index_node(item)
+        for edge in self.incident_edges.get(item.node_id, ()):
+            edge.update_position()
+
     def add_edge(self, id1, id2):
-        if (id1, id2) in self.edge_pairs or (id2, id1) in self.edge_pairs:
-            return
+        key = frozenset((id1, id2))
+        if key in self.edges:
+            return None
         edge = EdgeItem(self.nodes[id1], self.nodes[id2])
         self.scene().addItem(edge)
-        self.edges.append(edge)
-        self.edge_pairs.add((id1, id2))
+        self.edges[key] = edge
+        self.dirty_links.add(key)
+        self.incident_edges.setdefault(id1, set()).add(edge)
+        self.incident_edges.setdefault(id2, set()).add(edge)
+        return edge
+
+    def remove_edge(self, edge):
+        id1, id2 = edge.node1.node_id, edge.node2.node_id
+        self.scene().removeItem(edge)
+        self.edges.pop(frozenset((id1, id2)), None)
+        self.dirty_links.add(frozenset((id1, id2)))
+        self.incident_edges.get(id1, set()).discard(edge)
+        self.incident_edges.get(id2, set()).discard(edge)
+
+    def start_auto_layout(self):
+        """Start laying out the graph in the background; the nodes move as the layout runs."""
+        if self.layout_runner.is_busy():
+            return None
+        # The whole layout is one undo step
+        self.layout_before = {nid: self.node_state(item) for nid, item in self.nodes.items()}
+        self.layout_frame_shown.set()
+        return self.layout_runner.submit(
+            "auto_layout",
+            run_layout,
+            self.layout_engine(),
+            self.LAYOUT_BUDGET,
+            self.LAYOUT_MAX_ITERATIONS,
+            self.LAYOUT_FRAME_INTERVAL,
+            self.layout_frame_shown,
+            on_update=self.show_layout_frame,
+            on_result=self.show_layout_frame,
+        )
+
+    def layout_engine(self):
+        """A ForceLayout of the nodes in the scene; its positions follow the order of self.layout_items."""
+        items = [item for item in self.scene().items() if isinstance(item, NodeItem)]
+        index = {item: i for i, item in enumerate(items)}
+        self.layout_items = items
+        return ForceLayout(
+            positions=[(item.scenePos().x(), item.scenePos().y()) for item in items],
+            radii=[item.radius for item in items],
+            edges=[(index[edge.node1], index[edge.node2]) for edge in self.edges.values()],
+            fixed=[item.anchor for item in items],
+            bounds=self.scene_bounds(),
+        )
+
+    def stop_auto_layout(self):
+        self.layout_runner.cancel()
+        # Frames already on their way to the GUI thread must not move the nodes any more
+        self.layout_items = []
+        self.finish_layout_edit()
+
+    def finish_layout_edit(self):
+        before, self.layout_before = self.layout_before, None
+        if before:
+            self.push_node_changes("Auto layout", before)
+
+    def layout_busy_changed(self, running):
+        # Qt's BSP index keeps rebuilding while every node moves, which stalls frames for up to a
+        # second on large graphs, so the scene goes without it while the layout runs
+        if running:
+            self.scene().setItemIndexMethod(QGraphicsScene.NoIndex)
+        else:
+            self.scene().setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+            self.finish_layout_edit()
+
+    def show_layout_frame(self, positions):
+        # The layout already keeps nodes on the grid, so itemChange skips the clamp and the index
+        # and edges are updated once per frame instead of once per node (an edge has two)
+        moved = []
+        self.moving_nodes = True
+        try:
+            for item, (x, y) in zip(self.layout_items, positions):
+                if not item.anchor and (abs(item.x() - x) > 0.25 or abs(item.y() - y) > 0.25):
+                    item.setPos(x, y)
+                    moved.append(item)
+        finally:
+            self.moving_nodes = False
+        edges = set()
+        for item in moved:
+            self.index_node(item)
+            edges.update(self.incident_edges.get(item.node_id, ()))
+        for edge in edges:
+            edge.update_position()
+        self.layout_frame_shown.set()
+
+    def scene_bounds(self):
+        """The grid (X_MIN..X_MAX, Y_MIN..Y_MAX) in scene coordinates, as (x_min, x_max, y_min, y_max)."""
+        left, top = self.transform_to_scene_coords(self.X_MIN, self.Y_MAX)
+        right, bottom = self.transform_to_scene_coords(self.X_MAX, self.Y_MIN)
+        return left, right, top, bottom
 
     def mousePressEvent(self, event):
+        # Grabbing the graph takes it over from a running auto layout
+        self.stop_auto_layout()
         item = self.itemAt(event.pos())
         modifiers = QApplication.keyboardModifiers()
 
@@ -247,29 +612,26 @@ class GraphEditor(QGraphicsView):
                     self.selected_node = node_id
                     item.setBrush(QBrush(Qt.yellow))
                 else:
-                    if self.selected_node != node_id:
-                        self.add_edge(self.selected_node, node_id)
+                    if self.selected_node != node_id and self.add_edge(self.selected_node, node_id) is not None:
+                        self.undo_stack.push(EdgeCommand(self, self.selected_node, node_id, added=True))
                     self.restore_node_color(self.selected_node)
                     self.selected_node = None
         elif isinstance(item, EdgeItem):
             if event.button() == Qt.RightButton:
-                self.scene().removeItem(item)
-                self.edges.remove(item)
-                self.edge_pairs.discard((item.node1.node_id, item.node2.node_id))
-                self.edge_pairs.discard((item.node2.node_id, item.node1.node_id))
+                self.remove_edge(item)
+                self.undo_stack.push(EdgeCommand(self, item.node1.node_id, item.node2.node_id, added=False))
         else:
             if self.selected_node:
                 self.restore_node_color(self.selected_node)
                 self.selected_node = None
         super().mousePressEvent(event)
 
-    def mouseMoveEvent(self, event):
-        super().mouseMoveEvent(event)
-        for edge in self.edges:
-            edge.update_position()
-
     def keyPressEvent(self, event):
-        if event.key() == Qt.Key_S:
+        if event.matches(QKeySequence.Undo):
+            self.undo()
+        elif event.matches(QKeySequence.Redo):
+            self.redo()
+        elif event.key() == Qt.Key_S:
             self.save_graph()
 
     def restore_node_color(self, node_id):
@@ -309,7 +671,7 @@ class GraphEditor(QGraphicsView):
             nodes.append(node_data)
 
         links = [{"source": e.node1.node_id, "target": e.node2.node_id} 
-                for e in self.edges 
+                for e in self.edges.values()
                 if e.node1.node_id not in ["N", "E", "S", "W"] 
                 and e.node2.node_id not in ["N", "E", "S", "W"]]
 
@@ -326,7 +688,7 @@ class MainWindow(QMainWindow):
     def __init__(self, graph_data=None):
         super().__init__()
         self.setWindowTitle("Resizable Node Graph Editor")
-        self.versions = []  # List to store all versions
+        self.history = None  # All versions, as a base graph and the changes of every saved version
         self.current_version = 0  # Index of current version
 
         if graph_data is None:
@@ -361,6 +723,11 @@ class MainWindow(QMainWindow):
         self.version_combo.currentIndexChanged.connect(self.load_version)
         toolbar_layout.addWidget(self.version_combo)
 
+        # Auto layout button, also stops a running layout
+        self.layout_button = QPushButton("Auto Layout")
+        self.layout_button.clicked.connect(self.toggle_auto_layout)
+        toolbar_layout.addWidget(self.layout_button)
+
         # Send to Grasshopper button
         self.send_to_gh_button = QPushButton("Send to Grasshopper")
         self.send_to_gh_button.clicked.connect(self.send_to_grasshopper)
@@ -371,10 +738,11 @@ class MainWindow(QMainWindow):
 
         # Create and add graph editor
         self.editor = GraphEditor(graph_data)
+        self.editor.layout_runner.busy_changed.connect(self.update_layout_button)
         layout.addWidget(self.editor)
 
         # Store initial version
-        self.versions.append(graph_data)
+        self.history = GraphHistory(graph_data)
         self.version_combo.addItem("Version 1")
         self.resize(1000, 800)
 
@@ -382,30 +750,36 @@ class MainWindow(QMainWindow):
         # Get current graph state
         current_data = self.editor.get_graph_data()
         
-        # Add new version
-        self.versions.append(current_data)
-        self.current_version = len(self.versions) - 1
+        # Add new version; the editor already shows it
+        self.current_version = self.history.append(current_data)
+        self.editor.dirty_nodes.clear()
+        self.editor.dirty_links.clear()
         
         # Update dropdown
-        self.version_combo.addItem(f"Version {len(self.versions)}")
+        self.version_combo.addItem(f"Version {len(self.history)}")
         self.version_combo.setCurrentIndex(self.current_version)
         
         # Save to file
-        self.save_version_to_file(current_data, len(self.versions))
+        self.save_version_to_file(current_data, len(self.history))
 
     def load_version(self, index):
-        if index < 0 or index >= len(self.versions):
+        if index < 0 or index >= len(self.history):
             return
             
         self.current_version = index
-        # Create new editor with the selected version
-        new_editor = GraphEditor(self.versions[index])
-        # Replace old editor
-        layout = self.centralWidget().layout()
-        old_editor = layout.itemAt(1).widget()
-        layout.replaceWidget(old_editor, new_editor)
-        old_editor.deleteLater()
-        self.editor = new_editor
+        # Update the editor in place: only the nodes and links that differ between the versions,
+        # and the ones edited since the last save or switch, are touched
+        node_ids, link_keys = self.history.checkout(index)
+        self.editor.show_version(self.history.nodes, self.history.links, node_ids, link_keys)
+
+    def toggle_auto_layout(self):
+        if self.editor.layout_runner.is_busy():
+            self.editor.stop_auto_layout()
+        else:
+            self.editor.start_auto_layout()
+
+    def update_layout_button(self, running):
+        self.layout_button.setText("Stop Layout" if running else "Auto Layout")
 
     def save_version_to_file(self, data, version_num):
         # Save to a versioned file
@@ -421,7 +795,7 @@ class MainWindow(QMainWindow):
         """Send the current version to Grasshopper as JSON only (no CSV export)"""
         try:
             # Get the current version data (user's current layout)
-            current_data = self.versions[self.current_version]
+            current_data = self.history.version(self.current_version)
 
             # Create a directory for Grasshopper files if it doesn't exist
             gh_dir = os.path.expanduser("~/Downloads/grasshopper_versions")
@@ -432,14 +806,8 @@ class MainWindow(QMainWindow):
             with open(gh_path, "w") as f:
                 json.dump(current_data, f, indent=2)
 
-            # Send the current graph data to the server endpoint for Grasshopper
-            import requests
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(
-                "http://127.0.0.1:5000/graph_data",
-                json={"graph_data": current_data},
-                headers=headers
-            )
+            # Send the current graph data to the server endpoint for Grasshopper (only the changes after the first send)
+            response = graph_sync.send(current_data)
             if response.status_code != 200:
                 raise Exception(f"Failed to send graph to Grasshopper server: {response.text}")
 
@@ -0,0 +1,129 @@
+import threading
+import traceback
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a job function once the job has been cancelled.
+    Derives from BaseException, like asyncio.CancelledError, so the broad
+    `except Exception` handlers in the phase methods do not swallow it.
+    """
+
+
+class JobSignals(QObject):
+    progress = pyqtSignal(str)
+    partial = pyqtSignal(str)
+    update = pyqtSignal(object)
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    finished = pyqtSignal()
+
+
+class Job(QRunnable):
+    """
+    Runs fn(job, *args, **kwargs) on a QThreadPool thread.
+    The function can call job.report() to send progress messages, job.stream() to send pieces
+    of a result as they arrive, job.publish() to send intermediate values such as layout frames,
+    and job.check_cancelled() between steps to stop early.
+    Signals are delivered on the GUI thread.
+    """
+
+    def __init__(self, name, fn, *args, **kwargs):
+        super().__init__()
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"{self.name} was cancelled")
+
+    def report(self, message):
+        self.check_cancelled()
+        self.signals.progress.emit(message)
+
+    def stream(self, text):
+        self.check_cancelled()
+        self.signals.partial.emit(text)
+
+    def publish(self, value):
+        self.check_cancelled()
+        self.signals.update.emit(value)
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            result = self.fn(self, *self.args, **self.kwargs)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.error.emit(str(e))
+        else:
+            if self.is_cancelled():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class JobRunner(QObject):
+    """
+    Runs one job at a time in the background so the Qt event loop never blocks.
+    submit() refuses new work while a job is running, so repeated clicks cannot queue duplicates.
+    """
+
+    busy_changed = pyqtSignal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.current = None
+
+    def is_busy(self):
+        return self.current is not None
+
+    def submit(self, name, fn, *args, on_result=None, on_progress=None, on_partial=None, on_update=None, on_error=None, on_cancelled=None, **kwargs):
+        if self.is_busy():
+            print(f"Job {self.current.name} is still running, ignoring {name}")
+            return None
+
+        job = Job(name, fn, *args, **kwargs)
+        if on_result:
+            job.signals.result.connect(on_result)
+        if on_progress:
+            job.signals.progress.connect(on_progress)
+        if on_partial:
+            job.signals.partial.connect(on_partial)
+        if on_update:
+            job.signals.update.connect(on_update)
+        if on_error:
+            job.signals.error.connect(on_error)
+        if on_cancelled:
+            job.signals.cancelled.connect(on_cancelled)
+        job.signals.finished.connect(self._job_finished)
+
+        self.current = job
+        self.busy_changed.emit(True)
+        self.pool.start(job)
+        return job
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+
+    def _job_finished(self):
+        self.current = None
+        self.busy_changed.emit(False)
@@ -1,15 +1,176 @@
 import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from server.config import *
-
-with open("knowledge/merged.json", "r") as file:
-    json_data = json.load(file)
-
-# # Convert the JSON data to a string
-json_data_str = json.dumps(json_data)
+from utils.llm_cache import ResponseCache, make_cache_key
+from utils.embedding_service import client_backend
+from utils.rate_limit import RateLimiter, estimate_tokens
+
+response_cache = ResponseCache(llm_cache_path, max_bytes=llm_cache_max_bytes, ttl=llm_cache_ttl) if llm_cache_enabled else None
+
+rate_limiter = None
+if rate_limit_requests_per_minute or rate_limit_tokens_per_minute:
+    rate_limiter = RateLimiter(rate_limit_requests_per_minute, rate_limit_tokens_per_minute, rate_limit_burst_seconds)
+
+# Calls, token usage and wall-clock time per llm_calls function, for benchmarks
+usage_stats = {}
+_usage_lock = threading.Lock()
+
+
+def record_usage(name, seconds, usage=None, cached=False, first_token_seconds=None):
+    with _usage_lock:
+        stats = usage_stats.setdefault(name, {
+            "calls": 0,
+            "cached_calls": 0,
+            "streamed_calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "seconds": 0.0,
+            "first_token_seconds": 0.0,
+        })
+        stats["calls"] += 1
+        stats["cached_calls"] += int(cached)
+        stats["seconds"] += seconds
+        if first_token_seconds is not None:
+            stats["streamed_calls"] += 1
+            stats["first_token_seconds"] += first_token_seconds
+        if usage is not None:
+            stats["prompt_tokens"] += usage.prompt_tokens or 0
+            stats["completion_tokens"] += usage.completion_tokens or 0
+
+
+def reset_usage_stats():
+    with _usage_lock:
+        usage_stats.clear()
+
+
+def wait_for_rate_limit(kwargs):
+    """Wait until the request in kwargs fits the rate limits and return its estimated tokens."""
+    if rate_limiter is None:
+        return 0
+    estimate = estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens") or rate_limit_completion_tokens)
+    rate_limiter.acquire(estimate)
+    return estimate
+
+
+def settle_rate_limit(estimate, usage):
+    if rate_limiter is not None and usage is not None:
+        rate_limiter.settle(estimate, usage.total_tokens)
+
+
+def chat_completion(name, **kwargs):
+    """
+    Send a chat completion request on behalf of the llm_calls function `name` and return the message content.
+    Byte-identical requests are answered from the response cache if `name` is in llm_cache_functions.
+    """
+    start = time.perf_counter()
+    use_cache = response_cache is not None and name in llm_cache_functions
+    if use_cache:
+        key = make_cache_key(
+            mode,
+            client_backend(client),
+            kwargs.get("model"),
+            kwargs.get("messages"),
+            kwargs.get("response_format"),
+            kwargs.get("temperature"),
+        )
+        content = response_cache.get(key, name)
+        if content is not None:
+            print(f"Cache hit for {name}")
+            record_usage(name, time.perf_counter() - start, cached=True)
+            return content
+
+    estimate = wait_for_rate_limit(kwargs)
+    # Time spent waiting for the rate limit is not part of the call
+    start = time.perf_counter()
+    response = client.chat.completions.create(**kwargs)
+    content = response.choices[0].message.content
+    settle_rate_limit(estimate, getattr(response, "usage", None))
+    record_usage(name, time.perf_counter() - start, getattr(response, "usage", None))
+    if use_cache and content is not None:
+        response_cache.set(key, content)
+    return content
+
+
+def stream_chat_completion(name, **kwargs):
+    """
+    Streaming variant of chat_completion: yields the message content in pieces as they arrive.
+    A cached response is yielded in one piece, and the full text is cached once the stream completes.
+    """
+    start = time.perf_counter()
+    use_cache = response_cache is not None and name in llm_cache_functions
+    if use_cache:
+        key = make_cache_key(
+            mode,
+            client_backend(client),
+            kwargs.get("model"),
+            kwargs.get("messages"),
+            kwargs.get("response_format"),
+            kwargs.get("temperature"),
+        )
+        content = response_cache.get(key, name)
+        if content is not None:
+            print(f"Cache hit for {name}")
+            elapsed = time.perf_counter() - start
+            record_usage(name, elapsed, cached=True, first_token_seconds=elapsed)
+            yield content
+            return
+
+    if mode in ("openai", "fake"):
+        # Ask for token usage in the final chunk; not every OpenAI-compatible server supports it
+        kwargs["stream_options"] = {"include_usage": True}
+    estimate = wait_for_rate_limit(kwargs)
+    start = time.perf_counter()
+    stream = client.chat.completions.create(stream=True, **kwargs)
+    parts = []
+    usage = None
+    first_token_seconds = None
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - start
+                    print(f"First token for {name} after {first_token_seconds:.2f}s")
+                parts.append(delta)
+                yield delta
+    finally:
+        # Also runs when the consumer stops early, which closes the HTTP stream
+        stream.close()
+
+    content = "".join(parts)
+    settle_rate_limit(estimate, usage)
+    record_usage(name, time.perf_counter() - start, usage, first_token_seconds=first_token_seconds)
+    if use_cache and content:
+        response_cache.set(key, content)
+
+
+def extract_json(body):
+    # if body is json then return
+    if isinstance(body, dict):
+        return body  # Already a JSON object
+    json_response = None
+    match = re.search(r'\{.*\}', body, re.DOTALL)
+    if match:
+        try:
+            json_response = json.loads(match.group(0))
+        except Exception as e:
+            print(f"Failed to parse JSON: {e}")
+            print("body:", body)
+    else:
+        print("No JSON found in body.")
+        print("body:", body)
+    return json_response
 
 
 def classify_input(message):
-    response = client.chat.completions.create(
+    response = chat_completion("classify_input",
         model=completion_model,
         messages=[
             {
@@ -35,10 +196,10 @@ def classify_input(message):
             },
         ],
     )
-    return response.choices[0].message.content
+    return response
 
 
-def generate_concept_with_conversation(conversation_messages):
+def generate_concept_with_conversation(conversation_messages, stream=False):
     chat_messages = [
             {
                 "role": "system",
@@ -72,11 +233,16 @@ def generate_concept_with_conversation(conversation_messages):
     print(type(chat_messages)) # Debugging line')
     print("Generating concept with conversation history...")
     print("Conversation messages:", chat_messages)
-    response = client.chat.completions.create(
+    if stream:
+        return stream_chat_completion("generate_concept_with_conversation",
+            model=completion_model,
+            messages=chat_messages
+        )
+    response = chat_completion("generate_concept_with_conversation",
         model=completion_model,
         messages=chat_messages
     )
-    return response.choices[0].message.content
+    return response
 
 
 def extract_spaces(concept, external_functions, attributes):
@@ -133,7 +299,7 @@ def extract_spaces(concept, external_functions, attributes):
     })
     print("Extracting spaces...")
     print("Conversation messages:", chat_messages)
-    response = client.chat.completions.create(
+    response = chat_completion("extract_spaces",
         model=completion_model,
         messages=chat_messages,
         response_format={
@@ -163,8 +329,8 @@ def extract_spaces(concept, external_functions, attributes):
             }
         }
     )
-    print("Response from LLM for spaces:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM for spaces:", response)
+    return response
 
 def extract_links(concept, external_functions=None):
     # Ensure external_functions is properly formatted
@@ -252,7 +418,7 @@ def extract_links(concept, external_functions=None):
     )
     })
     print("Extracting links ...")
-    response = client.chat.completions.create(
+    response = chat_completion("extract_links",
         model=completion_model,
         messages=chat_messages,
         response_format={
@@ -279,8 +445,8 @@ def extract_links(concept, external_functions=None):
         }
     )
 
-    print("Response from LLM:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM:", response)
+    return response
 
 
 def extract_positions(concept, external_functions):
@@ -323,7 +489,7 @@ def extract_positions(concept, external_functions):
     )
     })
     print("Extracting positions ...")
-    response = client.chat.completions.create(
+    response = chat_completion("extract_positions",
         model=completion_model,
         messages=chat_messages,
         response_format=
@@ -353,8 +519,8 @@ def extract_positions(concept, external_functions):
                 }
     )
 
-    print("Response from LLM:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM:", response)
+    return response
 
 def extract_external_functions(conversation_messages):
     chat_messages = [
@@ -391,7 +557,7 @@ def extract_external_functions(conversation_messages):
     ]
     chat_messages.extend(conversation_messages)
     print("Extracting functions with conversation history...", chat_messages)
-    response = client.chat.completions.create(
+    response = chat_completion("extract_external_functions",
         model=completion_model,
         messages=chat_messages,
         response_format={
@@ -418,8 +584,8 @@ def extract_external_functions(conversation_messages):
         }
     )
 
-    print("Response from LLM:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM:", response)
+    return response
 
 
 def extract_attributes_with_conversation(conversation_messages, concept):
@@ -469,7 +635,7 @@ def extract_attributes_with_conversation(conversation_messages, concept):
     chat_messages.extend(conversation_messages)
     print("Extracting attributes with conversation history...")
     print("Conversation messages:", chat_messages)
-    response = client.chat.completions.create(
+    response = chat_completion("extract_attributes_with_conversation",
         model=completion_model,
         messages=chat_messages,
         response_format=
@@ -489,8 +655,8 @@ def extract_attributes_with_conversation(conversation_messages, concept):
                     }
                 }  
         )
-    print("Response from LLM for attributes:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM for attributes:", response)
+    return response
 
 def extract_cardinal_directions(concept, external_functions, attributes):
     chat_messages = [
@@ -530,7 +696,7 @@ def extract_cardinal_directions(concept, external_functions, attributes):
     )
     })
     print("Extracting cardinal directions...")
-    response = client.chat.completions.create(
+    response = chat_completion("extract_cardinal_directions",
         model=completion_model,
         messages=chat_messages,
         response_format=
@@ -560,8 +726,8 @@ def extract_cardinal_directions(concept, external_functions, attributes):
                 }
     )
 
-    print("Response from LLM:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM:", response)
+    return response
 
 
 def extract_weights(concept, external_functions, attributes):
@@ -617,7 +783,7 @@ def extract_weights(concept, external_functions, attributes):
     )
     })
     print("Extracting weights with conversation history...")
-    response = client.chat.completions.create(
+    response = chat_completion("extract_weights",
         model=completion_model,
         messages=chat_messages,
         response_format=
@@ -656,8 +822,8 @@ def extract_weights(concept, external_functions, attributes):
                 }
     )
 
-    print("Response from LLM:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM:", response)
+    return response
 
 def extract_anchors(concept, external_functions, attributes):
     chat_messages = [
@@ -703,7 +869,7 @@ def extract_anchors(concept, external_functions, attributes):
     )
     })
     print("Extracting anchors...")
-    response = client.chat.completions.create(
+    response = chat_completion("extract_anchors",
         model=completion_model,
         messages=chat_messages,
         response_format=
@@ -737,8 +903,8 @@ def extract_anchors(concept, external_functions, attributes):
                 }  
         )
 
-    print("Response from LLM:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM:", response)
+    return response
 
 def extract_pos(concept, external_functions):
     chat_messages = [
@@ -780,7 +946,7 @@ def extract_pos(concept, external_functions):
     )
     })
     print("Extracting pos...")
-    response = client.chat.completions.create(
+    response = chat_completion("extract_pos",
         model=completion_model,
         messages=chat_messages,
         response_format=
@@ -812,8 +978,226 @@ def extract_pos(concept, external_functions):
                         }
                     },
                 })
-    print("Response from LLM:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM:", response)
+    return response
+
+# Courtyard grid bounds shared by every coordinate the LLM produces
+X_MIN, X_MAX = -34, -4
+Y_MIN, Y_MAX = 30, 60
+
+def extract_design_bundle(concept, external_functions, attributes):
+    """
+    Extract spaces, links, positions, cardinal_directions, weights, anchors and pos
+    with a single structured-output call instead of one call per field.
+    The concept, functions and attributes are only sent once. Coordinates come back as
+    {"x", "y"} objects so each axis keeps its own bounds, and are returned as [x, y]
+    lists clamped to the grid, the same shape extract_pos produces.
+    """
+    # Ensure external_functions is properly formatted
+    if isinstance(external_functions, str):
+        try:
+            external_functions = json.loads(external_functions)
+        except json.JSONDecodeError:
+            print("Error: external_functions is not valid JSON")
+            external_functions = {}
+
+    # Extract the external_functions dictionary if it's nested
+    if isinstance(external_functions, dict) and "external_functions" in external_functions:
+        external_functions = external_functions["external_functions"]
+
+    external_function_names = list(external_functions.keys()) if external_functions else []
+
+    ALLOWED_COURTYARD_ZONES = ["play", "rest", "pond", "flower", "tree"]
+    courtyard_zone_integers = {
+        "type": "object",
+        "properties": {zone: {"type": "integer"} for zone in ALLOWED_COURTYARD_ZONES},
+        "required": ALLOWED_COURTYARD_ZONES,
+        "additionalProperties": False,
+    }
+
+    chat_messages = [
+        {
+            "role": "system",
+            "content": """
+                You are assisting in the spatial design of a courtyard.
+
+                Courtyard zones (ONLY use these exact names, no variations):
+                - play (for any social or active spaces)
+                - rest (for any quiet or contemplative spaces)
+                - pond (for any water features)
+                - flower (for any garden or planting areas)
+                - tree (for any tree or shade areas)
+
+                From the concept, the external functions and the attributes, extract all of the following in ONE JSON object:
+
+                1. "spaces": an integer grid point (1-10) for each of the 5 courtyard zones.
+                2. "links": adjacency relationships between zones and external functions, as an object mapping a source to a target.
+                   Include courtyard-to-courtyard and external-function-to-courtyard relationships, with at least one connection for each external function.
+                3. "positions": a list of "function: zone" strings attaching each external function to the courtyard zone it should sit next to.
+                4. "cardinal_directions": a list of "zone: direction" strings giving some zones a N, E, S or W orientation.
+                   Do not assign the same cardinal direction to more than one zone. Assign at least two directions.
+                5. "weights": an integer importance between 1 and 10 for each of the 5 courtyard zones. Never output null.
+                6. "anchors": "true" or "false" for every courtyard zone and external function. At least 4 must be "true".
+                7. "pos": an {"x", "y"} coordinate for every courtyard zone and external function.
+                   x must be between -34 and -4, y must be between 30 and 60. Use the full range and place related spaces closer together.
+
+                # Example Output:
+                {
+                "spaces": {"play": 1, "rest": 3, "pond": 5, "flower": 7, "tree": 9},
+                "links": {"tree": "pond", "play": "rest", "cafe": "play"},
+                "positions": ["cafe: tree", "library: flower"],
+                "cardinal_directions": ["tree: N", "play: S"],
+                "weights": {"play": 6, "rest": 4, "pond": 5, "flower": 3, "tree": 7},
+                "anchors": {"tree": "true", "pond": "true", "cafe": "true", "library": "true", "play": "false"},
+                "pos": {"tree": {"x": -20, "y": 45}, "cafe": {"x": -15, "y": 35}}
+                }
+
+                Only use the provided data. Do not include any explanations or extra text, only output the JSON object.
+                """
+        },
+    ]
+    chat_messages.append({
+    "role": "user",
+    "content": """
+        Concept: {concept}
+        External Functions: {external_functions}
+        Attributes: {attributes}
+    """.format(
+        concept=concept,
+        external_functions=json.dumps(external_functions),
+        attributes=attributes
+    )
+    })
+    print("Extracting design bundle...")
+    response = chat_completion("extract_design_bundle",
+        model=completion_model,
+        messages=chat_messages,
+        response_format={
+            "type": "json_schema",
+            "json_schema": {
+                "name": "design_bundle",
+                "description": "All geometry fields of the courtyard design in one object",
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "spaces": courtyard_zone_integers,
+                        "links": {
+                            "type": "object",
+                            "description": "Mapping of source nodes to their target nodes",
+                            "additionalProperties": {
+                                "type": "string",
+                                "enum": ALLOWED_COURTYARD_ZONES + external_function_names
+                            }
+                        },
+                        "positions": {
+                            "type": "array",
+                            "description": "Relationships between external functions and courtyard zones.",
+                            "items": {"type": "string"}
+                        },
+                        "cardinal_directions": {
+                            "type": "array",
+                            "description": "List of cardinal directions attached to their functional zones.",
+                            "items": {"type": "string"}
+                        },
+                        "weights": courtyard_zone_integers,
+                        "anchors": {
+                            "type": "object",
+                            "description": "Mapping of space/function names to boolean anchor status. Must have at least 4 true values.",
+                            "additionalProperties": {
+                                "type": "string",
+                                "enum": ["true", "false"]
+                            }
+                        },
+                        "pos": {
+                            "type": "object",
+                            "description": "Mapping of zone/function names to x, y coordinates",
+                            "additionalProperties": {
+                                "type": "object",
+                                "properties": {
+                                    "x": {"type": "number", "minimum": X_MIN, "maximum": X_MAX},
+                                    "y": {"type": "number", "minimum": Y_MIN, "maximum": Y_MAX}
+                                },
+                                "required": ["x", "y"],
+                                "additionalProperties": False
+                            }
+                        }
+                    },
+                    "required": ["spaces", "links", "positions", "cardinal_directions", "weights", "anchors", "pos"],
+                    "additionalProperties": False
+                }
+            }
+        }
+    )
+    print("Response from LLM for design bundle:", response)
+
+    bundle = extract_json(response)
+    if bundle is None:
+        raise ValueError("The design bundle response has no JSON object")
+    # Convert coordinates to the [x, y] lists extract_pos returns and keep them on the grid
+    bundle["pos"] = {
+        name: [
+            max(X_MIN, min(X_MAX, coords["x"])),
+            max(Y_MIN, min(Y_MAX, coords["y"])),
+        ]
+        for name, coords in bundle.get("pos", {}).items()
+    }
+    return json.dumps(bundle)
+
+# Geometry extractors in the order their fields appear in design_data.
+# None of them depends on another's output, so they can run concurrently.
+GEOMETRY_EXTRACTORS = {
+    "spaces": lambda concept, external_functions, attributes: extract_spaces(concept, external_functions, attributes),
+    "links": lambda concept, external_functions, attributes: extract_links(concept, external_functions),
+    "positions": lambda concept, external_functions, attributes: extract_positions(concept, external_functions),
+    "cardinal_directions": lambda concept, external_functions, attributes: extract_cardinal_directions(concept, external_functions, attributes),
+    "weights": lambda concept, external_functions, attributes: extract_weights(concept, external_functions, attributes),
+    "anchors": lambda concept, external_functions, attributes: extract_anchors(concept, external_functions, attributes),
+    "pos": lambda concept, external_functions, attributes: extract_pos(concept, external_functions),
+}
+
+def extract_geometry_data(concept, external_functions, attributes, mode="concurrent", max_workers=None):
+    """
+    Run every geometry extractor and collect the raw LLM responses.
+    mode is one of:
+    - "sequential": one call per field, one after another
+    - "concurrent": one call per field, all fired at once on a bounded thread pool,
+      so the phase costs the slowest call instead of the sum of all of them
+    - "bundle": a single extract_design_bundle call that returns every field
+    Returns (results, errors), both keyed by field name. Each result is a JSON string
+    containing its field as a top-level key. A failing extractor only shows up in errors;
+    the responses of the others are kept in results.
+    """
+    results = {}
+    errors = {}
+    if mode == "bundle":
+        try:
+            bundle = extract_design_bundle(concept, external_functions, attributes)
+        except Exception as e:
+            print(f"Error extracting design bundle: {e}")
+            return results, {field: e for field in GEOMETRY_EXTRACTORS}
+        return {field: bundle for field in GEOMETRY_EXTRACTORS}, errors
+
+    if mode == "sequential":
+        for field, extractor in GEOMETRY_EXTRACTORS.items():
+            try:
+                results[field] = extractor(concept, external_functions, attributes)
+            except Exception as e:
+                print(f"Error extracting {field}: {e}")
+                errors[field] = e
+        return results, errors
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(GEOMETRY_EXTRACTORS)) as executor:
+        futures = {
+            field: executor.submit(extractor, concept, external_functions, attributes)
+            for field, extractor in GEOMETRY_EXTRACTORS.items()
+        }
+        for field, future in futures.items():
+            try:
+                results[field] = future.result()
+            except Exception as e:
+                print(f"Error extracting {field}: {e}")
+                errors[field] = e
+    return results, errors
 
 def assemble_courtyard_graph(spaces, external_functions, weights, anchors, positions, links, cardinal_directions, pos):
     print("Assembling courtyard graph....")
@@ -928,7 +1312,7 @@ def assemble_courtyard_graph(spaces, external_functions, weights, anchors, posit
     )
     })
     print("Assembling courtyard graph with conversation history...", chat_messages)
-    response = client.chat.completions.create(
+    response = chat_completion("assemble_courtyard_graph",
         model=completion_model,
         messages=chat_messages,
         response_format={
@@ -993,11 +1377,11 @@ def assemble_courtyard_graph(spaces, external_functions, weights, anchors, posit
         }
     )
 
-    print("Response from LLM for assemble_courtyard_graph:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM for assemble_courtyard_graph:", response)
+    return response
 
 
-def criticize_courtyard_graph(graph):
+def criticize_courtyard_graph(graph, stream=False):
     print("Assembling courtyard graph....")
     chat_messages = [
         {
@@ -1015,13 +1399,18 @@ def criticize_courtyard_graph(graph):
         },
     ]
     print("Criticizing courtyard graph with conversation history...", chat_messages)
-    response = client.chat.completions.create(
+    if stream:
+        return stream_chat_completion("criticize_courtyard_graph",
+            model=completion_model,
+            messages=chat_messages
+        )
+    response = chat_completion("criticize_courtyard_graph",
         model=completion_model,
         messages=chat_messages
     )
 
-    print("Response from LLM for criticize_courtyard_graph:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM for criticize_courtyard_graph:", response)
+    return response
 
 def extract_tree_placement(concept, attributes):
     chat_messages = [
@@ -1071,7 +1460,7 @@ def extract_tree_placement(concept, attributes):
     )
     })
     print("Extracting tree placement...")
-    response = client.chat.completions.create(
+    response = chat_completion("extract_tree_placement",
         model=completion_model,
         messages=chat_messages,
         response_format={
@@ -1107,8 +1496,8 @@ def extract_tree_placement(concept, attributes):
         }
     )
     
-    print("Response from LLM for tree placement:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM for tree placement:", response)
+    return response
 
 def extract_plant_water_requirement(concept, attributes, tree_placement):
     # First validate tree placement data
@@ -1163,7 +1552,7 @@ def extract_plant_water_requirement(concept, attributes, tree_placement):
     )
     })
     print("Extracting plant water requirements...")
-    response = client.chat.completions.create(
+    response = chat_completion("extract_plant_water_requirement",
         model=completion_model,
         messages=chat_messages,
         response_format={
@@ -1198,13 +1587,11 @@ def extract_plant_water_requirement(concept, attributes, tree_placement):
         }
     )
 
-    print("Response from LLM for PWR:", response.choices[0].message.content)
-    return response.choices[0].message.content
+    print("Response from LLM for PWR:", response)
+    return response
 
-def create_question(message):
-    response = client.chat.completions.create(
-        model=completion_model,
-        messages=[
+def create_question(message, stream=False):
+    chat_messages = [
             {
                 "role": "system",
                 "content": """
@@ -1231,11 +1618,57 @@ def create_question(message):
                         {message}
                         """,
             },
-        ],
+        ]
+    if stream:
+        return stream_chat_completion("create_question",
+            model=completion_model,
+            messages=chat_messages
+        )
+    response = chat_completion("create_question",
+        model=completion_model,
+        messages=chat_messages,
     )
-    return response.choices[0].message.content
+    return response
+
+def create_questions(message, count=3):
+    """
+    Several distinct targeted questions about the design, one per aspect, for rag_call_multi.
+    Returns a list of at most count questions.
+    """
+    response = chat_completion("create_questions",
+        model=completion_model,
+        messages=[
+            {
+                "role": "system",
+                "content": f"""
+                        # Instruction #
+                        You are a thoughtful research assistant specializing in architecture.
+                        Your task is to create {count} targeted questions based on the text to facilitate courtyard design.
+                        Imagine the questions will be answered using a detailed text about courtyard design and related elements and scores.
+                        Each question should cover a different aspect, e.g. layout, planting, social use, environment or well-being.
+                        Output only the questions, one per line, without numbering or any extra text.
 
-def generate_image_prompt(concept, attributes, connections, targets, spaces, pwr, tree_placement):
+                        # Important #
+                        Keep the questions targeted and relevant to the courtyard design. Avoid vague or overly broad questions.
+                        """,
+            },
+            {
+                "role": "user",
+                "content": f"""
+                        {message}
+                        """,
+            },
+        ],
+    )
+    questions = []
+    for line in str(response).splitlines():
+        # Models number or bullet their lines now and then despite the instruction
+        question = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip()
+        if question:
+            questions.append(question)
+    return questions[:count] or [str(response).strip()]
+
+def generate_image_prompt(concept, attributes, connections, targets, spaces, pwr, tree_placement, stream=False):
     """
     Generates a detailed prompt for an image generation model, using all relevant design data and spatial logic.
     Args:
@@ -1246,6 +1679,7 @@ def generate_image_prompt(concept, attributes, connections, targets, spaces, pwr
         spaces (dict or str): Extracted spaces (JSON or string).
         pwr (str): Plant water requirements.
         tree_placement (str): Tree placement info.
+        stream (bool): Yield the prompt in pieces as they arrive instead of returning it at once.
     Returns:
         str: A prompt for an image generation model.
     """
@@ -1301,10 +1735,15 @@ A sunlit courtyard with a central calm area (grid 10,10), social zones to the so
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": context}
     ]
-    response = client.chat.completions.create(
+    if stream:
+        return stream_chat_completion("generate_image_prompt",
+            model=completion_model,
+            messages=messages
+        )
+    response = chat_completion("generate_image_prompt",
         model=completion_model,
         messages=messages
     )
-    return response.choices[0].message.content
+    return response
 
 
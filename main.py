@@ -1,6 +1,6 @@
 from server.config import *
 from llm_calls import *
-from utils.rag_utils import rag_call
+from utils.rag_utils import rag_call_multi
 import json
 import requests
 import re
@@ -87,9 +87,11 @@ context_info = f"User input: {user_message}\n" \
               f"Attributes: {attributes}\n" \
               f"Weights: {connections}\n" \
               f"Locations: {targets}\n"
-courtyard_question = create_question(context_info)
-print("\nGenerated question for RAG:\n", courtyard_question)
+# Several questions on different aspects, retrieved in one batch and answered in parallel
+courtyard_questions = create_questions(context_info, count=3)
+print("\nGenerated questions for RAG:\n", "\n".join(courtyard_questions))
 input("Press Enter to get RAG results...")
 
-rag_result = rag_call(courtyard_question, embeddings="knowledge/merged.json", n_results=10)
+rag_results = rag_call_multi(courtyard_questions, embeddings=knowledge_path, n_results=10)
+rag_result = "\n\n".join(f"{question}\n{answer}" for question, answer in zip(courtyard_questions, rag_results))
 print("\nRAG result:\n", rag_result)
\ No newline at end of file
@@ -0,0 +1,121 @@
+from llm_calls import (
+    classify_input,
+    generate_concept_with_conversation,
+    extract_external_functions,
+    extract_attributes_with_conversation,
+    extract_geometry_data,
+    extract_tree_placement,
+    extract_plant_water_requirement,
+    assemble_courtyard_graph,
+    extract_json,
+)
+from server.config import geometry_extraction_mode, geometry_extraction_workers
+
+# The courtyard pipeline without the chat window: classify, concept, functions, attributes,
+# geometry extraction, tree data and graph assembly. Each stage reads what the earlier stages
+# left in a design dict and adds its own result under its name, so the stages can be run one
+# by one with progress in between (gh_server's /design jobs) or all at once with run_design.
+# The chat window uses the geometry, tree data and graph helpers for its phases.
+
+
+class DesignRefused(Exception):
+    """The brief is not about architecture, so the pipeline stops after classify."""
+
+
+def collect_design_data(concept, external_functions, attributes, mode=geometry_extraction_mode, max_workers=geometry_extraction_workers):
+    """Run the geometry extractors and return (design_data, errors); fields that failed are only in errors."""
+    results, errors = extract_geometry_data(concept, external_functions, attributes, mode=mode, max_workers=max_workers)
+    # Keep every field that came back, even if some of the calls failed
+    design_data = {"external_functions": external_functions}
+    for field, llm_output in results.items():
+        try:
+            design_data[field] = extract_json(llm_output)[field]
+        except Exception as e:
+            errors[field] = e
+    return design_data, errors
+
+
+def collect_tree_data(concept, attributes, report=print):
+    report("Extracting tree data...")
+    tree_placement = extract_json(extract_tree_placement(concept, attributes))
+    report("Extracting plant water requirements...")
+    pwr = extract_json(extract_plant_water_requirement(concept, attributes, tree_placement))
+    return {"tree_placement": tree_placement["tree_placement"], "PWR": pwr["pwr"]}
+
+
+def build_graph(design_data):
+    """Assemble the courtyard graph (nodes and links) from the extracted design data."""
+    llm_output = assemble_courtyard_graph(
+        design_data["spaces"],
+        design_data["external_functions"],
+        design_data["weights"],
+        design_data["anchors"],
+        design_data["positions"],
+        design_data["links"],
+        design_data["cardinal_directions"],
+        design_data["pos"]
+    )
+    return extract_json(llm_output)
+
+
+# Stages: each takes the design dict (brief, area and optionally functions and attributes to
+# start from) and returns its result, which is stored in the dict under the stage name.
+
+def classify_stage(design):
+    label = classify_input(design["brief"])
+    if "Refuse to answer" in label:
+        raise DesignRefused("Sorry, I can only answer questions about architecture.")
+    return label
+
+
+def concept_stage(design):
+    message = f"{design['brief']}. Make sure the plot area is {design['area']} m²."
+    return generate_concept_with_conversation([{"role": "user", "content": message}])
+
+
+def functions_stage(design):
+    if design.get("functions") is not None:
+        return design["functions"]
+    response = extract_json(extract_external_functions([{"role": "user", "content": design["brief"]}]))
+    return response["external_functions"]
+
+
+def attributes_stage(design):
+    message = design.get("attributes") or design["brief"]
+    return extract_json(extract_attributes_with_conversation([{"role": "user", "content": message}], design["concept"]))
+
+
+def geometry_stage(design):
+    design_data, errors = collect_design_data(design["concept"], design["functions"], design["attributes"])
+    for field, e in errors.items():
+        print(f"Error extracting {field}: {e}")
+    design["geometry_errors"] = {field: str(e) for field, e in errors.items()}
+    return design_data
+
+
+def tree_data_stage(design):
+    return collect_tree_data(design["concept"], design["attributes"])
+
+
+def graph_stage(design):
+    return build_graph(design["geometry"])
+
+
+STAGES = [
+    ("classify", classify_stage),
+    ("concept", concept_stage),
+    ("functions", functions_stage),
+    ("attributes", attributes_stage),
+    ("geometry", geometry_stage),
+    ("tree_data", tree_data_stage),
+    ("graph", graph_stage),
+]
+
+
+def run_design(brief, area=400, functions=None, attributes=None, report=print):
+    """Run every stage and return the design dict; raises DesignRefused for off-topic briefs."""
+    design = {"brief": brief, "area": area, "functions": functions, "attributes": attributes}
+    for name, stage in STAGES:
+        report(f"Running {name}...")
+        design[name] = stage(design)
+    return design
@@ -1,15 +1,20 @@
+import os
 import random
 from openai import OpenAI
 from server.keys import *
 
 # Mode
-mode = "openai" # "local" or "openai" or "cloudflare"
+mode = os.environ.get("API_MODE", "openai") # "local" or "openai" or "cloudflare" or "fake"
 
 # API
 local_client = OpenAI(base_url="http://localhost:1234/v1", api_key="lm-studio")
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
 cloudflare_client = OpenAI(base_url = f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}/ai/v1", api_key = CLOUDFLARE_API_KEY)
 
+# Stand-in server for benchmarks (python -m server.fake_openai), see server/fake_openai.py
+fake_openai_port = int(os.environ.get("FAKE_OPENAI_PORT", 1235))
+fake_client = OpenAI(base_url=f"http://127.0.0.1:{fake_openai_port}/v1", api_key="fake")
+
 
 # Embedding Models
 local_embedding_model = "nomic-ai/nomic-embed-text-v1.5-GGUF"
@@ -46,6 +51,106 @@ mistral = [
         }
 ]
 
+# Knowledge base; rag_utils compiles it into a vector index on first use (utils/vector_index.py)
+knowledge_path = "knowledge/merged.json"
+
+# Geometry extraction
+# "concurrent" fires all geometry extractors at once, "sequential" runs them one after another,
+# "bundle" extracts every field with a single structured-output call
+geometry_extraction_mode = "concurrent"
+geometry_extraction_workers = 7
+
+# LLM response cache
+# Identical requests (backend, base_url, model, messages, response_format, temperature) are
+# answered from disk, but only for the llm_calls functions in llm_cache_functions: the structured
+# extractions, where the same input should give the same answer. Free-text calls (concepts,
+# critiques, questions, image prompts) are left out so repeated prompts still get fresh replies.
+llm_cache_enabled = True
+llm_cache_path = ".cache/llm_responses.sqlite"
+llm_cache_max_bytes = 50 * 1024 * 1024
+llm_cache_ttl = 7 * 24 * 3600  # seconds
+llm_cache_functions = {
+    "classify_input",
+    "extract_spaces",
+    "extract_links",
+    "extract_positions",
+    "extract_external_functions",
+    "extract_attributes_with_conversation",
+    "extract_cardinal_directions",
+    "extract_weights",
+    "extract_anchors",
+    "extract_pos",
+    "extract_design_bundle",
+    "extract_tree_placement",
+    "extract_plant_water_requirement",
+}
+
+# Provider rate limits, shared by all threads of this process (0 turns a limit off).
+# Calls wait in a token bucket instead of running into 429 errors. Each call is charged its
+# estimated tokens (prompt characters / 4 plus max_tokens, or rate_limit_completion_tokens),
+# corrected once the response reports its usage.
+rate_limit_requests_per_minute = 0
+rate_limit_tokens_per_minute = 0
+rate_limit_burst_seconds = 10
+rate_limit_completion_tokens = 500
+
+# Embeddings
+# Texts are sent to the API embedding_batch_size at a time and their vectors cached on disk,
+# keyed by backend (the client's base_url), model, dimensions and text. embedding_dimensions
+# applies to the openai mode only.
+embedding_cache_enabled = True
+embedding_cache_path = ".cache/embeddings.sqlite"
+embedding_batch_size = 96
+embedding_dimensions = 768
+
+# gh_server push channel (/events and /poll)
+# Each client keeps at most event_queue_size pending change events, /events sends a keep-alive
+# comment every event_keepalive seconds and /poll waits at most poll_max_timeout seconds.
+event_queue_size = 64
+event_keepalive = 15
+poll_max_timeout = 60
+# Every open /events stream and waiting /poll holds a server thread, so they may use at most
+# server_threads - push_reserved_threads threads; past that they get 503 and the other routes
+# always have push_reserved_threads threads left.
+push_reserved_threads = 4
+
+# gh_server sessions leave memory after this many seconds without a request (the default session is kept)
+session_idle_timeout = 3600
+# Idle sessions keep their saved state and are loaded again when a client comes back;
+# True deletes the saved state of evicted sessions instead
+session_drop_saved_on_evict = False
+
+# gh_server serving (python gh_server.py --headless for the server without the desktop app)
+# Uses waitress with server_threads worker threads when it is installed; every open /events
+# stream and waiting /poll holds one of them (see push_reserved_threads). JSON responses of at
+# least gzip_min_bytes are gzipped for clients that accept it.
+server_host = "127.0.0.1"
+server_port = 5000
+server_threads = 16
+gzip_min_bytes = 1024
+gzip_level = 5
+
+# gh_server logging: one JSON line per event, printed for this fraction of events.
+# Requests that fail with a 5xx status are always logged. Metrics are at /metrics.
+request_log_sample = 0.01
+state_log_sample = 1.0
+
+# Number of graph_data changes gh_server keeps as patches for GET /graph_data?since=<version>
+graph_history_size = 100
+
+# gh_server state is saved to this SQLite file in the background and reloaded on startup.
+# Set GH_STATE_PATH to use another file, or to an empty string to keep state in memory only.
+state_persist_path = os.environ.get("GH_STATE_PATH", ".cache/gh_state.sqlite")
+state_flush_interval = 0.05  # seconds between writes, the most that is lost if the process dies
+
+# gh_server design jobs (POST /design): at most design_job_workers pipelines run at once, the
+# rest wait; the last design_job_history finished jobs can still be fetched from GET /design/<id>
+design_job_workers = 4
+design_job_history = 100
+
+# Briefs batch_designs.py runs at the same time; the rate limits below still apply to all of them
+batch_concurrency = 8
+
 # This is a cloudflare model
 # cloudflare_model = "@cf/meta/llama-4-scout-17b-16e-instruct"
 # cloudflare_model = "@cf/qwen/qwq-32b"
@@ -79,6 +184,11 @@ def api_mode(mode):
         completion_models.append(gpt4o[0]['model'])
         embedding_models.append(openai_embedding_model)
         return clients, completion_models, embedding_models
+    elif mode == "fake":
+        clients.append(fake_client)
+        completion_models.append("fake-model")
+        embedding_models.append("fake-embedding")
+        return clients, completion_models, embedding_models
     else:
         raise ValueError("Please specify if you want to run local or openai models")
 
@@ -0,0 +1,135 @@
+import itertools
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Background design jobs for gh_server's /design routes.
+# A job runs the stages of pipeline.py one after another on a worker thread; at most
+# max_workers jobs run at once and the rest wait in line. Every stage reports its status,
+# duration and result as it finishes, so GET /design/<id> shows progress while the job runs.
+# Results can also be handed to publish(name, result) as each stage finishes, which gh_server
+# uses to store them in the session that started the job. Only the last `history` finished
+# jobs are kept.
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+REFUSED = "refused"
+SKIPPED = "skipped"
+
+
+class DesignJob:
+    def __init__(self, job_id, inputs, stages, publish=None):
+        self.id = job_id
+        self.inputs = inputs
+        self.publish = publish
+        self.status = QUEUED
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.stages = OrderedDict((name, {"status": QUEUED, "seconds": None}) for name, _ in stages)
+        self.results = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self, include_results=True):
+        with self._lock:
+            snapshot = {
+                "id": self.id,
+                "status": self.status,
+                "error": self.error,
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+                "stages": [dict(stage, name=name) for name, stage in self.stages.items()],
+            }
+            if include_results:
+                snapshot["results"] = dict(self.results)
+            return snapshot
+
+    def _update(self, name=None, **fields):
+        with self._lock:
+            if name is None:
+                for field, value in fields.items():
+                    setattr(self, field, value)
+            else:
+                self.stages[name].update(fields)
+
+
+class DesignJobs:
+    def __init__(self, stages, refused=(), max_workers=4, history=100):
+        self.stage_list = list(stages)
+        self.refused = tuple(refused)
+        self.history = history
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="design")
+
+    def submit(self, inputs, publish=None):
+        """Queue a job for inputs (the pipeline's design dict) and return it."""
+        job = DesignJob(f"{next(self._counter)}-{uuid.uuid4().hex[:8]}", inputs, self.stage_list, publish)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_finished()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def running(self):
+        return sum(1 for job in self.jobs() if job.status == RUNNING)
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished is not None]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _run(self, job):
+        job._update(status=RUNNING, started=time.time())
+        design = dict(job.inputs)
+        status = DONE
+        for name, stage in self.stage_list:
+            job._update(name, status=RUNNING)
+            start = time.perf_counter()
+            try:
+                result = stage(design)
+            except self.refused as e:
+                job._update(name, status=REFUSED, seconds=round(time.perf_counter() - start, 3))
+                job._update(error=str(e))
+                status = REFUSED
+                break
+            except Exception as e:
+                traceback.print_exc()
+                job._update(name, status=FAILED, seconds=round(time.perf_counter() - start, 3), error=str(e))
+                job._update(error=f"{name}: {e}")
+                status = FAILED
+                break
+            design[name] = result
+            with job._lock:
+                job.results[name] = result
+                job.stages[name].update(status=DONE, seconds=round(time.perf_counter() - start, 3))
+            if job.publish is not None:
+                try:
+                    job.publish(name, result)
+                except Exception as e:
+                    print(f"Could not publish {name} of design job {job.id}: {e}")
+        with job._lock:
+            for stage in job.stages.values():
+                if stage["status"] == QUEUED:
+                    stage["status"] = SKIPPED
+        if design.get("geometry_errors"):
+            with job._lock:
+                job.results["geometry_errors"] = design["geometry_errors"]
+        job._update(status=status, finished=time.time())
+        print(f"Design job {job.id} {status} in {job.finished - job.started:.1f} s")
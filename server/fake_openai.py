@@ -0,0 +1,235 @@
+import argparse
+import hashlib
+import json
+import random
+import time
+import uuid
+import numpy as np
+from flask import Flask, Response, request, jsonify
+
+# Local stand-in for the OpenAI chat and embeddings API, for measuring the copilot's own overhead.
+# Chat requests with a json_schema response_format get seeded-random JSON that satisfies the
+# schema, plain requests get canned text and embeddings are deterministic unit vectors per text.
+# Every response can be delayed to mimic a real model:
+#   latency          seconds before the first byte of every response
+#   token_latency    extra seconds per completion token (per streamed chunk when streaming)
+# Select it with mode = "fake" in server/config.py and run
+#     python -m server.fake_openai --port 1235 --latency 0.5
+
+app = Flask(__name__)
+
+settings = {"latency": 0.0, "token_latency": 0.0, "seed": 0, "dimensions": 768}
+
+ZONES = ["tree", "pond", "play", "rest", "flower"]
+EXTERNAL = ["cafe", "library", "kindergarden", "office"]
+WORDS = ["courtyard", "shade", "oak", "brick", "path", "water", "bench", "lawn", "light", "wind"]
+
+CANNED_TEXT = (
+    "We envision an outdoor space with a total courtyard area of 400 sqm. The design includes "
+    "120 sqm of social play zones near the cafe, 80 sqm of calm rest spaces shaded by oaks, a 40 sqm "
+    "pond, 60 sqm of flower beds and 100 sqm of open lawn. The site supports 8 trees across 2 different "
+    "species. The advantages and disadvantages of the design are as follows: good shade and variety of "
+    "uses, and higher maintenance for the pond."
+)
+
+# Patterns used by the schemas in llm_calls.py; anything else gets a plain word
+PATTERNS = {
+    r"^\d+ to \d+$": lambda rng: f"{rng.randint(1, 5)} to {rng.randint(6, 10)}",
+    r"^0\.[0-9]$": lambda rng: f"0.{rng.randint(0, 9)}",
+}
+
+
+def fake_from_schema(schema, rng, depth=0):
+    """Generate a random value that satisfies a (simple) JSON schema."""
+    if not isinstance(schema, dict):
+        return None
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    for key in ("oneOf", "anyOf"):
+        if key in schema:
+            options = [option for option in schema[key] if option.get("type") != "null"] or schema[key]
+            return fake_from_schema(rng.choice(options), rng, depth)
+
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = rng.choice([k for k in kind if k != "null"] or kind)
+    if kind is None:
+        kind = "object" if "properties" in schema or "additionalProperties" in schema else "string"
+
+    if kind == "object":
+        return fake_object(schema, rng, depth)
+    if kind == "array":
+        low = schema.get("minItems", 1)
+        high = schema.get("maxItems", max(low, 5))
+        return [fake_from_schema(schema.get("items", {}), rng, depth + 1) for _ in range(rng.randint(low, high))]
+    if kind == "integer":
+        return rng.randint(int(schema.get("minimum", 1)), int(schema.get("maximum", 10)))
+    if kind == "number":
+        return round(rng.uniform(schema.get("minimum", 0), schema.get("maximum", 10)), 2)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if kind == "null":
+        return None
+    pattern = schema.get("pattern")
+    if pattern in PATTERNS:
+        return PATTERNS[pattern](rng)
+    return rng.choice(ZONES + EXTERNAL if depth else WORDS)
+
+
+def fake_object(schema, rng, depth):
+    properties = schema.get("properties", {})
+    required = list(schema.get("required", []))
+    optional = [name for name in properties if name not in required]
+    result = {name: fake_from_schema(properties[name], rng, depth + 1) for name in required if name in properties}
+
+    low = max(schema.get("minProperties", 0) - len(result), 0)
+    high = schema.get("maxProperties", len(result) + len(optional)) - len(result)
+    if optional:
+        count = rng.randint(min(low, len(optional)), max(min(high, len(optional)), min(low, len(optional))))
+        for name in rng.sample(optional, count):
+            result[name] = fake_from_schema(properties[name], rng, depth + 1)
+
+    additional = schema.get("additionalProperties")
+    if isinstance(additional, dict) and not properties:
+        for name in rng.sample(ZONES + EXTERNAL, rng.randint(2, 5)):
+            result[name] = fake_from_schema(additional, rng, depth + 1)
+    return result
+
+
+def fake_content(messages, response_format, rng):
+    if response_format and response_format.get("type") == "json_schema":
+        schema = response_format.get("json_schema", {}).get("schema", {})
+        return json.dumps(fake_from_schema(schema, rng))
+    if response_format and response_format.get("type") == "json_object":
+        return json.dumps({"result": rng.choice(WORDS)})
+    system = messages[0].get("content", "") if messages else ""
+    # classify_input only accepts one of two answers
+    if "Refuse to answer" in system:
+        return "Related"
+    return CANNED_TEXT
+
+
+def request_rng(body):
+    # Same request, same answer; --seed changes every answer at once
+    digest = hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode("utf8")).hexdigest()
+    return random.Random(f"{settings['seed']}:{digest}")
+
+
+def count_tokens(text):
+    # Roughly one token per four characters, like the OpenAI rule of thumb
+    return max(1, len(text) // 4)
+
+
+def usage_for(messages, content):
+    prompt_tokens = sum(count_tokens(str(message.get("content", ""))) for message in messages)
+    completion_tokens = count_tokens(content)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def split_chunks(text, size=16):
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+@app.route("/v1/chat/completions", methods=["POST"])
+def chat_completions():
+    body = request.get_json()
+    messages = body.get("messages", [])
+    model = body.get("model", "fake-model")
+    content = fake_content(messages, body.get("response_format"), request_rng(body))
+    usage = usage_for(messages, content)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    time.sleep(settings["latency"])
+
+    if not body.get("stream"):
+        time.sleep(settings["token_latency"] * usage["completion_tokens"])
+        return jsonify({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    def chunk(delta, finish_reason=None, chunk_usage=None, choices=True):
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if choices else [],
+        }
+        if chunk_usage is not None:
+            payload["usage"] = chunk_usage
+        return f"data: {json.dumps(payload)}\n\n"
+
+    def events():
+        yield chunk({"role": "assistant", "content": ""})
+        for piece in split_chunks(content):
+            time.sleep(settings["token_latency"] * count_tokens(piece))
+            yield chunk({"content": piece})
+        yield chunk({}, finish_reason="stop")
+        if include_usage:
+            yield chunk(None, chunk_usage=usage, choices=False)
+        yield "data: [DONE]\n\n"
+
+    return Response(events(), mimetype="text/event-stream")
+
+
+@app.route("/v1/embeddings", methods=["POST"])
+def embeddings():
+    body = request.get_json()
+    texts = body.get("input", [])
+    if isinstance(texts, str):
+        texts = [texts]
+    dimensions = body.get("dimensions") or settings["dimensions"]
+    time.sleep(settings["latency"])
+
+    data = []
+    for i, text in enumerate(texts):
+        seed = int(hashlib.sha256(text.encode("utf8")).hexdigest()[:16], 16)
+        vector = np.random.default_rng(seed).standard_normal(dimensions)
+        vector /= np.linalg.norm(vector)
+        data.append({"object": "embedding", "index": i, "embedding": vector.tolist()})
+    tokens = sum(count_tokens(text) for text in texts)
+    return jsonify({
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "fake-embedding"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    })
+
+
+@app.route("/v1/models", methods=["GET"])
+def models():
+    return jsonify({"object": "list", "data": [{"id": "fake-model", "object": "model"}, {"id": "fake-embedding", "object": "model"}]})
+
+
+def configure(latency=None, token_latency=None, seed=None, dimensions=None):
+    for key, value in (("latency", latency), ("token_latency", token_latency), ("seed", seed), ("dimensions", dimensions)):
+        if value is not None:
+            settings[key] = value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat and embeddings server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1235)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every response")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="extra seconds per completion token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dimensions", type=int, default=768, help="embedding size when the request does not set one")
+    args = parser.parse_args()
+    configure(args.latency, args.token_latency, args.seed, args.dimensions)
+    app.run(host=args.host, port=args.port, threaded=True, debug=False, use_reloader=False)
@@ -0,0 +1,26 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Flask JSON provider that uses orjson when it is installed (pip install orjson).
+# orjson serializes large graph payloads several times faster than the json module; without it,
+# or when a call passes json.dumps keyword arguments, the default provider is used.
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode("utf8")
+        except TypeError:
+            # Types orjson does not know (dates, decimals, ...) go through the default provider
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
@@ -0,0 +1,190 @@
+import json
+import random
+import threading
+import time
+
+# Request metrics and structured logging for gh_server.
+# MetricsMiddleware wraps the WSGI app and records, per method and route, request counts by
+# status, histograms of latency and of request and response sizes, and the number of requests in
+# flight. Metrics.render() returns them in the Prometheus text exposition format for /metrics.
+# log_event prints one JSON object per line; high-volume events are sampled.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Flask stores the matched route template here, so session ids and query strings never become labels
+ROUTE_KEY = "gh_server.route"
+
+
+def log_event(event, sample=1.0, **fields):
+    """Print a structured log line for event; with sample < 1 only that fraction is printed."""
+    if sample < 1.0 and random.random() >= sample:
+        return
+    record = {"ts": round(time.time(), 3), "event": event}
+    record.update(fields)
+    print(json.dumps(record, default=str))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.total}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class Metrics:
+    def __init__(self, prefix="gh_server"):
+        self.prefix = prefix
+        self.in_flight = 0
+        self.requests = {}
+        self.latency = {}
+        self.request_bytes = {}
+        self.response_bytes = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, method, route, status, seconds, request_bytes, response_bytes):
+        key = (method, route)
+        with self._lock:
+            self.in_flight -= 1
+            counts = self.requests.setdefault(key, {})
+            counts[status] = counts.get(status, 0) + 1
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.request_bytes.setdefault(key, Histogram(SIZE_BUCKETS)).observe(request_bytes)
+            self.response_bytes.setdefault(key, Histogram(SIZE_BUCKETS)).observe(response_bytes)
+
+    def add_gauge(self, name, help_text, read):
+        """Expose read() as a gauge, evaluated on every render."""
+        self.gauges[name] = (help_text, read)
+
+    def render(self):
+        p = self.prefix
+        with self._lock:
+            lines = [
+                f"# HELP {p}_requests_total Requests by method, route and status.",
+                f"# TYPE {p}_requests_total counter",
+            ]
+            for (method, route), counts in sorted(self.requests.items()):
+                for status, count in sorted(counts.items()):
+                    lines.append(f'{p}_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+            lines += [
+                f"# HELP {p}_request_errors_total Requests answered with a 5xx status.",
+                f"# TYPE {p}_request_errors_total counter",
+            ]
+            for (method, route), counts in sorted(self.requests.items()):
+                errors = sum(count for status, count in counts.items() if status >= 500)
+                lines.append(f'{p}_request_errors_total{{method="{method}",route="{route}"}} {errors}')
+
+            for name, help_text, histograms in (
+                ("request_duration_seconds", "Time until the response body was sent.", self.latency),
+                ("request_size_bytes", "Request body size.", self.request_bytes),
+                ("response_size_bytes", "Response body size as sent, after compression.", self.response_bytes),
+            ):
+                lines += [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} histogram"]
+                for (method, route), histogram in sorted(histograms.items()):
+                    lines.extend(histogram.lines(f"{p}_{name}", f'method="{method}",route="{route}"'))
+
+            lines += [
+                f"# HELP {p}_requests_in_flight Requests being handled right now.",
+                f"# TYPE {p}_requests_in_flight gauge",
+                f"{p}_requests_in_flight {self.in_flight}",
+            ]
+        for name, (help_text, read) in sorted(self.gauges.items()):
+            lines += [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} gauge", f"{p}_{name} {read()}"]
+        return "\n".join(lines) + "\n"
+
+
+class CountingBody:
+    """Response iterable that counts the bytes sent and reports them once the server closes it."""
+
+    def __init__(self, body, on_close):
+        self.body = body
+        self.on_close = on_close
+        self.sent = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            self.on_close(self.sent)
+
+
+class MetricsMiddleware:
+    """Times every request through the WSGI app, including streamed bodies, and logs a sample of them."""
+
+    def __init__(self, wsgi_app, metrics, log_sample=0.0):
+        self.wsgi_app = wsgi_app
+        self.metrics = metrics
+        self.log_sample = log_sample
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        self.metrics.started()
+        status = [500]
+
+        def recording_start_response(status_line, headers, exc_info=None):
+            status[0] = int(status_line.split(" ", 1)[0])
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            body = self.wsgi_app(environ, recording_start_response)
+        except Exception:
+            self._finish(environ, start, status[0], 0)
+            raise
+        return CountingBody(body, lambda sent: self._finish(environ, start, status[0], sent))
+
+    def _finish(self, environ, start, status, sent):
+        seconds = time.perf_counter() - start
+        method = environ.get("REQUEST_METHOD", "GET")
+        route = environ.get(ROUTE_KEY, "unmatched")
+        try:
+            received = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            received = 0
+        self.metrics.finished(method, route, status, seconds, received, sent)
+        log_event(
+            "request",
+            sample=1.0 if status >= 500 else self.log_sample,
+            method=method,
+            route=route,
+            status=status,
+            ms=round(seconds * 1000, 2),
+            request_bytes=received,
+            response_bytes=sent,
+            session=environ.get("HTTP_X_SESSION_ID", "default"),
+        )
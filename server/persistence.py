@@ -0,0 +1,152 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Write-behind persistence for gh_server state.
+# Every committed change is handed to StateJournal.changed, which only records the entry in a
+# pending map and returns, so requests never wait for the disk. A background thread writes the
+# pending entries every flush_interval seconds in one SQLite (WAL) transaction, keeping the
+# latest value and version of each (session, key). Changes to a key that arrive between two
+# flushes are coalesced into the newest one. On startup load() returns everything, so the server
+# continues at the same versions and ETags; at most flush_interval seconds of changes are lost
+# if the process is killed. A flush that fails (e.g. "database is locked") puts its changes back
+# and is retried, waiting longer after every failure in a row, up to max_retry_interval.
+
+
+class StateJournal:
+    def __init__(self, path, dumps=json.dumps, loads=json.loads, flush_interval=0.05, max_retry_interval=5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_retry_interval = max_retry_interval
+        self.failures = 0
+        self._dumps = dumps
+        self._loads = loads
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self.writes = 0
+        self.flushes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only gives up durability of the last transactions on power loss, not consistency
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS state (
+                session TEXT NOT NULL,
+                key TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                value BLOB NOT NULL,
+                saved REAL NOT NULL,
+                PRIMARY KEY (session, key)
+            )
+            """
+        )
+        self._db.commit()
+        self._thread = threading.Thread(target=self._run, name="state-journal", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def load(self):
+        """Return {session: {key: (version, digest, value)}} as last written."""
+        sessions = {}
+        with self._write_lock:
+            rows = self._db.execute("SELECT session, key, version, digest, value FROM state").fetchall()
+        for session_id, key, version, digest, value in rows:
+            sessions.setdefault(session_id, {})[key] = (version, digest, self._loads(value))
+        return sessions
+
+    def load_session(self, session_id):
+        """Return {key: (version, digest, value)} of one session, including changes not written yet."""
+        # Holding the write lock, no flush can have taken changes out of _pending without writing them
+        with self._write_lock:
+            with self._cond:
+                pending = [(key, entry) for (pending_session, key), entry in self._pending.items() if pending_session == session_id]
+            rows = self._db.execute("SELECT key, version, digest, value FROM state WHERE session = ?", (session_id,)).fetchall()
+        entries = {key: (version, digest, self._loads(value)) for key, version, digest, value in rows}
+        for key, entry in pending:
+            if key is None:
+                # Dropped; the changes queued after the drop come later in _pending
+                entries = {}
+            else:
+                entries[key] = (entry.version, entry.digest, entry.value)
+        return entries
+
+    def changed(self, session_id, key, entry):
+        """Queue entry as the new value of key in session_id. Called with the store's lock held, so it only records it."""
+        with self._cond:
+            # Re-inserted at the end, so it is written after an earlier drop of the same session
+            self._pending.pop((session_id, key), None)
+            self._pending[(session_id, key)] = entry
+            self._cond.notify()
+
+    def drop_session(self, session_id):
+        """Queue the removal of everything stored for session_id."""
+        with self._cond:
+            for pending in [pending for pending in self._pending if pending[0] == session_id]:
+                del self._pending[pending]
+            self._pending[(session_id, None)] = None
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if self._closed:
+                    return
+            # Let a burst of changes collect, so each key is written once per flush
+            time.sleep(min(self.flush_interval * 2 ** self.failures, self.max_retry_interval))
+            self.flush()
+
+    def flush(self):
+        """Write all pending changes now."""
+        with self._write_lock:
+            with self._cond:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            now = time.time()
+            try:
+                with self._db:
+                    for (session_id, key), entry in pending.items():
+                        if key is None:
+                            self._db.execute("DELETE FROM state WHERE session = ?", (session_id,))
+                        else:
+                            # Serialized here, on the writer thread, rather than in the request that made the change
+                            self._db.execute(
+                                "INSERT OR REPLACE INTO state (session, key, version, digest, value, saved) VALUES (?, ?, ?, ?, ?, ?)",
+                                (session_id, key, entry.version, entry.digest, self._dumps(entry.value), now),
+                            )
+            except sqlite3.Error as e:
+                self.failures += 1
+                print(f"Could not save gh_server state to {self.path}, retrying ({self.failures} failed in a row): {e}")
+                with self._cond:
+                    # Changes queued since are newer, so they stay and come after the ones put back
+                    newer, self._pending = self._pending, pending
+                    for change, entry in newer.items():
+                        self._pending.pop(change, None)
+                        self._pending[change] = entry
+                return
+            self.failures = 0
+            self.writes += len(pending)
+            self.flushes += 1
+
+    def close(self):
+        """Write what is pending and stop the writer thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.flush()
+        with self._write_lock:
+            self._db.close()
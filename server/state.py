@@ -0,0 +1,354 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from utils.json_patch import apply_patch, make_patch
+
+# Versioned state for gh_server.
+# Every key holds a value, a version that only goes up when the value actually changes and a
+# hash of its serialized form. Serialized response bodies are cached per entry, so clients that
+# poll an unchanged key are answered from memory, or with 304 Not Modified when they send the ETag back.
+# Changes are also pushed: subscriptions receive an event per changed key and wait_for_changes
+# blocks until a key moves past a given version, for long-polling clients.
+# Entries are never changed in place, set swaps in a new one, so readers always see a consistent
+# snapshot. SessionStore keeps one StateStore per session and evicts sessions that went idle.
+# For history_keys the store also keeps the last history_size changes as JSON Patches, so clients
+# can send and fetch deltas instead of the whole value.
+# With a journal (server/persistence.py) SessionStore hands every change to it and restores all
+# sessions from it on startup, at the versions they had.
+
+
+class StateEntry:
+    def __init__(self, value, version, digest, dumps):
+        self.value = value
+        self.version = version
+        self.digest = digest
+        self._dumps = dumps
+        self._bodies = {}
+
+    @property
+    def etag(self):
+        return f"{self.version}-{self.digest}"
+
+    def event(self, key, include_value=False):
+        event = {"key": key, "version": self.version, "etag": self.etag}
+        if include_value:
+            event["value"] = self.value
+        return event
+
+    def body(self, view, build, dumps=None):
+        """
+        Serialized build(value), computed once per view for this version of the value.
+        dumps replaces the store's JSON serializer, e.g. for binary formats; views must then be distinct.
+        """
+        body = self._bodies.get(view)
+        if body is None:
+            body = (dumps or self._dumps)(build(self.value))
+            if isinstance(body, str):
+                body = body.encode("utf8")
+            self._bodies[view] = body
+        return body
+
+    def gzip_body(self, view, build, level=5, dumps=None):
+        """Gzip-compressed body(view, build, dumps), also computed once per version."""
+        key = (view, "gzip")
+        body = self._bodies.get(key)
+        if body is None:
+            body = gzip.compress(self.body(view, build, dumps), compresslevel=level)
+            self._bodies[key] = body
+        return body
+
+
+class Subscription:
+    """
+    Change events for one client. Pending events are coalesced per key, since only the latest
+    version of a key matters, and at most max_events are kept; older ones are dropped and counted.
+    """
+
+    def __init__(self, keys=None, max_events=64):
+        self.keys = set(keys) if keys else None
+        self.max_events = max_events
+        self.dropped = 0
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+
+    def wants(self, key):
+        return self.keys is None or key in self.keys
+
+    def push(self, event):
+        if not self.wants(event["key"]):
+            return
+        with self._cond:
+            self._pending.pop(event["key"], None)
+            self._pending[event["key"]] = event
+            while len(self._pending) > self.max_events:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Wait up to timeout seconds for events and return them, oldest first; [] on timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending, timeout)
+            events = list(self._pending.values())
+            self._pending.clear()
+            return events
+
+
+class VersionConflict(Exception):
+    """A patch was based on a version that is no longer current."""
+
+    def __init__(self, entry):
+        super().__init__(f"Value changed, current version is {entry.version}")
+        self.entry = entry
+
+
+class StateStore:
+    def __init__(self, dumps=json.dumps, history_keys=(), history_size=100, on_commit=None):
+        self._dumps = dumps
+        self._on_commit = on_commit
+        self._history_keys = set(history_keys)
+        self._history_size = history_size
+        self._history = {}
+        self._entries = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._subscribers = set()
+
+    def _digest(self, value):
+        payload = json.dumps(value, sort_keys=True, default=str).encode("utf8")
+        return hashlib.sha256(payload).hexdigest()[:16]
+
+    def set(self, key, value):
+        """Store value under key and return its entry; the version is kept if nothing changed."""
+        digest = self._digest(value)
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current.digest == digest:
+                return current
+            patch = None
+            if key in self._history_keys and current is not None and current.version > 0:
+                patch = make_patch(current.value, value)
+            return self._commit(key, value, digest, current, patch)
+
+    def patch(self, key, patch, base_version=None):
+        """
+        Apply a JSON Patch to the value of key and return the new entry. With base_version the
+        patch is only applied if that is still the current version, otherwise VersionConflict is
+        raised. Invalid patches raise JsonPatchError and leave the value unchanged.
+        """
+        with self._lock:
+            current = self._entries.get(key)
+            current_version = current.version if current is not None else 0
+            if base_version is not None and base_version != current_version:
+                raise VersionConflict(current or StateEntry(None, 0, self._digest(None), self._dumps))
+            # Patched on a copy, so readers of the current entry never see a half-applied patch
+            value = apply_patch(current.value if current is not None else None, patch)
+            digest = self._digest(value)
+            if current is not None and current.digest == digest:
+                return current
+            return self._commit(key, value, digest, current, patch)
+
+    def _commit(self, key, value, digest, current, patch):
+        self._version += 1
+        entry = StateEntry(value, self._version, digest, self._dumps)
+        self._entries[key] = entry
+        if key in self._history_keys:
+            history = self._history.setdefault(key, deque(maxlen=self._history_size))
+            if patch is None:
+                # Without a patch from the previous version, older versions cannot catch up
+                history.clear()
+            else:
+                history.append((current.version, entry.version, patch))
+        if self._on_commit is not None:
+            self._on_commit(key, entry)
+        self._changed.notify_all()
+        for subscription in self._subscribers:
+            subscription.push(entry.event(key))
+        return entry
+
+    def restore(self, key, value, version, digest=None):
+        """
+        Put back a value saved at version, e.g. after a restart; later changes continue above it.
+        Passing the saved digest keeps the ETag and skips hashing the value again.
+        """
+        with self._lock:
+            self._entries[key] = StateEntry(value, version, digest or self._digest(value), self._dumps)
+            self._version = max(self._version, version)
+
+    def patch_since(self, key, since):
+        """
+        Return (entry, patch) where patch turns the value at version since into the current one,
+        or (entry, None) if since is too old (or unknown) to be caught up with a patch.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = StateEntry(None, 0, self._digest(None), self._dumps)
+                return entry, [] if since == 0 else None
+            if since == entry.version:
+                return entry, []
+            steps = [step for step in self._history.get(key, ()) if step[1] > since]
+            if not steps or steps[0][0] > since or since > entry.version:
+                return entry, None
+            return entry, [operation for _, _, patch in steps for operation in patch]
+
+    def entry(self, key):
+        """The current entry for key; keys that were never set read as None at version 0."""
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = StateEntry(None, 0, self._digest(None), self._dumps)
+                    self._entries[key] = entry
+        return entry
+
+    def get(self, key):
+        return self.entry(key).value
+
+    @property
+    def version(self):
+        return self._version
+
+    def versions(self):
+        with self._lock:
+            return {key: entry.version for key, entry in self._entries.items()}
+
+    def _changes_since(self, keys, since, include_values=False):
+        return sorted(
+            (entry.event(key, include_values) for key, entry in self._entries.items()
+             if entry.version > since and (not keys or key in keys)),
+            key=lambda event: event["version"],
+        )
+
+    def changes_since(self, keys=None, since=0, include_values=False):
+        """Events for every key (of keys) whose version is above since, oldest first."""
+        with self._lock:
+            return self._changes_since(keys, since, include_values)
+
+    def wait_for_changes(self, keys=None, since=0, timeout=None, include_values=False):
+        """Like changes_since, but block up to timeout seconds until there is at least one change."""
+        with self._changed:
+            self._changed.wait_for(lambda: self._changes_since(keys, since), timeout)
+            return self._changes_since(keys, since, include_values)
+
+    def subscribe(self, keys=None, max_events=64):
+        subscription = Subscription(keys, max_events)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+class SessionStore:
+    """
+    One StateStore per session id. Sessions are created on first use and evicted from memory once
+    they have not been accessed for idle_timeout seconds and have no open subscriptions. The
+    default session, used by clients that send no session id, is never evicted.
+    With a journal, changes are saved through it and the saved sessions are loaded right away;
+    an evicted session keeps its saved state and is loaded again on its next access, unless
+    drop_evicted is set, which deletes it from the journal too.
+    """
+
+    def __init__(self, idle_timeout=3600, sweep_interval=60, default="default", dumps=json.dumps, journal=None, drop_evicted=False, **store_options):
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.default = default
+        self.journal = journal
+        self.drop_evicted = drop_evicted
+        self._dumps = dumps
+        self._store_options = store_options
+        self._sessions = {}
+        self._last_access = {}
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+        if journal is not None:
+            self._restore()
+
+    def _new_store(self, session_id):
+        on_commit = None
+        if self.journal is not None:
+            on_commit = lambda key, entry: self.journal.changed(session_id, key, entry)
+        return StateStore(self._dumps, on_commit=on_commit, **self._store_options)
+
+    def _restored_store(self, session_id, entries):
+        store = self._new_store(session_id)
+        for key, (version, digest, value) in entries.items():
+            store.restore(key, value, version, digest)
+        return store
+
+    def _restore(self):
+        start = time.perf_counter()
+        saved = self.journal.load()
+        now = time.monotonic()
+        for session_id, entries in saved.items():
+            self._sessions[session_id] = self._restored_store(session_id, entries)
+            self._last_access[session_id] = now
+        if saved:
+            keys = sum(len(entries) for entries in saved.values())
+            print(f"Restored {keys} keys in {len(saved)} sessions from {self.journal.path} in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def get(self, session_id=None):
+        session_id = session_id or self.default
+        with self._lock:
+            store = self._sessions.get(session_id)
+            if store is not None:
+                return self._accessed(session_id, store)
+        # A session evicted while idle continues from its saved state. It is read without the lock,
+        # so requests for other sessions do not wait for the journal
+        entries = self.journal.load_session(session_id) if self.journal is not None else None
+        loaded = self._restored_store(session_id, entries) if entries else self._new_store(session_id)
+        with self._lock:
+            # Another request for the session may have loaded it meanwhile; the first one in is kept
+            store = self._sessions.setdefault(session_id, loaded)
+            if store is loaded and entries:
+                print(f"Reloaded session {session_id} ({len(entries)} keys)")
+            return self._accessed(session_id, store)
+
+    def _accessed(self, session_id, store):
+        now = time.monotonic()
+        self._last_access[session_id] = now
+        # Sweeping on access keeps the store free of a background thread
+        if now - self._last_sweep > self.sweep_interval:
+            self._evict_idle(now)
+        return store
+
+    def _evict_idle(self, now):
+        self._last_sweep = now
+        for session_id, last_access in list(self._last_access.items()):
+            if session_id == self.default or now - last_access < self.idle_timeout:
+                continue
+            if self._sessions[session_id].subscriber_count():
+                continue
+            del self._sessions[session_id]
+            del self._last_access[session_id]
+            if self.journal is not None and self.drop_evicted:
+                self.journal.drop_session(session_id)
+            print(f"Evicted idle session {session_id}")
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict_idle(time.monotonic())
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                session_id: {
+                    "idle_seconds": round(now - self._last_access[session_id], 1),
+                    "version": store.version,
+                    "subscribers": store.subscriber_count(),
+                }
+                for session_id, store in self._sessions.items()
+            }
@@ -0,0 +1,89 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from server.persistence import StateJournal
+from server.state import SessionStore
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = StateJournal(str(tmp_path / "state.sqlite"), flush_interval=0.01)
+    yield journal
+    journal.close()
+
+
+def test_state_survives_a_restart(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    journal = StateJournal(path)
+    store = SessionStore(journal=journal).get("rhino")
+    entry = store.set("graph_data", {"nodes": [], "links": []})
+    journal.close()
+
+    restored = SessionStore(journal=StateJournal(path)).get("rhino")
+    assert restored.get("graph_data") == {"nodes": [], "links": []}
+    assert restored.entry("graph_data").etag == entry.etag
+    assert restored.set("area", 5).version == entry.version + 1
+
+
+def test_evicted_session_is_reloaded(journal):
+    sessions = SessionStore(idle_timeout=0, sweep_interval=0, journal=journal)
+    entry = sessions.get("rhino").set("area", 5)
+    time.sleep(0.01)
+    sessions.get("other")  # sweeps and evicts rhino
+    assert "rhino" not in sessions.stats()
+    assert sessions.get("rhino").entry("area").etag == entry.etag
+
+
+def test_load_session_includes_changes_not_written_yet(tmp_path):
+    journal = StateJournal(str(tmp_path / "state.sqlite"), flush_interval=60)
+    sessions = SessionStore(journal=journal)
+    sessions.get("rhino").set("area", 5)
+    journal.drop_session("rhino")
+    sessions.get("rhino").set("area", 6)
+    assert journal.load_session("rhino") == {"area": (2, sessions.get("rhino").entry("area").digest, 6)}
+    assert journal.writes == 0
+
+
+def test_reloading_a_session_does_not_block_others(journal):
+    sessions = SessionStore(journal=journal)
+    sessions.get("fast")
+    release = threading.Event()
+    load_session = journal.load_session
+
+    def slow_load_session(session_id):
+        release.wait(5)
+        return load_session(session_id)
+
+    journal.load_session = slow_load_session
+    loader = threading.Thread(target=sessions.get, args=("slow",))
+    loader.start()
+    time.sleep(0.05)
+    start = time.perf_counter()
+    sessions.get("fast")
+    assert time.perf_counter() - start < 1
+    release.set()
+    loader.join()
+
+
+def test_failed_flush_keeps_changes(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    journal = StateJournal(path, flush_interval=0.01)
+    journal._db.execute("PRAGMA busy_timeout=0")
+    sessions = SessionStore(journal=journal)
+    store = sessions.get("rhino")
+    lock = sqlite3.connect(path, timeout=0)
+    lock.execute("BEGIN EXCLUSIVE")
+    store.set("area", 5)
+    store.set("external_functions", {"north": "entrance"})
+    time.sleep(0.1)
+    assert journal.failures > 0
+    store.set("area", 6)
+    lock.rollback()
+    lock.close()
+    journal.close()
+    saved = StateJournal(path).load()["rhino"]
+    assert saved["area"][2] == 6
+    assert saved["external_functions"][2] == {"north": "entrance"}
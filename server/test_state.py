@@ -0,0 +1,68 @@
+import pytest
+
+from server.state import StateStore, VersionConflict
+from utils.json_patch import JsonPatchError
+
+
+MOVE = [{"op": "replace", "path": "/nodes/0/pos", "value": [5, 5]}]
+
+
+@pytest.fixture
+def store():
+    store = StateStore(history_keys=("graph_data",), history_size=3)
+    store.set("graph_data", {"nodes": [{"id": "play", "pos": [0, 0]}], "links": []})
+    return store
+
+
+def test_set_keeps_the_version_of_an_unchanged_value(store):
+    entry = store.entry("graph_data")
+    assert store.set("graph_data", {"nodes": [{"id": "play", "pos": [0, 0]}], "links": []}) is entry
+    assert store.set("area", 5).version == entry.version + 1
+
+
+def test_patch_against_the_current_version(store):
+    base = store.entry("graph_data")
+    entry = store.patch("graph_data", MOVE, base.version)
+    assert entry.version == base.version + 1
+    assert entry.value["nodes"][0]["pos"] == [5, 5]
+    assert base.value["nodes"][0]["pos"] == [0, 0]
+
+
+def test_patch_against_an_old_version_conflicts(store):
+    base = store.entry("graph_data")
+    store.patch("graph_data", MOVE)
+    with pytest.raises(VersionConflict) as conflict:
+        store.patch("graph_data", [{"op": "replace", "path": "/links", "value": []}], base.version)
+    assert conflict.value.entry.version == base.version + 1
+
+
+def test_invalid_patch_leaves_the_value(store):
+    entry = store.entry("graph_data")
+    with pytest.raises(JsonPatchError):
+        store.patch("graph_data", [{"op": "remove", "path": "/missing"}])
+    assert store.entry("graph_data") is entry
+
+
+def test_patch_since_combines_the_steps(store):
+    since = store.entry("graph_data").version
+    store.patch("graph_data", MOVE)
+    store.patch("graph_data", [{"op": "add", "path": "/links/-", "value": {"source": "play", "target": "play"}}])
+    entry, patch = store.patch_since("graph_data", since)
+    assert patch == MOVE + [{"op": "add", "path": "/links/-", "value": {"source": "play", "target": "play"}}]
+    assert store.patch_since("graph_data", entry.version) == (entry, [])
+
+
+def test_patch_since_too_old_or_unknown(store):
+    since = store.entry("graph_data").version
+    for x in range(4):
+        store.patch("graph_data", [{"op": "replace", "path": "/nodes/0/pos", "value": [x + 1, x + 1]}])
+    # Only the last history_size steps are kept
+    assert store.patch_since("graph_data", since)[1] is None
+    assert store.patch_since("graph_data", since + 1)[1] is not None
+    assert store.patch_since("graph_data", store.version + 1)[1] is None
+
+
+def test_set_records_the_difference(store):
+    since = store.entry("graph_data").version
+    store.set("graph_data", {"nodes": [], "links": []})
+    assert store.patch_since("graph_data", since)[1] == [{"op": "remove", "path": "/nodes/0"}]
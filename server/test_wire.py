@@ -0,0 +1,80 @@
+import pytest
+
+from server.wire import WireFormatError, from_columnar, msgpack, msgpack_dumps, msgpack_loads, to_columnar
+
+
+GRAPH = {
+    "directed": False,
+    "multigraph": False,
+    "graph": {"name": "courtyard"},
+    "nodes": [
+        {"id": "play", "pos": {"x": 1.0, "y": 2.0, "z": 0.0}, "weight": 3, "anchor": True},
+        {"id": "pond", "pos": {"x": -4.0, "y": 5.0}, "weight": 2},
+        {"id": "north", "anchor": False},
+    ],
+    "links": [
+        {"source": "play", "target": "pond"},
+        {"source": "pond", "target": "north", "weight": 1},
+    ],
+}
+
+
+def test_columns():
+    columnar = to_columnar(GRAPH)
+    assert columnar["layout"] == "columnar"
+    assert columnar["graph"] == {"name": "courtyard"}
+    assert columnar["nodes"]["id"] == ["play", "pond", "north"]
+    assert columnar["nodes"]["x"] == [1.0, -4.0, None]
+    assert columnar["nodes"]["z"] == [0.0, None, None]
+    assert columnar["links"]["weight"] == [None, 1]
+
+
+def test_round_trip():
+    assert from_columnar(to_columnar(GRAPH)) == GRAPH
+
+
+def test_empty_graph():
+    graph = {"nodes": [], "links": []}
+    assert from_columnar(to_columnar(graph)) == graph
+
+
+@pytest.mark.skipif(msgpack is None, reason="needs msgpack")
+def test_msgpack_round_trip():
+    assert msgpack_loads(msgpack_dumps(to_columnar(GRAPH))) == to_columnar(GRAPH)
+    assert msgpack_loads(msgpack_dumps(GRAPH)) == GRAPH
+
+
+def test_round_trip_keeps_nulls_and_absent_fields():
+    graph = {
+        "nodes": [{"id": "play", "weight": 3}, {"id": "pond", "weight": None}, {"id": "north"}],
+        "links": [{"source": "play", "target": "pond", "weight": None}],
+    }
+    columnar = to_columnar(graph)
+    assert columnar["nodes"]["weight"] == [3, None, None]
+    assert columnar["missing"] == {"nodes": {"weight": [2]}, "links": {}}
+    assert from_columnar(columnar) == graph
+
+
+def test_round_trip_without_absent_fields_has_no_mask():
+    graph = {"nodes": [{"id": "a", "weight": None}], "links": []}
+    columnar = to_columnar(graph)
+    assert "missing" not in columnar
+    assert from_columnar(columnar) == graph
+
+
+def test_nulls_without_mask_are_values():
+    columnar = {"layout": "columnar", "nodes": {"id": ["a", "b"], "weight": [1, None]}, "links": {}}
+    assert from_columnar(columnar)["nodes"] == [{"id": "a", "weight": 1}, {"id": "b", "weight": None}]
+
+
+@pytest.mark.parametrize("columnar", [
+    {"nodes": {"id": ["a", "b"], "weight": [1]}},
+    {"nodes": {"id": "ab"}},
+    {"nodes": ["a", "b"]},
+    {"nodes": {"id": ["a"]}, "missing": {"nodes": {"id": [1]}}},
+    {"nodes": {"id": ["a"]}, "missing": {"nodes": {"weight": [0]}}},
+    {"nodes": {"id": ["a"]}, "missing": ["nodes"]},
+])
+def test_malformed_payloads_raise(columnar):
+    with pytest.raises(WireFormatError):
+        from_columnar(dict(columnar, layout="columnar"))
@@ -0,0 +1,120 @@
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Wire formats for gh_server payloads besides plain JSON.
+# MessagePack (pip install msgpack) is a compact binary encoding of the same data, and the
+# columnar layout stores graph_data nodes and links as parallel arrays, so a client reads
+# one list per field instead of one object per node:
+#   {"layout": "columnar", "directed": ..., "multigraph": ..., "graph": {...},
+#    "nodes": {"id": [...], "x": [...], "y": [...], "z": [...], "weight": [...], "anchor": [...]},
+#    "links": {"source": [...], "target": [...]}}
+# Fields a node or link does not have are null in its column and listed by row under "missing",
+# e.g. "missing": {"nodes": {"weight": [3]}}, so a null value survives the round trip; without
+# "missing" every null is a value. from_columnar raises WireFormatError for malformed payloads.
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+POS_FIELDS = ("x", "y", "z")
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def msgpack_dumps(obj):
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def msgpack_loads(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+def _fields(name, value, flatten_pos):
+    if flatten_pos and name == "pos" and isinstance(value, dict):
+        return [(field, value[field]) for field in POS_FIELDS if field in value]
+    return [(name, value)]
+
+
+def _columns(items, flatten_pos=False):
+    """Returns (columns, missing): missing maps each field to the rows that do not have it."""
+    columns = {}
+    present = {}
+    for i, item in enumerate(items):
+        for name, value in item.items():
+            for field, field_value in _fields(name, value, flatten_pos):
+                if field not in columns:
+                    columns[field] = [None] * len(items)
+                    present[field] = set()
+                columns[field][i] = field_value
+                present[field].add(i)
+    missing = {
+        field: [i for i in range(len(items)) if i not in rows]
+        for field, rows in present.items() if len(rows) < len(items)
+    }
+    return columns, missing
+
+
+def _check(columns, missing, section):
+    if not isinstance(columns, dict) or not all(isinstance(column, list) for column in columns.values()):
+        raise WireFormatError(f"{section} must map each field to a list")
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise WireFormatError(f"The {section} columns have different lengths")
+    count = lengths.pop() if lengths else 0
+    if not isinstance(missing, dict):
+        raise WireFormatError(f"missing.{section} must map fields to lists of rows")
+    for field, rows in missing.items():
+        if field not in columns or not isinstance(rows, list):
+            raise WireFormatError(f"missing.{section}.{field} must be a list of rows of a {section} field")
+        if not all(isinstance(i, int) and not isinstance(i, bool) and 0 <= i < count for i in rows):
+            raise WireFormatError(f"missing.{section}.{field} has rows outside 0..{count - 1}")
+    return count
+
+
+def _rows(columns, missing, section, nest_pos=False):
+    count = _check(columns, missing, section)
+    absent = {field: set(rows) for field, rows in missing.items()}
+    rows = []
+    for i in range(count):
+        row = {}
+        for name, column in columns.items():
+            if i in absent.get(name, ()):
+                continue
+            value = column[i]
+            if nest_pos and name in POS_FIELDS:
+                row.setdefault("pos", {})[name] = value
+            else:
+                row[name] = value
+        rows.append(row)
+    return rows
+
+
+def is_graph(value):
+    return isinstance(value, dict) and isinstance(value.get("nodes"), list)
+
+
+def is_columnar(value):
+    return isinstance(value, dict) and value.get("layout") == "columnar"
+
+
+def to_columnar(graph):
+    """graph_data with node and link objects -> columnar layout."""
+    columnar = {key: value for key, value in graph.items() if key not in ("nodes", "links")}
+    columnar["layout"] = "columnar"
+    columnar["nodes"], missing_nodes = _columns(graph.get("nodes", []), flatten_pos=True)
+    columnar["links"], missing_links = _columns(graph.get("links", []))
+    if missing_nodes or missing_links:
+        columnar["missing"] = {"nodes": missing_nodes, "links": missing_links}
+    return columnar
+
+
+def from_columnar(columnar):
+    """Columnar layout -> graph_data with node and link objects."""
+    graph = {key: value for key, value in columnar.items() if key not in ("layout", "nodes", "links", "missing")}
+    missing = columnar.get("missing", {})
+    if not isinstance(missing, dict):
+        raise WireFormatError("missing must be an object with nodes and links")
+    graph["nodes"] = _rows(columnar.get("nodes", {}), missing.get("nodes", {}), "nodes", nest_pos=True)
+    graph["links"] = _rows(columnar.get("links", {}), missing.get("links", {}), "links")
+    return graph
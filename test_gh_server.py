@@ -0,0 +1,104 @@
+import os
+import uuid
+
+# Keep the tests' sessions out of the saved gh_server state
+os.environ["GH_STATE_PATH"] = ""
+
+import pytest
+
+import gh_server
+from server.wire import to_columnar
+
+
+GRAPH = {"nodes": [{"id": "play", "pos": [0, 0]}], "links": []}
+
+
+@pytest.fixture
+def client():
+    client = gh_server.app.test_client()
+    client.environ_base["HTTP_X_SESSION_ID"] = uuid.uuid4().hex
+    return client
+
+
+def test_conditional_get(client):
+    client.post("/plot_area", json={"input": 120})
+    response = client.get("/plot_area")
+    etag = response.headers["ETag"]
+    assert response.get_json()["area"] == 120
+    cached = client.get("/plot_area", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.data == b""
+    assert client.head("/plot_area", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_etag_changes_with_the_value(client):
+    client.post("/plot_area", json={"input": 120})
+    etag = client.get("/plot_area").headers["ETag"]
+    client.post("/plot_area", json={"input": 120})
+    assert client.get("/plot_area").headers["ETag"] == etag
+    client.post("/plot_area", json={"input": 150})
+    response = client.get("/plot_area", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+
+
+def test_post_with_current_etag_gets_a_body(client):
+    client.post("/plot_area", json={"input": 120})
+    etag = client.get("/plot_area").headers["ETag"]
+    response = client.post("/plot_area", json={"input": 120}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["area"] == 120
+
+
+def post_graph(client):
+    return client.post("/graph_data", json=GRAPH).get_json()
+
+
+def move(client, headers=None, query=""):
+    patch = [{"op": "replace", "path": "/nodes/0/pos", "value": [5, 5]}]
+    return client.patch("/graph_data" + query, json=patch, headers=headers or {})
+
+
+def test_patch_with_current_etag(client):
+    posted = post_graph(client)
+    response = move(client, {"If-Match": f'"{posted["etag"]}"'})
+    assert response.status_code == 200
+    assert client.get("/graph_data").get_json()["nodes"][0]["pos"] == [5, 5]
+
+
+def test_patch_with_weak_etag_is_version_checked(client):
+    posted = post_graph(client)
+    assert move(client, {"If-Match": f'W/"{posted["etag"]}"'}).status_code == 200
+    # The weak tag now names an old version
+    response = move(client, {"If-Match": f'W/"{posted["etag"]}"'})
+    assert response.status_code == 409
+    assert response.get_json()["version"] == posted["version"] + 1
+
+
+@pytest.mark.parametrize("headers, query", [
+    ({"If-Match": '"abc"'}, ""),
+    ({"If-Match": '"1-a", "2-b"'}, ""),
+    ({"If-Match": ","}, ""),
+    ({}, "?base=latest"),
+])
+def test_patch_with_malformed_precondition(client, headers, query):
+    post_graph(client)
+    assert move(client, headers, query).status_code == 400
+    assert client.get("/graph_data").get_json()["nodes"][0]["pos"] == [0, 0]
+
+
+def test_patch_since(client):
+    posted = post_graph(client)
+    move(client)
+    body = client.get(f"/graph_data?since={posted['version']}").get_json()
+    assert body["patch"] == [{"op": "replace", "path": "/nodes/0/pos", "value": [5, 5]}]
+
+
+def test_columnar_post_keeps_null_fields(client):
+    graph = {"nodes": [{"id": "play", "weight": None}, {"id": "pond"}], "links": []}
+    response = client.post("/graph_data", json=to_columnar(graph))
+    assert response.status_code == 200
+    assert client.get("/graph_data").get_json()["nodes"] == graph["nodes"]
+
+
+def test_columnar_post_with_uneven_columns(client):
+    columnar = {"layout": "columnar", "nodes": {"id": ["play", "pond"], "weight": [1]}, "links": {}}
+    assert client.post("/graph_data", json=columnar).status_code == 400
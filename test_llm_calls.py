@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+import pytest
+
+import llm_calls
+from utils.llm_cache import ResponseCache
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=f"reply {self.calls}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def completions(monkeypatch, tmp_path):
+    completions = FakeCompletions()
+    monkeypatch.setattr(llm_calls, "client", SimpleNamespace(chat=SimpleNamespace(completions=completions), base_url="http://test/v1/"))
+    monkeypatch.setattr(llm_calls, "response_cache", ResponseCache(str(tmp_path / "responses.sqlite")))
+    monkeypatch.setattr(llm_calls, "rate_limiter", None)
+    return completions
+
+
+def ask(name):
+    return llm_calls.chat_completion(name, model="m", messages=[{"role": "user", "content": "hi"}])
+
+
+def test_extractions_are_cached(completions):
+    assert ask("extract_spaces") == ask("extract_spaces") == "reply 1"
+    assert completions.calls == 1
+
+
+def test_free_text_calls_are_not_cached(completions):
+    assert ask("create_questions") == "reply 1"
+    assert ask("create_questions") == "reply 2"
+
+
+def test_other_backend_misses_the_cache(completions, monkeypatch):
+    ask("extract_spaces")
+    monkeypatch.setattr(llm_calls.client, "base_url", "http://other/v1/")
+    assert ask("extract_spaces") == "reply 2"
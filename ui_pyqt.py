@@ -3,7 +3,11 @@ from llm_calls import *
 from PyQt5.QtWidgets import (
     QMainWindow, QVBoxLayout, QWidget, QLabel, QLineEdit, QPushButton, QTextBrowser, QHBoxLayout
 )
-import re
+from PyQt5.QtCore import pyqtSignal, QTimer
+from PyQt5.QtGui import QTextCursor
+from jobs import JobRunner
+from pipeline import collect_design_data, collect_tree_data, build_graph
+from utils.graph_sync import graph_sync
 from graph_gh import GraphEditor, MainWindow, QApplication
 import csv
 import os
@@ -11,6 +15,9 @@ import random
 import json
 
 class FlaskClientChatUI(QMainWindow):
+    # Lets background jobs add html to the chat; the signal is delivered on the GUI thread
+    message_posted = pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Courtyard Design Copilot")
@@ -232,8 +239,44 @@ class FlaskClientChatUI(QMainWindow):
         self.export_csv_button.setVisible(False)  # Initially hidden
         control_layout.addWidget(self.export_csv_button)
 
+        # Cancel button, only visible while a phase is running in the background
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setStyleSheet("""
+            QPushButton {
+                background-color: #F44336;
+                color: white;
+                border: none;
+                border-radius: 4px;
+                padding: 10px 25px;
+                font-weight: bold;
+                font-size: 14px;
+            }
+            QPushButton:hover {
+                background-color: #D32F2F;
+            }
+            QPushButton:pressed {
+                background-color: #B71C1C;
+            }
+        """)
+        self.cancel_button.clicked.connect(self.cancel_job)
+        self.cancel_button.setVisible(False)  # Initially hidden
+        control_layout.addWidget(self.cancel_button)
+
         main_layout.addWidget(control_container)
 
+        # LLM calls and server requests run on a background thread pool
+        self.jobs = JobRunner(self)
+        self.jobs.busy_changed.connect(self.set_busy)
+        self.message_posted.connect(self.chat_display.append)
+
+        # Streamed replies are rendered into one assistant bubble, refreshed at most every 50 ms
+        self.stream_start = None
+        self.stream_text = ""
+        self.stream_timer = QTimer(self)
+        self.stream_timer.setSingleShot(True)
+        self.stream_timer.setInterval(50)
+        self.stream_timer.timeout.connect(self.render_stream)
+
         # Initialize other properties
         self.phases = {
             "concept": [],
@@ -288,7 +331,7 @@ class FlaskClientChatUI(QMainWindow):
 
     def send_message(self):
         message = self.input_field.text().strip()
-        if not message:
+        if not message or self.jobs.is_busy():
             return
 
         # Clear input field
@@ -317,127 +360,230 @@ class FlaskClientChatUI(QMainWindow):
         """
         self.chat_display.append(user_html)
 
-        try:
-            if self.current_phase == "concept":
-                # Add plot area to the message
-                plot_area = self.get_plot_area()
-                message = f"{message}. Make sure the plot area is {plot_area['area']} m²."
-            
-            # Add message to current phase
-            self.phases[self.current_phase].append({"role": "user", "content": message})
-
-            # Process message based on current phase
-            if self.current_phase == "concept":
-                assistant_message = generate_concept_with_conversation(self.phases[self.current_phase])
-                self.concept = assistant_message
-            elif self.current_phase == "functions":
-                assistant_message = extract_external_functions(self.phases[self.current_phase])
-                json_llm_response = extract_json(assistant_message)
-                self.extracted_functions = json_llm_response["external_functions"]
-                self.set_extracted_functions()
-                assistant_message = f"Your requirements have been saved as follows: {json_llm_response}<br>Does this look good? If so, press continue."
-            elif self.current_phase == "attributes":
-                assistant_message = extract_attributes_with_conversation(self.phases[self.current_phase], self.concept)
-                json_llm_response = extract_json(assistant_message)
-                self.attributes = json_llm_response
-                assistant_message = f"I have added your requirements to the total list of attributes. {json_llm_response}Is this okay? If so, press continue."
-                
-                # Send geometry and tree data to server
-                self.geometry_data()
-                self.get_tree_data()
-                
-                # Post geometry data to server with proper headers
-                headers = {
-                    'Content-Type': 'application/json'
-                }
-                geometry_data_response = requests.post(
-                    "http://127.0.0.1:5000/geometry_data",
-                    json={"geometry_data": self.design_data},
-                    headers=headers
-                )
-                
-                if geometry_data_response.status_code == 200:
-                    func_data = geometry_data_response.json()
-                    self.chat_display.append(f"""
-                    <div style="margin: 10px 0;">
-                        <div style="
-                            background-color: #E8F5E9;
-                            color: #2E7D32;
-                            padding: 12px 20px;
-                            border-radius: 15px;
-                            margin: 0 20%;
-                            display: inline-block;
-                            max-width: 60%;
-                            box-shadow: 0 1px 2px rgba(0,0,0,0.1);
-                            font-size: 14px;
-                            font-style: italic;
-                        ">
-                            Geometry data sent successfully to server. Response: {func_data}
-                        </div>
-                    </div>
-                    """)
-                else:
-                    raise Exception(f"Server returned status code {geometry_data_response.status_code}")
-                
-            elif self.current_phase == "criticism":
-                assistant_message = criticize_courtyard_graph(self.phases[self.current_phase])
-                self.attributes = assistant_message
+        self.jobs.submit(
+            "send_message",
+            self.process_message,
+            self.current_phase,
+            message,
+            on_result=self.show_assistant_message,
+            on_progress=self.show_progress,
+            on_partial=self.show_partial,
+            on_error=self.show_error,
+            on_cancelled=self.show_cancelled,
+        )
 
-            # Add assistant message to chat with styling
-            assistant_html = f"""
-            <div style="margin: 10px 0;">
-                <div style="
-                    background-color: #F5F5F5;
-                    color: #212121;
-                    padding: 12px 20px;
-                    border-radius: 15px;
-                    border-top-left-radius: 5px;
-                    margin-right: 20%;
-                    margin-left: 0;
-                    display: inline-block;
-                    max-width: 70%;
-                    box-shadow: 0 1px 2px rgba(0,0,0,0.1);
-                    font-size: 14px;
-                    line-height: 1.5;
-                ">
-                    {assistant_message}
+    def process_message(self, job, phase, message):
+        """
+        Runs on a background thread: sends the message through the LLM calls of the given phase
+        and returns (phase, assistant_message) for show_assistant_message.
+        """
+        if phase == "concept":
+            # Add plot area to the message
+            plot_area = self.get_plot_area()
+            message = f"{message}. Make sure the plot area is {plot_area['area']} m²."
+
+        # Add message to current phase
+        self.phases[phase].append({"role": "user", "content": message})
+
+        # Process message based on current phase
+        if phase == "concept":
+            job.report("Generating concept...")
+            assistant_message = self.stream_to_chat(job, generate_concept_with_conversation(self.phases[phase], stream=True))
+            self.concept = assistant_message
+        elif phase == "functions":
+            job.report("Extracting functions...")
+            assistant_message = extract_external_functions(self.phases[phase])
+            json_llm_response = extract_json(assistant_message)
+            self.extracted_functions = json_llm_response["external_functions"]
+            self.set_extracted_functions()
+            assistant_message = f"Your requirements have been saved as follows: {json_llm_response}<br>Does this look good? If so, press continue."
+        elif phase == "attributes":
+            job.report("Extracting attributes...")
+            assistant_message = extract_attributes_with_conversation(self.phases[phase], self.concept)
+            json_llm_response = extract_json(assistant_message)
+            self.attributes = json_llm_response
+            assistant_message = f"I have added your requirements to the total list of attributes. {json_llm_response}Is this okay? If so, press continue."
+
+            # Send geometry and tree data to server
+            self.geometry_data(job)
+            self.get_tree_data(job)
+            job.check_cancelled()
+
+            # Post geometry data to server with proper headers
+            headers = {
+                'Content-Type': 'application/json'
+            }
+            geometry_data_response = requests.post(
+                "http://127.0.0.1:5000/geometry_data",
+                json={"geometry_data": self.design_data},
+                headers=headers
+            )
+
+            if geometry_data_response.status_code == 200:
+                func_data = geometry_data_response.json()
+                self.post_message(f"""
+                <div style="margin: 10px 0;">
+                    <div style="
+                        background-color: #E8F5E9;
+                        color: #2E7D32;
+                        padding: 12px 20px;
+                        border-radius: 15px;
+                        margin: 0 20%;
+                        display: inline-block;
+                        max-width: 60%;
+                        box-shadow: 0 1px 2px rgba(0,0,0,0.1);
+                        font-size: 14px;
+                        font-style: italic;
+                    ">
+                        Geometry data sent successfully to server. Response: {func_data}
+                    </div>
                 </div>
+                """)
+            else:
+                raise Exception(f"Server returned status code {geometry_data_response.status_code}")
+
+        elif phase == "criticism":
+            job.report("Reviewing the design...")
+            assistant_message = self.stream_to_chat(job, criticize_courtyard_graph(self.phases[phase], stream=True))
+            self.attributes = assistant_message
+
+        return phase, assistant_message
+
+    def stream_to_chat(self, job, deltas):
+        """Forward streamed text to the chat as it arrives and return the complete message."""
+        parts = []
+        for delta in deltas:
+            job.stream(delta)
+            parts.append(delta)
+        return "".join(parts)
+
+    def assistant_bubble_html(self, message):
+        return f"""
+        <div style="margin: 10px 0;">
+            <div style="
+                background-color: #F5F5F5;
+                color: #212121;
+                padding: 12px 20px;
+                border-radius: 15px;
+                border-top-left-radius: 5px;
+                margin-right: 20%;
+                margin-left: 0;
+                display: inline-block;
+                max-width: 70%;
+                box-shadow: 0 1px 2px rgba(0,0,0,0.1);
+                font-size: 14px;
+                line-height: 1.5;
+            ">
+                {message}
             </div>
-            """
-            self.chat_display.append(assistant_html)
+        </div>
+        """
 
-            # Add assistant message to current phase
-            self.phases[self.current_phase].append({"role": "assistant", "content": assistant_message})
+    def show_partial(self, text):
+        if self.stream_start is None:
+            # Open an empty bubble at the end of the chat and remember where it starts
+            self.chat_display.append("")
+            self.stream_start = self.chat_display.document().characterCount() - 1
+            self.stream_text = ""
+        self.stream_text += text
+        if not self.stream_timer.isActive():
+            self.stream_timer.start()
 
-            # Show continue button if needed
-            if self.current_phase in ["functions", "attributes"]:
-                self.continue_button.setVisible(True)
+    def render_stream(self):
+        if self.stream_start is None:
+            return
+        cursor = QTextCursor(self.chat_display.document())
+        cursor.setPosition(self.stream_start)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.insertHtml(self.assistant_bubble_html(self.stream_text))
+        self.scroll_to_bottom()
 
-        except Exception as e:
-            error_html = f"""
-            <div style="margin: 10px 0;">
-                <div style="
-                    background-color: #FFEBEE;
-                    color: #C62828;
-                    padding: 12px 20px;
-                    border-radius: 15px;
-                    margin: 0 20%;
-                    display: inline-block;
-                    max-width: 60%;
-                    box-shadow: 0 1px 2px rgba(0,0,0,0.1);
-                    font-size: 14px;
-                ">
-                    Error: {str(e)}
-                </div>
+    def finish_stream(self, final_text=None):
+        """Render the last state of a streamed bubble. Returns False if nothing was streamed."""
+        if self.stream_start is None:
+            return False
+        self.stream_timer.stop()
+        if final_text is not None:
+            self.stream_text = final_text
+        self.render_stream()
+        self.stream_start = None
+        return True
+
+    def show_assistant_message(self, result):
+        phase, assistant_message = result
+
+        # Add assistant message to chat with styling, unless it was already streamed into a bubble
+        if not self.finish_stream(assistant_message):
+            self.chat_display.append(self.assistant_bubble_html(assistant_message))
+
+        # Add assistant message to current phase
+        self.phases[phase].append({"role": "assistant", "content": assistant_message})
+
+        # Show continue button if needed
+        if phase in ["functions", "attributes"]:
+            self.continue_button.setVisible(True)
+
+        self.scroll_to_bottom()
+
+    def show_error(self, message):
+        self.finish_stream()
+        error_html = f"""
+        <div style="margin: 10px 0;">
+            <div style="
+                background-color: #FFEBEE;
+                color: #C62828;
+                padding: 12px 20px;
+                border-radius: 15px;
+                margin: 0 20%;
+                display: inline-block;
+                max-width: 60%;
+                box-shadow: 0 1px 2px rgba(0,0,0,0.1);
+                font-size: 14px;
+            ">
+                Error: {message}
             </div>
-            """
-            self.chat_display.append(error_html)
+        </div>
+        """
+        self.chat_display.append(error_html)
+        self.scroll_to_bottom()
+
+    def show_progress(self, message):
+        self.chat_display.append(f"<span style='color: #757575; font-style: italic;'>{message}</span>")
+        self.scroll_to_bottom()
+
+    def show_cancelled(self):
+        self.finish_stream()
+        self.chat_display.append("<span style='color: #E65100;'>Cancelled.</span>")
+        self.scroll_to_bottom()
+
+    def report_progress(self, job, message):
+        # Phase methods can also be called without a job, e.g. from scripts
+        if job is not None:
+            job.report(message)
 
-        # Scroll to bottom
+    def post_message(self, html):
+        """Append html to the chat from any thread. Qt queues the signal onto the GUI thread."""
+        self.message_posted.emit(html)
+
+    def scroll_to_bottom(self):
         self.chat_display.verticalScrollBar().setValue(
             self.chat_display.verticalScrollBar().maximum()
         )
 
+    def set_busy(self, busy):
+        # Block new work while a job is running so a second click cannot queue a duplicate
+        self.send_button.setEnabled(not busy)
+        self.continue_button.setEnabled(not busy)
+        self.back_button.setEnabled(not busy)
+        self.cancel_button.setVisible(busy)
+        self.cancel_button.setEnabled(busy)
+
+    def cancel_job(self):
+        if self.jobs.is_busy():
+            self.cancel_button.setEnabled(False)
+            self.show_progress("Cancelling after the current step...")
+            self.jobs.cancel()
+
     def handle_continue(self):
         phases = list(self.phases.keys())
         current_index = list(phases).index(self.current_phase)
@@ -448,7 +594,14 @@ class FlaskClientChatUI(QMainWindow):
             self.continue_button.setVisible(False)
             self.show_phase_question()
             if self.current_phase == 'graph':
-                self.graph()
+                self.jobs.submit(
+                    "graph",
+                    self.graph,
+                    on_result=self.show_graph_window,
+                    on_progress=self.show_progress,
+                    on_error=self.show_error,
+                    on_cancelled=self.show_cancelled,
+                )
                 self.export_csv_button.setVisible(True)  # Show export button when in graph phase
                 
         else:
@@ -540,7 +693,7 @@ class FlaskClientChatUI(QMainWindow):
             
             return plot_area
         except Exception as e:
-            self.chat_display.append("<span style='color: red;'>Error fetching plot area from Grasshopper.</span>")
+            self.post_message("<span style='color: red;'>Error fetching plot area from Grasshopper.</span>")
             print(f"Error fetching plot area: {e}")
             # Return default values if there's an error
             return {
@@ -555,55 +708,41 @@ class FlaskClientChatUI(QMainWindow):
                 "http://localhost:5000/external_functions",
                 json={"functions": self.extracted_functions}),
         except Exception as e:
-            self.chat_display.append("<span style='color: red;'>Error extracting functions.</span>")
+            self.post_message("<span style='color: red;'>Error extracting functions.</span>")
             print(f"Error setting functions: {e}")
             return
 
 
-    def geometry_data(self):
+    def geometry_data(self, job=None):
         """
         Aggregate all relevant data from all phases, store in self.design_data, and persist to JSON DB.
         """
         try:
-            spaces = extract_json(extract_spaces(self.concept, self.extracted_functions, self.attributes))
-            links = extract_json(extract_links(self.concept, self.extracted_functions))
-            positions = extract_json(extract_positions(self.concept, self.extracted_functions))
-            cardinal_directions = extract_json(extract_cardinal_directions(self.concept, self.extracted_functions, self.attributes))
-            weights = extract_json(extract_weights(self.concept, self.extracted_functions, self.attributes))
-            anchors = extract_json(extract_anchors(self.concept, self.extracted_functions, self.attributes))
-            pos = extract_json(extract_pos(self.concept, self.extracted_functions))
-
-            self.design_data = {
-                "spaces": spaces["spaces"],
-                "links": links["links"],
-                "positions": positions["positions"],
-                "cardinal_directions": cardinal_directions["cardinal_directions"],
-                "weights": weights["weights"],
-                "anchors": anchors["anchors"],
-                "external_functions": self.extracted_functions,
-                "pos": pos["pos"]
-            }
+            self.report_progress(job, "Extracting geometry data...")
+            self.design_data, errors = collect_design_data(
+                self.concept,
+                self.extracted_functions,
+                self.attributes,
+                mode=geometry_extraction_mode,
+                max_workers=geometry_extraction_workers,
+            )
             print("Design data aggregated:", self.design_data)
 
+            for field, e in errors.items():
+                self.post_message(f"<span style='color: red;'>Error extracting {field}: {str(e)}</span>")
+                print(f"Error extracting {field}: {e}")
+
         except Exception as e:
-            self.chat_display.append("<span style='color: red;'>Error extracting geometry data.</span>")
+            self.post_message("<span style='color: red;'>Error extracting geometry data.</span>")
             print(f"Error in geometry_data: {e}")
 
 
-    def get_tree_data(self):
+    def get_tree_data(self, job=None):
         """
         Aggregate all relevant data from all phases, store in self.design_data, and persist to JSON DB.
         """
         try:
-            tree_placement = extract_json(extract_tree_placement(self.concept, self.attributes))
-            print("Extracted tree placement:", tree_placement)
-            PWR = extract_json(extract_plant_water_requirement(self.concept, self.attributes, tree_placement))
-            print("Extracted PWR:", PWR)
-
-            self.tree_data = {
-                "tree_placement": tree_placement["tree_placement"],
-                "PWR": PWR["pwr"],                
-            }
+            self.tree_data = collect_tree_data(self.concept, self.attributes, lambda message: self.report_progress(job, message))
             print("Tree data prepared for sending:", self.tree_data)
 
             # Send tree data to server with proper headers
@@ -620,7 +759,7 @@ class FlaskClientChatUI(QMainWindow):
             if tree_data_response.status_code == 200:
                 response_data = tree_data_response.json()
                 print("Server response:", response_data)
-                self.chat_display.append(f"""
+                self.post_message(f"""
                 <div style="margin: 10px 0;">
                     <div style="
                         background-color: #E8F5E9;
@@ -659,7 +798,7 @@ class FlaskClientChatUI(QMainWindow):
                 </div>
             </div>
             """
-            self.chat_display.append(error_html)
+            self.post_message(error_html)
             print(f"Error in tree_data: {e}")
 
     def create_networkx_graph(self, graph_json):
@@ -668,37 +807,23 @@ class FlaskClientChatUI(QMainWindow):
         """
         pass  # No longer used
 
-    def graph(self):
+    def graph(self, job=None):
+        """
+        Assemble the courtyard graph and send it to Grasshopper.
+        Returns the graph json so show_graph_window can open the editor on the GUI thread.
+        """
+        llm_output_json = None
         try:
-            llm_output = assemble_courtyard_graph(
-                self.design_data["spaces"],
-                self.design_data["external_functions"],
-                self.design_data["weights"],
-                self.design_data["anchors"],
-                self.design_data["positions"],
-                self.design_data["links"],
-                self.design_data["cardinal_directions"],
-                self.design_data["pos"]
-            )
-            llm_output_json = extract_json(llm_output)
+            self.report_progress(job, "Assembling courtyard graph...")
+            llm_output_json = build_graph(self.design_data)
             print("Initial graph layout:", llm_output_json)
-            
-            # Create and show the graph window using MainWindow from graph_gh.py
-            self.graph_window = MainWindow(graph_data=llm_output_json)
-            self.graph_window.show()
-            
+            self.report_progress(job, "Sending graph to Grasshopper...")
+
             # Send initial graph data to Grasshopper via server
-            headers = {
-                'Content-Type': 'application/json'
-            }
-            graph_response = requests.post(
-                "http://127.0.0.1:5000/graph_data",
-                json={"graph_data": llm_output_json},
-                headers=headers
-            )
+            graph_response = graph_sync.send(llm_output_json)
             
             if graph_response.status_code == 200:
-                self.chat_display.append(f"""
+                self.post_message(f"""
                 <div style="margin: 10px 0;">
                     <div style="
                         background-color: #E8F5E9;
@@ -737,8 +862,16 @@ class FlaskClientChatUI(QMainWindow):
                 </div>
             </div>
             """
-            self.chat_display.append(error_html)
+            self.post_message(error_html)
             print(f"Error generating graph: {e}")
+        return llm_output_json
+
+    def show_graph_window(self, graph_json):
+        if not graph_json:
+            return
+        # Create and show the graph window using MainWindow from graph_gh.py
+        self.graph_window = MainWindow(graph_data=graph_json)
+        self.graph_window.show()
 
     def get_graph_json(self):
         nodes = []
@@ -803,15 +936,8 @@ class FlaskClientChatUI(QMainWindow):
                 with open(edges_path, 'w') as f:
                     f.write(edges_csv)
                 
-                # Also save the current graph state to the server for Grasshopper
-                headers = {
-                    'Content-Type': 'application/json'
-                }
-                graph_response = requests.post(
-                    "http://127.0.0.1:5000/graph_data",
-                    json={"graph_data": current_graph_data},
-                    headers=headers
-                )
+                # Also save the current graph state to the server for Grasshopper, only the changes if it has an earlier one
+                graph_response = graph_sync.send(current_graph_data)
                 
                 if graph_response.status_code != 200:
                     raise Exception(f"Failed to update server with current graph state: {graph_response.status_code}")
@@ -864,23 +990,6 @@ class FlaskClientChatUI(QMainWindow):
             print(f"Error exporting graph to CSV: {e}")
 
 
-def extract_json(body):
-    # if body is json then return
-    if isinstance(body, dict):
-        return body  # Already a JSON object
-    json_response = None
-    match = re.search(r'\{.*\}', body, re.DOTALL)
-    if match:
-        try:
-            json_response = json.loads(match.group(0))
-        except Exception as e:
-            print(f"Failed to parse JSON: {e}")
-            print("body:", body)
-    else:
-        print("No JSON found in body.")
-        print("body:", body)
-    return json_response
-
 def export_graph_to_csv(graph_json, out_dir=None):
     """
     Exports two CSV files: nodes.csv and edges.csv from the given graph_json.
@@ -0,0 +1,87 @@
+from collections import deque
+
+# Undo/redo stack for the graph editor.
+# Commands record edits that have already been made: push() stores one, undo() and redo() call
+# its undo() and redo(), which only touch the items the edit changed. A command whose merge_key
+# equals the one of the command on top (the mouse moves of one drag) is merged into it, so a
+# drag is undone in one step. Every command reports an estimate of its size in bytes and the
+# oldest commands are dropped once the stack holds more than memory_budget.
+
+
+class Command:
+    """Base for undoable edits."""
+    text = ""
+    merge_key = None
+
+    def undo(self):
+        raise NotImplementedError
+
+    def redo(self):
+        raise NotImplementedError
+
+    def merge(self, other):
+        """Absorb other, the next command with the same merge_key; False to keep them separate."""
+        return False
+
+    def size(self):
+        return 200
+
+
+class CommandStack:
+    def __init__(self, memory_budget=4 * 1024 * 1024):
+        self.memory_budget = memory_budget
+        self.memory = 0
+        self._undo = deque()
+        self._redo = []
+
+    def __len__(self):
+        return len(self._undo)
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def push(self, command):
+        """Record a command whose edit is already applied; clears the redo side."""
+        for done in self._redo:
+            self.memory -= done.size()
+        self._redo.clear()
+        top = self._undo[-1] if self._undo else None
+        if top is not None and command.merge_key is not None and command.merge_key == top.merge_key:
+            before = top.size()
+            if top.merge(command):
+                self.memory += top.size() - before
+                self._trim()
+                return top
+        self._undo.append(command)
+        self.memory += command.size()
+        self._trim()
+        return command
+
+    def _trim(self):
+        # The newest command is kept even if it alone is over the budget
+        while self.memory > self.memory_budget and len(self._undo) > 1:
+            self.memory -= self._undo.popleft().size()
+
+    def undo(self):
+        if not self._undo:
+            return None
+        command = self._undo.pop()
+        command.undo()
+        self._redo.append(command)
+        return command
+
+    def redo(self):
+        if not self._redo:
+            return None
+        command = self._redo.pop()
+        command.redo()
+        self._undo.append(command)
+        return command
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self.memory = 0
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# Batched, disk-cached text embeddings.
+# Texts are normalized, looked up in a SQLite cache keyed by (backend, model, dimensions, text)
+# and only the missing ones are sent to the API, batch_size texts per client.embeddings.create call.
+# The backend is the client's base_url, so LM Studio, Cloudflare and OpenAI serving a model of the
+# same name never share vectors.
+# Vectors are stored as float32 blobs, so repeated questions and re-ingested documents are
+# embedded once.
+
+
+def normalize_text(text):
+    # Newlines hurt embedding quality and whitespace differences should not cause cache misses
+    return " ".join(text.split())
+
+
+def client_backend(client):
+    return str(getattr(client, "base_url", "") or "")
+
+
+def make_embedding_key(backend, model, dimensions, text):
+    payload = f"{backend}\x00{model}\x00{dimensions}\x00{text}"
+    return hashlib.sha256(payload.encode("utf8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dimensions INTEGER,
+                vector BLOB NOT NULL,
+                created REAL NOT NULL
+            )
+            """
+        )
+        self._db.commit()
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys that are cached."""
+        found = {}
+        with self._lock:
+            # SQLite limits the number of bound parameters, so look keys up in chunks
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def set_many(self, model, dimensions, items):
+        """Store an iterable of (key, vector) pairs."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector, created) VALUES (?, ?, ?, ?, ?)",
+                [(key, model, dimensions, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items],
+            )
+            self._db.commit()
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM embeddings")
+            self._db.commit()
+
+
+class EmbeddingService:
+    def __init__(self, client, model, dimensions=None, batch_size=96, cache=None):
+        self.client = client
+        self.backend = client_backend(client)
+        self.model = model
+        self.dimensions = dimensions
+        self.batch_size = max(1, batch_size)
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self.api_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _request(self, texts):
+        kwargs = {"input": texts, "model": self.model}
+        if self.dimensions is not None:
+            kwargs["dimensions"] = self.dimensions
+        start = time.perf_counter()
+        response = self.client.embeddings.create(**kwargs)
+        with self._stats_lock:
+            self.api_calls += 1
+            self.api_seconds += time.perf_counter() - start
+        # Results carry their input position, which is not guaranteed to match the response order
+        data = sorted(response.data, key=lambda item: getattr(item, "index", 0))
+        return [item.embedding for item in data]
+
+    def embed(self, texts):
+        """Return an (N, D) float32 array with one vector per text, in order."""
+        texts = [normalize_text(text) for text in texts]
+        keys = [make_embedding_key(self.backend, self.model, self.dimensions, text) for text in texts]
+        cached = self.cache.get_many(list(set(keys))) if self.cache is not None else {}
+
+        # Every distinct missing text is embedded once, even if it appears several times
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        hits = sum(1 for key in keys if key in cached)
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        fresh = {}
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start:start + self.batch_size]
+            vectors = self._request([missing[key] for key in batch_keys])
+            batch = dict(zip(batch_keys, (np.asarray(vector, dtype=np.float32) for vector in vectors)))
+            if self.cache is not None:
+                self.cache.set_many(self.model, self.dimensions, batch.items())
+            fresh.update(batch)
+
+        if not keys:
+            return np.zeros((0, self.dimensions or 0), dtype=np.float32)
+        return np.stack([cached[key] if key in cached else fresh[key] for key in keys])
+
+    def embed_one(self, text):
+        return self.embed([text])[0]
+
+    def stats(self):
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.backend,
+                "model": self.model,
+                "dimensions": self.dimensions,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "api_calls": self.api_calls,
+                "api_seconds": self.api_seconds,
+                "cached_vectors": self.cache.count() if self.cache is not None else 0,
+            }
+
+
+_services = {}
+_services_lock = threading.Lock()
+_caches = {}
+
+
+def get_embedding_service(client, model, dimensions=None, batch_size=96, cache_path=None):
+    """
+    Return the shared EmbeddingService for (client backend, model, dimensions); services using the
+    same cache_path share one cache.
+    """
+    with _services_lock:
+        key = (client_backend(client), model, dimensions)
+        if key not in _services:
+            cache = None
+            if cache_path:
+                if cache_path not in _caches:
+                    _caches[cache_path] = EmbeddingCache(cache_path)
+                cache = _caches[cache_path]
+            _services[key] = EmbeddingService(client, model, dimensions, batch_size, cache)
+        return _services[key]
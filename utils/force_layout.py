@@ -0,0 +1,133 @@
+import time
+import numpy as np
+
+# Force-directed layout for the courtyard graph, vectorized with NumPy.
+# Links are springs that pull their nodes to rest next to each other (the sum of their radii plus
+# a gap), every pair of nodes repels weakly and overlapping nodes are pushed apart by their
+# overlap, so node radii (from the weights) are respected. Fixed nodes (anchors and the N/E/S/W
+# markers) push and pull but never move, and centres are clamped to the bounds.
+# Repulsion is all pairs, computed in blocks of rows; step(budget) stops starting new blocks once
+# the time budget is used up, shrinking the blocks if one alone takes too long, and reuses the last
+# forces of the rows it did not reach. So an iteration takes about the budget however large the
+# graph is; large graphs need more iterations to settle, since cooling follows the rows refreshed.
+
+
+class ForceLayout:
+    def __init__(self, positions, radii, edges, fixed, bounds, spring=0.05, repulsion=0.01, collision=1.0,
+                 gap=10.0, temperature=40.0, cooling=0.985, min_temperature=0.5, pair_budget=50000, seed=0):
+        """
+        positions: (N, 2) node centres, radii: (N,), edges: (E, 2) node indices, fixed: (N,) bools,
+        bounds: (x_min, x_max, y_min, y_max) for the centres. temperature caps how far a node moves
+        per iteration and decays by cooling until it drops below min_temperature.
+        """
+        self.positions = np.array(positions, dtype=np.float64).reshape(-1, 2)
+        self.radii = np.asarray(radii, dtype=np.float64)
+        self.edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        self.fixed = np.asarray(fixed, dtype=bool)
+        self.bounds = bounds
+        self.spring = spring
+        self.collision = collision
+        self.gap = gap
+        self.temperature = temperature
+        self.cooling = cooling
+        self.min_temperature = min_temperature
+        self.iterations = 0
+
+        count = len(self.positions)
+        x_min, x_max, y_min, y_max = bounds
+        # Fruchterman-Reingold scale: the spacing nodes would have if they filled the area evenly
+        self.repulsion = repulsion * (x_max - x_min) * (y_max - y_min) / max(1, count)
+        self.block_size = max(1, pair_budget // max(1, count))
+        self._repulsion_forces = np.zeros_like(self.positions)
+        self._next_row = 0
+        self._block_seconds = 0.0
+        self._rest_seconds = 0.0
+
+        # Nodes on the same spot have no direction to separate in
+        rng = np.random.default_rng(seed)
+        movable = ~self.fixed
+        self.positions[movable] += rng.uniform(-0.5, 0.5, size=(int(movable.sum()), 2))
+        self.clamp()
+
+    @property
+    def settled(self):
+        return self.temperature < self.min_temperature
+
+    def clamp(self):
+        x_min, x_max, y_min, y_max = self.bounds
+        np.clip(self.positions[:, 0], x_min, x_max, out=self.positions[:, 0])
+        np.clip(self.positions[:, 1], y_min, y_max, out=self.positions[:, 1])
+
+    def _repulsion_block(self, start, stop):
+        rows = np.arange(start, stop)
+        delta = self.positions[start:stop, None, :] - self.positions[None, :, :]
+        dist2 = np.einsum("ijk,ijk->ij", delta, delta)
+        dist2[rows - start, rows] = np.inf
+        np.maximum(dist2, 1e-6, out=dist2)
+        dist = np.sqrt(dist2)
+        overlap = np.maximum(self.radii[start:stop, None] + self.radii[None, :] + self.gap - dist, 0.0)
+        # repulsion / d along the unit vector, plus the overlap for nodes that are too close
+        scale = self.repulsion / dist2 + self.collision * overlap / dist
+        return np.einsum("ijk,ij->ik", delta, scale)
+
+    def _spring_forces(self):
+        forces = np.zeros_like(self.positions)
+        if not len(self.edges):
+            return forces
+        a, b = self.edges[:, 0], self.edges[:, 1]
+        delta = self.positions[b] - self.positions[a]
+        dist = np.maximum(np.sqrt(np.einsum("ij,ij->i", delta, delta)), 1e-6)
+        rest = self.radii[a] + self.radii[b] + self.gap
+        pull = (self.spring * (dist - rest) / dist)[:, None] * delta
+        count = len(self.positions)
+        # bincount sums the pulls per node much faster than np.add.at
+        for axis in (0, 1):
+            forces[:, axis] = np.bincount(a, pull[:, axis], count) - np.bincount(b, pull[:, axis], count)
+        return forces
+
+    def step(self, budget=None):
+        """
+        Run one iteration and return the largest distance a node moved. With budget (seconds),
+        repulsion rows are refreshed only while there is time for another block.
+        """
+        start = time.perf_counter()
+        count = len(self.positions)
+        refreshed = 0
+        while refreshed < count:
+            block_start = time.perf_counter()
+            stop = min(count, self._next_row + self.block_size)
+            self._repulsion_forces[self._next_row:stop] = self._repulsion_block(self._next_row, stop)
+            refreshed += stop - self._next_row
+            self._next_row = stop % count
+            self._block_seconds = time.perf_counter() - block_start
+            if budget is None:
+                continue
+            if self._block_seconds > budget / 4:
+                # Smaller blocks, so even a single one fits in the budget next time
+                self.block_size = max(1, int(self.block_size * budget / 4 / self._block_seconds))
+            # Leave time for another block and for the springs and the move, as long as they took last time
+            if time.perf_counter() - start + self._block_seconds + self._rest_seconds > budget:
+                break
+
+        rest_start = time.perf_counter()
+        forces = self._repulsion_forces + self._spring_forces()
+        forces[self.fixed] = 0.0
+        length = np.sqrt(np.einsum("ij,ij->i", forces, forces))
+        # Move along the force, but never further than the temperature
+        factor = np.minimum(length, self.temperature) / np.maximum(length, 1e-9)
+        before = self.positions.copy()
+        self.positions += forces * factor[:, None]
+        self.clamp()
+        # Cool per full pass over the rows, so partial iterations on large graphs do not freeze the layout early
+        self.temperature *= self.cooling ** (refreshed / max(1, count))
+        self.iterations += 1
+        moved = self.positions - before
+        self._rest_seconds = time.perf_counter() - rest_start
+        return float(np.sqrt(np.einsum("ij,ij->i", moved, moved)).max()) if count else 0.0
+
+    def overlaps(self):
+        """Number of node pairs whose circles overlap, for checking a layout."""
+        delta = self.positions[:, None, :] - self.positions[None, :, :]
+        dist = np.sqrt(np.einsum("ijk,ijk->ij", delta, delta))
+        reach = self.radii[:, None] + self.radii[None, :]
+        return int((np.triu(dist < reach, k=1)).sum())
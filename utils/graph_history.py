@@ -0,0 +1,81 @@
+import copy
+
+# Version history of a courtyard graph ({"nodes": [...], "links": [...], ...}) as a base snapshot
+# plus one delta per saved version, so memory grows with the edits instead of the graph size.
+# A delta maps each node id and link key that changed to its (before, after) value, None when it
+# did not exist, so it can be applied in both directions. The history keeps one materialized
+# version (nodes and links) and checkout() walks the deltas from there to another version,
+# returning the ids and keys that changed on the way so a view only has to update those.
+
+
+def link_key(link):
+    """Links are undirected: the same key for source -> target and target -> source."""
+    return frozenset((link["source"], link["target"]))
+
+
+class GraphHistory:
+    def __init__(self, graph_data):
+        # Everything besides nodes and links ("directed", "graph", ...) is kept from the base version
+        self.extra = {key: copy.deepcopy(value) for key, value in graph_data.items() if key not in ("nodes", "links")}
+        self.nodes = {node["id"]: copy.deepcopy(node) for node in graph_data["nodes"]}
+        self.links = {link_key(link): dict(link) for link in graph_data["links"]}
+        # deltas[i] turns version i into version i + 1
+        self.deltas = []
+        self.position = 0
+
+    def __len__(self):
+        return len(self.deltas) + 1
+
+    def append(self, graph_data):
+        """Store graph_data as a new last version and return its index."""
+        self.checkout(len(self) - 1)
+        nodes = {node["id"]: node for node in graph_data["nodes"]}
+        links = {link_key(link): link for link in graph_data["links"]}
+        delta = {"nodes": {}, "links": {}}
+        for nid in self.nodes.keys() | nodes.keys():
+            before, after = self.nodes.get(nid), nodes.get(nid)
+            if before != after:
+                delta["nodes"][nid] = (before, copy.deepcopy(after))
+        for key in self.links.keys() | links.keys():
+            before, after = self.links.get(key), links.get(key)
+            if before != after:
+                delta["links"][key] = (before, None if after is None else dict(after))
+        self.deltas.append(delta)
+        self._apply(delta, forward=True)
+        self.position = len(self) - 1
+        return self.position
+
+    def _apply(self, delta, forward):
+        for target, changes in ((self.nodes, delta["nodes"]), (self.links, delta["links"])):
+            for key, (before, after) in changes.items():
+                value = after if forward else before
+                if value is None:
+                    target.pop(key, None)
+                else:
+                    target[key] = value
+
+    def checkout(self, index):
+        """Make version index the materialized one; returns the node ids and link keys that changed."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"No version {index}, the history has {len(self)}")
+        node_ids, link_keys = set(), set()
+        while self.position != index:
+            if index > self.position:
+                delta = self.deltas[self.position]
+                self._apply(delta, forward=True)
+                self.position += 1
+            else:
+                self.position -= 1
+                delta = self.deltas[self.position]
+                self._apply(delta, forward=False)
+            node_ids.update(delta["nodes"])
+            link_keys.update(delta["links"])
+        return node_ids, link_keys
+
+    def version(self, index):
+        """A full copy of version index, shaped like the graph it was saved from."""
+        self.checkout(index)
+        data = copy.deepcopy(self.extra)
+        data["nodes"] = copy.deepcopy(list(self.nodes.values()))
+        data["links"] = [dict(link) for link in self.links.values()]
+        return data
@@ -0,0 +1,48 @@
+import copy
+import threading
+import requests
+from utils.json_patch import make_patch
+
+# Keeps gh_server's /graph_data in sync with the editor by sending deltas.
+# The first graph is POSTed in full; after that only a JSON Patch against the last version this
+# client sent goes out, so moving a few nodes sends a few replace operations. If the server has
+# a different version by then (another client posted, the server restarted), the patch is
+# rejected and the full graph is sent instead.
+
+
+class GraphSync:
+    def __init__(self, url="http://127.0.0.1:5000/graph_data"):
+        self.url = url
+        self.base = None
+        self.etag = None
+        self._lock = threading.Lock()
+
+    def send(self, graph):
+        """Send graph to the server and return the HTTP response of the request that stored it."""
+        with self._lock:
+            if self.base is not None:
+                patch = make_patch(self.base, graph)
+                response = requests.patch(self.url, json=patch, headers={"If-Match": f'"{self.etag}"'})
+                if response.status_code == 200:
+                    self._stored(graph, response)
+                    return response
+                print(f"Graph patch rejected ({response.status_code}), sending the full graph")
+
+            response = requests.post(self.url, json={"graph_data": graph}, headers={"Content-Type": "application/json"})
+            if response.status_code == 200:
+                self._stored(graph, response)
+            return response
+
+    def _stored(self, graph, response):
+        self.etag = response.json().get("etag")
+        # Older servers do not report versions; keep sending full graphs to them
+        self.base = copy.deepcopy(graph) if self.etag else None
+
+    def reset(self):
+        with self._lock:
+            self.base = None
+            self.etag = None
+
+
+# Shared by the chat window and the graph editor, so they patch against the same base
+graph_sync = GraphSync()
@@ -0,0 +1,165 @@
+import copy
+
+# JSON Patch (RFC 6902): apply_patch applies a list of operations to a document and make_patch
+# computes the operations that turn one document into another. make_patch compares lists
+# position by position, which suits graph_data where nodes and links keep their order:
+# moving a node becomes a replace of its "pos" values instead of a new copy of the graph.
+
+
+class JsonPatchError(Exception):
+    pass
+
+
+def escape_token(token):
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def parse_pointer(pointer):
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _index(container, token, pointer, allow_end=False):
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise JsonPatchError(f"Invalid array index {token!r} in {pointer!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"Array index {index} out of range in {pointer!r}")
+    return index
+
+
+def _resolve(doc, tokens, pointer):
+    for token in tokens:
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise JsonPatchError(f"Path {pointer!r} does not exist")
+            doc = doc[token]
+        elif isinstance(doc, list):
+            doc = doc[_index(doc, token, pointer)]
+        else:
+            raise JsonPatchError(f"Path {pointer!r} does not exist")
+    return doc
+
+
+def _get(doc, pointer):
+    return _resolve(doc, parse_pointer(pointer), pointer)
+
+
+def _add(doc, pointer, value):
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        return value
+    parent = _resolve(doc, tokens[:-1], pointer)
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, tokens[-1], pointer, allow_end=True), value)
+    else:
+        raise JsonPatchError(f"Cannot add to {pointer!r}")
+    return doc
+
+
+def _remove(doc, pointer):
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        raise JsonPatchError("Cannot remove the whole document")
+    parent = _resolve(doc, tokens[:-1], pointer)
+    if isinstance(parent, dict):
+        if tokens[-1] not in parent:
+            raise JsonPatchError(f"Path {pointer!r} does not exist")
+        return parent.pop(tokens[-1])
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, tokens[-1], pointer))
+    raise JsonPatchError(f"Cannot remove {pointer!r}")
+
+
+def apply_patch(doc, patch):
+    """Return a patched copy of doc; doc itself is left untouched. Raises JsonPatchError."""
+    if not isinstance(patch, list):
+        raise JsonPatchError("A patch must be a list of operations")
+    doc = copy.deepcopy(doc)
+    for operation in patch:
+        if not isinstance(operation, dict) or "op" not in operation or "path" not in operation:
+            raise JsonPatchError(f"Invalid operation {operation!r}")
+        op, path = operation["op"], operation["path"]
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"Operation {op!r} needs a value")
+        if op == "add":
+            doc = _add(doc, path, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            _remove(doc, path)
+        elif op == "replace":
+            if parse_pointer(path):
+                _get(doc, path)
+                _remove(doc, path)
+            doc = _add(doc, path, copy.deepcopy(operation["value"]))
+        elif op in ("move", "copy"):
+            source = operation.get("from")
+            if source is None:
+                raise JsonPatchError(f"Operation {op!r} needs a from path")
+            if op == "move" and (path + "/").startswith(source + "/") and path != source:
+                raise JsonPatchError(f"Cannot move {source!r} into itself")
+            value = copy.deepcopy(_get(doc, source))
+            if op == "move":
+                _remove(doc, source)
+            doc = _add(doc, path, value)
+        elif op == "test":
+            if not _equal(_get(doc, path), operation["value"]):
+                raise JsonPatchError(f"Test failed at {path!r}")
+        else:
+            raise JsonPatchError(f"Unknown operation {op!r}")
+    return doc
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _equal(a, b):
+    # Like ==, except that True and 1 are different JSON values
+    if _is_number(a) and _is_number(b):
+        return a == b
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_equal(a[key], b[key]) for key in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def make_patch(old, new, path=""):
+    """The operations that turn old into new."""
+    if type(old) is not type(new):
+        return [{"op": "replace", "path": path, "value": new}]
+    if isinstance(old, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{escape_token(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{escape_token(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(make_patch(old[key], value, child))
+        return ops
+    if isinstance(old, list):
+        ops = []
+        common = min(len(old), len(new))
+        for i in range(common):
+            ops.extend(make_patch(old[i], new[i], f"{path}/{i}"))
+        for i in range(common, len(new)):
+            ops.append({"op": "add", "path": f"{path}/{i}", "value": new[i]})
+        # Remove from the end, so the remaining indices stay valid
+        for i in range(len(old) - 1, common - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{i}"})
+        return ops
+    if old != new:
+        return [{"op": "replace", "path": path, "value": new}]
+    return []
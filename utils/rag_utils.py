@@ -1,34 +1,26 @@
-import numpy as np
-import json
+from concurrent.futures import ThreadPoolExecutor
 from server.config import *
+from utils.embedding_service import get_embedding_service
+from utils.vector_index import get_vector_index
 
 # This script is only used as a RAG tool for other scripts.
 
-def get_embedding(text, model=embedding_model):
-    text = text.replace("\n", " ")
-    if mode == "openai":
-        response = client.embeddings.create(input = [text], dimensions = 768, model=model)
-    else:
-        response = client.embeddings.create(input = [text], model=model)
-    vector = response.data[0].embedding
-    return vector
-
-def similarity(v1, v2):
-    return np.dot(v1, v2)
+def embedding_service(model=embedding_model):
+    # Only the OpenAI embedding models accept a dimensions parameter
+    return get_embedding_service(
+        client,
+        model,
+        dimensions=embedding_dimensions if mode == "openai" else None,
+        batch_size=embedding_batch_size,
+        cache_path=embedding_cache_path if embedding_cache_enabled else None,
+    )
 
-def load_embeddings(embeddings):
-    with open(embeddings, 'r', encoding='utf8') as infile:
-        return json.load(infile)
-    
-def get_vectors(question_vector, index_lib, n_results):
-    scores = []
-    for vector in index_lib:
-        score = similarity(question_vector, vector['vector'])
-        scores.append({'content': vector['content'], 'score': score})
+def get_embedding(text, model=embedding_model):
+    return embedding_service(model).embed_one(text)
 
-    scores.sort(key=lambda x: x['score'], reverse=True)
-    best_vectors = scores[0:n_results]
-    return best_vectors
+def get_embeddings(texts, model=embedding_model):
+    # Batched and cached; returns an (N, D) float32 array in the order of texts
+    return embedding_service(model).embed(texts)
 
 def rag_answer(question, prompt, model=completion_model):
     completion = client.chat.completions.create(
@@ -51,19 +43,15 @@ def rag_call(question, embeddings, n_results):
     # Embed our question
     question_vector = get_embedding(question)
 
-    # Load the knowledge embeddings
-    index_lib = load_embeddings(embeddings)
+    # Load the precompiled index of the knowledge embeddings (built on first use)
+    index = get_vector_index(embeddings)
 
     # Retrieve the best vectors
-    scored_vectors = get_vectors(question_vector, index_lib, n_results)
-    scored_contents = [vector['content'] for vector in scored_vectors]
-    rag_result = "\n".join(scored_contents)
+    _, _, contents = index.search_batch(question_vector, n_results)
+    rag_result = "\n".join(contents[0])
 
     # Get answer from vector informed query
-    prompt = f"""Answer the question based on the provided information. 
-                You are given the extracted parts of a long document and a question. Provide a direct answer.
-                If you don't know the answer, just say "I do not know." Don't make up an answer.
-                PROVIDED INFORMATION: """ + rag_result
+    prompt = rag_prompt(rag_result)
     
     # prompt = f"""Make a summary of the provided information. 
     #             You are given the extracted parts of a long document. 
@@ -72,3 +60,25 @@ def rag_call(question, embeddings, n_results):
 
     answer = rag_answer(question, prompt)
     return answer
+
+def rag_prompt(rag_result):
+    return f"""Answer the question based on the provided information. 
+                You are given the extracted parts of a long document and a question. Provide a direct answer.
+                If you don't know the answer, just say "I do not know." Don't make up an answer.
+                PROVIDED INFORMATION: """ + rag_result
+
+def rag_call_multi(questions, embeddings, n_results, max_workers=4):
+    """
+    Answer several questions, e.g. create_question variants, against the same knowledge file.
+    Retrieval for all questions is one batched search; the answers are requested in parallel.
+    Returns the answers in the order of the questions.
+    """
+    print(f"Initiating RAG for {len(questions)} questions...")
+    question_vectors = get_embeddings(questions)
+
+    index = get_vector_index(embeddings)
+    _, _, contents = index.search_batch(question_vectors, n_results)
+    prompts = [rag_prompt("\n".join(question_contents)) for question_contents in contents]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(rag_answer, questions, prompts))
@@ -0,0 +1,84 @@
+import threading
+import time
+
+# Client-side rate limiting for the model provider.
+# A TokenBucket holds up to `capacity` units and refills at per_minute / 60 units per second;
+# take() blocks until enough units are there. RateLimiter combines one bucket for requests and
+# one for tokens, sized to the provider's requests-per-minute and tokens-per-minute limits, so
+# concurrent callers slow down before the provider starts answering 429. The tokens of a call are
+# only known afterwards, so each call takes an estimate up front and settle() charges or refunds
+# the difference once the response reports its usage.
+
+
+def estimate_tokens(messages, completion_tokens):
+    """Rough token count of a chat request: prompt characters / 4 plus the expected completion."""
+    characters = sum(len(str(message.get("content", ""))) for message in messages or [])
+    return characters // 4 + completion_tokens
+
+
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, amount=1):
+        """Wait until amount units are available, take them and return the seconds waited."""
+        start = time.monotonic()
+        # A single call larger than the bucket only has to wait for a full bucket, then goes into debt
+        needed = min(amount, self.capacity)
+        with self._cond:
+            while True:
+                self._refill()
+                if self.level >= needed:
+                    self.level -= amount
+                    return time.monotonic() - start
+                self._cond.wait((needed - self.level) / self.rate)
+
+    def adjust(self, amount):
+        """Take amount more units without waiting, or give them back if it is negative."""
+        with self._cond:
+            self._refill()
+            self.level = min(self.capacity, self.level - amount)
+            self._cond.notify_all()
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, burst_seconds=10):
+        # Providers enforce their limits over windows shorter than a minute, so only allow a burst of burst_seconds
+        self.requests = TokenBucket(requests_per_minute, max(1, requests_per_minute * burst_seconds / 60)) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, max(1, tokens_per_minute * burst_seconds / 60)) if tokens_per_minute else None
+        self.calls = 0
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, estimated_tokens=0):
+        """Block until a request with estimated_tokens fits in both limits."""
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.take(1)
+        if self.tokens is not None and estimated_tokens:
+            waited += self.tokens.take(estimated_tokens)
+        with self._lock:
+            self.calls += 1
+            if waited > 0.001:
+                self.waits += 1
+                self.waited_seconds += waited
+        return waited
+
+    def settle(self, estimated_tokens, used_tokens):
+        """Correct the token bucket once the actual usage of a request is known."""
+        if self.tokens is not None and used_tokens is not None:
+            self.tokens.adjust(used_tokens - estimated_tokens)
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "waits": self.waits, "waited_seconds": round(self.waited_seconds, 2)}
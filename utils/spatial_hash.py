@@ -0,0 +1,80 @@
+import math
+
+# Uniform-grid spatial hash of circles, for collision checks in the graph editor.
+# Each item is filed under the cell of its centre. near() looks at the cells within reach of a
+# query circle (its radius plus the largest radius in the index) and returns the items whose
+# circles overlap it, so a check costs the items nearby instead of every item in the scene.
+# Items can be any hashable object, the graph editor uses its NodeItems.
+
+
+class SpatialHash:
+    def __init__(self, cell_size=100):
+        self.cell_size = cell_size
+        self.max_radius = 0
+        self._cells = {}
+        self._items = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def insert(self, item, x, y, radius):
+        """Add item, or update it if it is already in the index."""
+        cell = self._cell(x, y)
+        previous = self._items.get(item)
+        if previous is not None and previous[3] != cell:
+            self._discard(item, previous[3])
+        self._items[item] = (x, y, radius, cell)
+        self._cells.setdefault(cell, set()).add(item)
+        # Never shrinks; a stale maximum only makes queries look a little further than needed
+        self.max_radius = max(self.max_radius, radius)
+
+    move = insert
+
+    def remove(self, item):
+        previous = self._items.pop(item, None)
+        if previous is not None:
+            self._discard(item, previous[3])
+
+    def _discard(self, item, cell):
+        items = self._cells.get(cell)
+        if items is not None:
+            items.discard(item)
+            if not items:
+                del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._items.clear()
+        self.max_radius = 0
+
+    def candidates(self, x, y, radius):
+        """Items in every cell that can hold a circle overlapping (x, y, radius); may include non-overlapping ones."""
+        reach = radius + self.max_radius
+        min_i, min_j = self._cell(x - reach, y - reach)
+        max_i, max_j = self._cell(x + reach, y + reach)
+        found = []
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                items = self._cells.get((i, j))
+                if items:
+                    found.extend(items)
+        return found
+
+    def near(self, x, y, radius, exclude=None):
+        """Items whose circles overlap the circle (x, y, radius), except exclude."""
+        found = []
+        for item in self.candidates(x, y, radius):
+            if item is exclude:
+                continue
+            item_x, item_y, item_radius, _ = self._items[item]
+            reach = radius + item_radius
+            dx, dy = x - item_x, y - item_y
+            if dx * dx + dy * dy < reach * reach:
+                found.append(item)
+        return found
@@ -0,0 +1,87 @@
+from utils.command_stack import Command, CommandStack
+
+
+class Move(Command):
+    """Moves one value in a shared dict by step; moves of one gesture merge."""
+
+    def __init__(self, doc, key, step, gesture=None, size=100):
+        self.doc, self.key, self.step = doc, key, step
+        self.merge_key = gesture
+        self._size = size
+        doc[key] = doc.get(key, 0) + step
+
+    def undo(self):
+        self.doc[self.key] -= self.step
+
+    def redo(self):
+        self.doc[self.key] += self.step
+
+    def merge(self, other):
+        if other.key != self.key:
+            return False
+        self.step += other.step
+        self._size += other._size
+        return True
+
+    def size(self):
+        return self._size
+
+
+def test_undo_and_redo():
+    doc, stack = {}, CommandStack()
+    stack.push(Move(doc, "a", 1))
+    stack.push(Move(doc, "b", 2))
+    assert stack.undo().key == "b" and doc == {"a": 1, "b": 0}
+    assert stack.undo().key == "a" and doc == {"a": 0, "b": 0}
+    assert stack.undo() is None
+    stack.redo()
+    assert doc == {"a": 1, "b": 0}
+    assert stack.can_undo() and stack.can_redo()
+
+
+def test_push_clears_redo():
+    doc, stack = {}, CommandStack()
+    stack.push(Move(doc, "a", 1))
+    stack.undo()
+    stack.push(Move(doc, "b", 1))
+    assert not stack.can_redo() and stack.redo() is None
+    assert stack.memory == 100
+
+
+def test_moves_of_one_gesture_merge():
+    doc, stack = {}, CommandStack()
+    gesture = object()
+    first = stack.push(Move(doc, "a", 1, gesture))
+    for _ in range(9):
+        assert stack.push(Move(doc, "a", 1, gesture)) is first
+    stack.push(Move(doc, "a", 1, object()))
+    assert len(stack) == 2 and stack.memory == 1100
+    stack.undo()
+    stack.undo()
+    assert doc == {"a": 0}
+
+
+def test_merge_can_refuse():
+    doc, stack = {}, CommandStack()
+    gesture = object()
+    stack.push(Move(doc, "a", 1, gesture))
+    stack.push(Move(doc, "b", 1, gesture))
+    assert len(stack) == 2
+
+
+def test_oldest_commands_are_dropped_over_budget():
+    doc, stack = {}, CommandStack(memory_budget=250)
+    for key in "abc":
+        stack.push(Move(doc, key, 1))
+    assert len(stack) == 2 and stack.memory == 200
+    stack.undo()
+    stack.undo()
+    assert stack.undo() is None and doc == {"a": 1, "b": 0, "c": 0}
+
+
+def test_newest_command_is_kept_over_budget():
+    doc, stack = {}, CommandStack(memory_budget=50)
+    stack.push(Move(doc, "a", 1))
+    assert len(stack) == 1
+    stack.clear()
+    assert len(stack) == 0 and stack.memory == 0
@@ -0,0 +1,81 @@
+import copy
+import random
+
+import pytest
+
+from utils.graph_history import GraphHistory, link_key
+
+
+def graph(nodes, links, **extra):
+    return dict(extra, nodes=nodes, links=links)
+
+
+def versions():
+    rng = random.Random(0)
+    data = graph([{"id": i, "pos": [i, 0]} for i in range(5)], [{"source": 0, "target": 1}], directed=False)
+    saved = [copy.deepcopy(data)]
+    for _ in range(20):
+        choice = rng.random()
+        if choice < 0.5:
+            node = rng.choice(data["nodes"])
+            node["pos"] = [rng.randint(-50, 50), rng.randint(-50, 50)]
+        elif choice < 0.7:
+            data["nodes"].append({"id": len(saved) + 100, "pos": [0, 0]})
+        elif choice < 0.85 and data["links"]:
+            data["links"].pop(rng.randrange(len(data["links"])))
+        else:
+            a, b = rng.sample([node["id"] for node in data["nodes"]], 2)
+            data["links"].append({"source": a, "target": b})
+        saved.append(copy.deepcopy(data))
+    return saved
+
+
+def canonical(data):
+    return (
+        sorted((node["id"], repr(node)) for node in data["nodes"]),
+        sorted(sorted(link.items()) for link in data["links"]),
+        {key: value for key, value in data.items() if key not in ("nodes", "links")},
+    )
+
+
+def test_every_version_comes_back():
+    saved = versions()
+    history = GraphHistory(saved[0])
+    for data in saved[1:]:
+        history.append(data)
+    assert len(history) == len(saved)
+    for index in [5, 0, len(saved) - 1, 3, 17, 3]:
+        assert canonical(history.version(index)) == canonical(saved[index])
+
+
+def test_checkout_reports_what_changed():
+    base = graph([{"id": "a", "pos": [0, 0]}, {"id": "b", "pos": [1, 1]}], [{"source": "a", "target": "b"}])
+    history = GraphHistory(base)
+    history.append(graph([{"id": "a", "pos": [5, 0]}, {"id": "b", "pos": [1, 1]}], [{"source": "a", "target": "b"}]))
+    history.append(graph([{"id": "a", "pos": [5, 0]}, {"id": "b", "pos": [1, 1]}, {"id": "c"}], []))
+    assert history.checkout(2) == (set(), set())
+    assert history.checkout(0) == ({"a", "c"}, {link_key({"source": "a", "target": "b"})})
+    assert history.nodes["a"]["pos"] == [0, 0] and "c" not in history.nodes
+    assert history.checkout(1) == ({"a"}, set())
+
+
+def test_links_are_undirected():
+    assert link_key({"source": "a", "target": "b"}) == link_key({"source": "b", "target": "a"})
+    history = GraphHistory(graph([{"id": "a"}, {"id": "b"}], [{"source": "a", "target": "b"}]))
+    history.append(graph([{"id": "a"}, {"id": "b"}], [{"source": "a", "target": "b"}]))
+    assert history.deltas[-1] == {"nodes": {}, "links": {}}
+
+
+def test_versions_are_copies():
+    base = graph([{"id": "a", "pos": [0, 0]}], [])
+    history = GraphHistory(base)
+    base["nodes"][0]["pos"][0] = 9
+    version = history.version(0)
+    version["nodes"][0]["pos"][0] = 7
+    assert history.version(0)["nodes"][0]["pos"] == [0, 0]
+
+
+def test_checkout_out_of_range():
+    history = GraphHistory(graph([], []))
+    with pytest.raises(IndexError):
+        history.checkout(1)
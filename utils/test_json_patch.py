@@ -0,0 +1,71 @@
+import pytest
+
+from utils.json_patch import JsonPatchError, apply_patch, make_patch
+
+
+GRAPH = {
+    "nodes": [{"id": "play", "pos": {"x": 1, "y": 2}}, {"id": "a/b~c", "weight": 3}],
+    "links": [{"source": "play", "target": "a/b~c"}],
+}
+
+
+def test_apply_leaves_the_document_untouched():
+    patched = apply_patch(GRAPH, [{"op": "replace", "path": "/nodes/0/pos/x", "value": 5}])
+    assert patched["nodes"][0]["pos"] == {"x": 5, "y": 2}
+    assert GRAPH["nodes"][0]["pos"] == {"x": 1, "y": 2}
+
+
+def test_operations():
+    doc = {"list": [1, 2], "a": {"b": 1}}
+    patch = [
+        {"op": "add", "path": "/list/-", "value": 3},
+        {"op": "add", "path": "/list/0", "value": 0},
+        {"op": "remove", "path": "/list/1"},
+        {"op": "move", "from": "/a/b", "path": "/c"},
+        {"op": "copy", "from": "/c", "path": "/a/d"},
+        {"op": "test", "path": "/c", "value": 1},
+    ]
+    assert apply_patch(doc, patch) == {"list": [0, 2, 3], "a": {"d": 1}, "c": 1}
+
+
+def test_replace_whole_document():
+    assert apply_patch({"a": 1}, [{"op": "replace", "path": "", "value": [1]}]) == [1]
+
+
+@pytest.mark.parametrize("patch", [
+    {"op": "add", "path": "/a", "value": 1},
+    [{"op": "replace", "path": "/missing", "value": 1}],
+    [{"op": "remove", "path": "/list/5"}],
+    [{"op": "add", "path": "/list/01", "value": 1}],
+    [{"op": "add", "path": "list", "value": 1}],
+    [{"op": "add", "path": "/a"}],
+    [{"op": "move", "from": "/a", "path": "/a/b"}],
+    [{"op": "test", "path": "/flag", "value": 1}],
+    [{"op": "frobnicate", "path": "/a"}],
+])
+def test_invalid_patches_raise(patch):
+    with pytest.raises(JsonPatchError):
+        apply_patch({"a": {}, "list": [1], "flag": True}, patch)
+
+
+def test_failed_patch_changes_nothing():
+    doc = {"a": 1}
+    with pytest.raises(JsonPatchError):
+        apply_patch(doc, [{"op": "replace", "path": "/a", "value": 2}, {"op": "remove", "path": "/b"}])
+    assert doc == {"a": 1}
+
+
+@pytest.mark.parametrize("new", [
+    {"nodes": [{"id": "play", "pos": {"x": 4, "y": 2}}, {"id": "a/b~c", "weight": 3}], "links": []},
+    {"nodes": [{"id": "play", "pos": {"x": 1, "y": 2}}], "links": [{"source": "play", "target": "play"}]},
+    {"nodes": GRAPH["nodes"] + [{"id": "pond"}], "links": GRAPH["links"], "directed": False},
+    {"nodes": [], "links": None},
+])
+def test_make_patch_round_trip(new):
+    assert apply_patch(GRAPH, make_patch(GRAPH, new)) == new
+
+
+def test_moving_a_node_patches_only_its_position():
+    moved = apply_patch(GRAPH, [{"op": "replace", "path": "/nodes/0/pos/x", "value": 9}])
+    assert make_patch(GRAPH, moved) == [{"op": "replace", "path": "/nodes/0/pos/x", "value": 9}]
+    assert make_patch(GRAPH, GRAPH) == []
@@ -0,0 +1,28 @@
+from utils.llm_cache import ResponseCache, make_cache_key
+
+
+MESSAGES = [{"role": "user", "content": "Extract the spaces"}]
+
+
+def test_key_depends_on_backend_and_base_url():
+    key = make_cache_key("openai", "https://api.openai.com/v1/", "gpt-4o", MESSAGES)
+    assert key == make_cache_key("openai", "https://api.openai.com/v1/", "gpt-4o", MESSAGES)
+    assert key != make_cache_key("fake", "http://127.0.0.1:1235/v1/", "gpt-4o", MESSAGES)
+    assert key != make_cache_key("openai", "http://127.0.0.1:1235/v1/", "gpt-4o", MESSAGES)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=10)
+    cache.set("a", "aaaa")
+    cache.set("b", "bbbb")
+    assert cache.get("a") == "aaaa"
+    cache.set("c", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cccc"
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttl=-1)
+    cache.set("a", "aaaa")
+    assert cache.get("a", "extract_spaces") is None
+    assert cache.stats()["by_function"]["extract_spaces"] == {"hits": 0, "misses": 1}
@@ -0,0 +1,56 @@
+import random
+
+from utils.spatial_hash import SpatialHash
+
+
+def overlapping(circles, x, y, radius, exclude=None):
+    return {
+        item for item, (item_x, item_y, item_radius) in circles.items()
+        if item != exclude and (x - item_x) ** 2 + (y - item_y) ** 2 < (radius + item_radius) ** 2
+    }
+
+
+def test_near_matches_a_full_scan():
+    rng = random.Random(0)
+    index = SpatialHash(cell_size=50)
+    circles = {}
+    for item in range(300):
+        circles[item] = (rng.uniform(-500, 500), rng.uniform(-500, 500), rng.uniform(5, 80))
+        index.insert(item, *circles[item])
+    # Moving items across cells keeps the index consistent
+    for item in range(0, 300, 3):
+        circles[item] = (rng.uniform(-500, 500), rng.uniform(-500, 500), circles[item][2])
+        index.move(item, *circles[item])
+    for item in range(0, 300, 7):
+        index.remove(item)
+        del circles[item]
+    assert len(index) == len(circles)
+    for _ in range(200):
+        x, y, radius = rng.uniform(-600, 600), rng.uniform(-600, 600), rng.uniform(1, 100)
+        assert set(index.near(x, y, radius)) == overlapping(circles, x, y, radius)
+
+
+def test_near_excludes_the_item_itself():
+    index = SpatialHash()
+    index.insert("a", 0, 0, 30)
+    index.insert("b", 40, 0, 30)
+    assert index.near(0, 0, 30, exclude="a") == ["b"]
+    index.move("b", 400, 0, 30)
+    assert index.near(0, 0, 30, exclude="a") == []
+
+
+def test_touching_circles_do_not_overlap():
+    index = SpatialHash()
+    index.insert("a", 60, 0, 30)
+    assert index.near(0, 0, 30) == []
+
+
+def test_remove_and_clear():
+    index = SpatialHash()
+    index.insert("a", 0, 0, 10)
+    index.remove("a")
+    index.remove("a")
+    assert "a" not in index and index.near(0, 0, 10) == []
+    index.insert("b", 0, 0, 10)
+    index.clear()
+    assert len(index) == 0 and index.max_radius == 0
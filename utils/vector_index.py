@@ -0,0 +1,240 @@
+import json
+import mmap
+import os
+import shutil
+import sys
+import threading
+import time
+import numpy as np
+
+# Precompiled vector index for RAG retrieval.
+# A knowledge JSON file (a list of {"content", "vector"} records) is compiled once into
+#   vectors.npy   contiguous float32 matrix, one row per record, memory-mapped on load
+#   contents.bin  all contents as utf8, back to back
+#   offsets.npy   int64 start offsets into contents.bin, with one extra entry for the end
+#   meta.json     source file, its mtime and size, record count and vector dimensions
+# so queries no longer parse JSON or walk Python float lists.
+# Every build of a knowledge file goes into its own directory, named after the source's mtime
+# and size, under <name>.index. Files that may still be memory-mapped are never written over,
+# which Windows refuses; older builds are deleted once nothing maps them any more.
+# get_vector_index keeps one index per knowledge file for the whole process (it replaced the
+# parsed-JSON knowledge store) and reports how long it took to load and the bytes it maps.
+
+
+def index_dir_for(json_path):
+    return os.path.splitext(json_path)[0] + ".index"
+
+
+def build_dir_for(json_path):
+    stat = os.stat(json_path)
+    return os.path.join(index_dir_for(json_path), f"{stat.st_mtime_ns}-{stat.st_size}")
+
+
+def write_index(vectors, contents, out_dir, meta=None):
+    """Write a new index directory from an (N, D) array of vectors and a list of N content strings."""
+    # Written to a scratch directory that is renamed into place, so an interrupted build is never
+    # mistaken for a complete one
+    tmp_dir = f"{out_dir}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    encoded = [content.encode("utf8") for content in contents]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(content) for content in encoded])
+
+    def write(name, fn):
+        with open(os.path.join(tmp_dir, name), "wb") as f:
+            fn(f)
+
+    write("vectors.npy", lambda f: np.save(f, vectors))
+    write("offsets.npy", lambda f: np.save(f, offsets))
+    write("contents.bin", lambda f: f.writelines(encoded))
+
+    meta = dict(meta or {})
+    meta.update({"count": int(vectors.shape[0]), "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0})
+    write("meta.json", lambda f: f.write(json.dumps(meta, indent=2).encode("utf8")))
+    try:
+        os.rename(tmp_dir, out_dir)
+    except OSError:
+        # Another process finished the same build first; its files are just as good
+        if not os.path.exists(os.path.join(out_dir, "meta.json")):
+            raise
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return out_dir
+
+
+def remove_old_builds(json_path, keep):
+    """Delete the builds of json_path other than keep; ones still mapped (on Windows) stay for next time."""
+    root = index_dir_for(json_path)
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def build_index(json_path, out_dir=None):
+    """Compile a knowledge JSON file into a new build directory of its index."""
+    out_dir = out_dir or build_dir_for(json_path)
+    start = time.perf_counter()
+    stat = os.stat(json_path)
+    with open(json_path, "r", encoding="utf8") as infile:
+        records = json.load(infile)
+
+    vectors = np.array([record["vector"] for record in records], dtype=np.float32)
+    if not records:
+        vectors = vectors.reshape(0, 0)
+    contents = [record["content"] for record in records]
+    write_index(vectors, contents, out_dir, {
+        "source": os.path.abspath(json_path),
+        "source_mtime": stat.st_mtime,
+        "source_size": stat.st_size,
+    })
+    print(f"Built vector index for {json_path} ({len(contents)} records) in {time.perf_counter() - start:.2f}s")
+    return out_dir
+
+
+def is_current(meta, json_path):
+    stat = os.stat(json_path)
+    return meta.get("source_mtime") == stat.st_mtime and meta.get("source_size") == stat.st_size
+
+
+def index_is_current(json_path, out_dir=None):
+    out_dir = out_dir or build_dir_for(json_path)
+    meta_path = os.path.join(out_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, "r") as f:
+        return is_current(json.load(f), json_path)
+
+
+class VectorIndex:
+    def __init__(self, directory):
+        start = time.perf_counter()
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self._contents_file = open(os.path.join(directory, "contents.bin"), "rb")
+        if self.offsets[-1] > 0:
+            self._contents = mmap.mmap(self._contents_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._contents = b""
+        self.load_seconds = time.perf_counter() - start
+        # Set by get_vector_index when it had to compile the knowledge file first
+        self.build_seconds = 0.0
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def nbytes(self):
+        """Bytes of vectors, offsets and contents; the vectors and contents are memory-mapped, not copied."""
+        if self.vectors is None:
+            return 0
+        return self.vectors.nbytes + self.offsets.nbytes + int(self.offsets[-1])
+
+    def stats(self):
+        return {
+            "source": self.meta.get("source"),
+            "directory": self.directory,
+            "records": len(self) if self.vectors is not None else 0,
+            "dim": self.meta.get("dim"),
+            "build_seconds": self.build_seconds,
+            "load_seconds": self.load_seconds,
+            "loaded_at": self.loaded_at,
+            "nbytes": self.nbytes,
+        }
+
+    def content(self, i):
+        return self._contents[self.offsets[i]:self.offsets[i + 1]].decode("utf8")
+
+    def search_batch(self, question_vectors, n_results, max_score_bytes=64 * 1024 * 1024):
+        """
+        Find the n_results best records for every question vector at once.
+        Each block of questions is scored with one matrix product over the whole index and the
+        top k is picked with argpartition, so only the k winners per question are ever sorted.
+        Questions are processed in blocks whose score matrix stays under max_score_bytes.
+        Returns (indices, scores, contents): (Q, k) arrays sorted best first and Q lists of k contents.
+        """
+        questions = np.atleast_2d(np.asarray(question_vectors, dtype=np.float32))
+        count = len(self)
+        k = min(n_results, count)
+        indices = np.empty((questions.shape[0], k), dtype=np.int64)
+        scores = np.empty((questions.shape[0], k), dtype=np.float32)
+        if k == 0:
+            return indices, scores, [[] for _ in range(questions.shape[0])]
+
+        block = max(1, max_score_bytes // (count * 4))
+        for start in range(0, questions.shape[0], block):
+            block_scores = questions[start:start + block] @ self.vectors.T
+            if k < count:
+                top = np.argpartition(block_scores, count - k, axis=1)[:, count - k:]
+            else:
+                top = np.broadcast_to(np.arange(count), block_scores.shape)
+            top_scores = np.take_along_axis(block_scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            indices[start:start + block] = np.take_along_axis(top, order, axis=1)
+            scores[start:start + block] = np.take_along_axis(top_scores, order, axis=1)
+
+        contents = [[self.content(i) for i in row] for row in indices]
+        return indices, scores, contents
+
+    def search(self, question_vector, n_results):
+        """Return the n_results best matching records as [{'content', 'score'}], best first."""
+        _, scores, contents = self.search_batch(question_vector, n_results)
+        return [{"content": content, "score": float(score)} for content, score in zip(contents[0], scores[0])]
+
+    def close(self):
+        if isinstance(self._contents, mmap.mmap):
+            self._contents.close()
+        self._contents_file.close()
+        # A NumPy memmap cannot be closed while arrays use it; it is unmapped once the last one goes
+        self.vectors = None
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_vector_index(json_path):
+    """
+    Return the shared VectorIndex for a knowledge JSON file.
+    The index is built on first use and rebuilt whenever the JSON file changes.
+    """
+    key = os.path.abspath(json_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None and is_current(index.meta, json_path):
+            return index
+        stale = _indexes.pop(key, None)
+        if stale is not None:
+            stale.close()
+        out_dir = build_dir_for(json_path)
+        build_seconds = 0.0
+        if not index_is_current(json_path, out_dir):
+            start = time.perf_counter()
+            build_index(json_path, out_dir)
+            build_seconds = time.perf_counter() - start
+        remove_old_builds(json_path, out_dir)
+        index = VectorIndex(out_dir)
+        index.build_seconds = build_seconds
+        print(f"Loaded vector index for {json_path} ({len(index)} records, {index.nbytes / 1e6:.1f} MB) in {index.load_seconds:.3f}s")
+        _indexes[key] = index
+        return index
+
+
+if __name__ == "__main__":
+    # python -m utils.vector_index knowledge/merged.json
+    for path in sys.argv[1:] or ["knowledge/merged.json"]:
+        build_index(path)